@@ -0,0 +1,60 @@
+import numpy as np
+import time as t
+
+import forces
+from main import figCube, figWeird, solarSystem, Error
+
+def loopAccelerations(poss, mass, G):
+  # The original per-pair loop of getK, kept as the baseline to compare against
+  accs = np.zeros((len(poss),3))
+  for i in range(len(poss)):
+    possCurr = np.delete(poss, i, axis = 0)
+    massCurr = np.delete(mass, i, axis = 0)
+    for j in range(len(poss) - 1):
+      accs[i] -= G * massCurr[j] * ((poss[i] - possCurr[j]) / np.linalg.norm(poss[i] - possCurr[j]) ** 3)
+  return accs
+
+def cluster(N=1000, seed=0):
+  # Random Plummer-like cluster for mid-size N
+  rng = np.random.default_rng(seed)
+  pos = rng.normal(size=(N,3))
+  vel = rng.normal(size=(N,3)) * 0.1
+  M = np.ones(N) / N
+  return pos, vel, M, None, None, 1
+
+def timeit(func, repeat):
+  func() # Warm up, this also triggers the JIT compile
+  start = t.perf_counter()
+  for _ in range(repeat):
+    func()
+  return (t.perf_counter() - start) / repeat
+
+def main(repeat=20):
+  scenarios = {'figCube': figCube(), 'figWeird': figWeird(), 'solarSystem': solarSystem(),
+               'Error': Error(), 'cluster': cluster()}
+
+  print(f"{'scenario':>12} {'N':>5} {'backend':>8} {'force [s]':>11} {'speedup':>8} {'force+pot [s]':>14} {'max rel err':>12}")
+  for name, (pos, vel, M, col, rad, G) in scenarios.items():
+    poss = np.array(pos, dtype='d')
+    mass = np.array(M, dtype='d')
+
+    reference = forces.accelerationsNumpy(poss, mass, G)
+    scale = np.abs(reference).max()
+
+    # The loop baseline is too slow to time many times on the cluster
+    baseline = timeit(lambda: loopAccelerations(poss, mass, G), 1 if len(poss) > 100 else repeat)
+    print(f"{name:>12} {len(poss):>5} {'loop':>8} {baseline:11.3e} {1:8.1f} {'':>14} {'':>12}")
+
+    for backend in forces.BACKENDS:
+      accs = forces.accelerations(poss, mass, G, backend=backend)
+      accsPot, _ = forces.accelerationsAndPotential(poss, mass, G, backend=backend)
+
+      # How far the backend is from the NumPy reference, checked in test_forces.py
+      err = max(np.abs(accs - reference).max(), np.abs(accsPot - reference).max()) / scale
+
+      force = timeit(lambda: forces.accelerations(poss, mass, G, backend=backend), repeat)
+      both = timeit(lambda: forces.accelerationsAndPotential(poss, mass, G, backend=backend), repeat)
+      print(f"{name:>12} {len(poss):>5} {backend:>8} {force:11.3e} {baseline/force:8.1f} {both:14.3e} {err:12.1e}")
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,120 @@
+import heapq
+import numpy as np
+
+class BodyStore:
+  """Container of the bodies of a simulation that can gain and lose bodies mid run
+
+  Every body gets a stable ID when it is added and a slot, the row it is recorded in
+  by Simulation. Removed bodies leave their slot free and the next body added takes
+  the lowest free slot, so adding and removing cost O(log n) (O(1) without removals)
+  and the slot arrays only grow (by doubling) when every slot is taken. The store also
+  counts simulation steps (see tick) and keeps the lifetime of every body, so recorded
+  rows can be matched back to the bodies they belonged to.
+
+  It works like the plain list CelestialBody.bodies used to be: len, iteration,
+  indexing and append go over the living bodies in slot order. Removing bodies never
+  changes the order of the others, and bodies added into freed slots keep the order
+  they were added in whichever order the slots were freed.
+
+  Usage:
+    probe = CelestialBody(1e-12, pos, vel)
+    probeId = CelestialBody.bodies.add(probe) # Mid run
+    CelestialBody.bodies.remove(probeId) # Escaped
+    slot, birth, death = CelestialBody.bodies.lifetimes[probeId]
+
+  """
+
+  def __init__(self, capacity=16):
+    self.clear(capacity)
+
+  def clear(self, capacity=16):
+    """Remove every body and forget their history, i.e. before setting up a new scene"""
+    self.slots = [None] * capacity # Body in every slot, None if free
+    self.ids = np.full(capacity, -1, dtype=np.int64) # ID of the body in every slot
+    self.free = [] # Heap of the freed slots, reused lowest first
+    self.size = 0 # Slots ever used, rows of the recorded positions
+    self.count = 0 # Living bodies
+    self.nextId = 0
+    self.step = 0 # Steps simulated, see tick
+    self.lifetimes = {} # ID to [slot, first step, step after the last or None]
+    self.index = {} # ID to body
+    self._order = None # Slots of the living bodies in order, rebuilt after changes
+
+  @property
+  def capacity(self):
+    return len(self.slots)
+
+  def add(self, body):
+    """Add a body, returns its ID. The body gets the attributes bodyId and slot"""
+    if self.free:
+      slot = heapq.heappop(self.free)
+    else:
+      if self.size == self.capacity:
+        # Out of slots, double them
+        self.slots.extend([None] * self.capacity)
+        self.ids = np.concatenate([self.ids, np.full(len(self.ids), -1, dtype=np.int64)])
+      slot = self.size
+      self.size += 1
+
+    bodyId = self.nextId
+    self.nextId += 1
+
+    self.slots[slot] = body
+    self.ids[slot] = bodyId
+    self.index[bodyId] = body
+    self.lifetimes[bodyId] = [slot, self.step, None]
+    self.count += 1
+    self._order = None
+
+    body.bodyId = bodyId
+    body.slot = slot
+    body.bodyNum = slot # Kept for code written for the plain list
+    return bodyId
+
+  append = add
+
+  def remove(self, body):
+    """Remove a body, given itself or its ID, its slot becomes free"""
+    bodyId = body if isinstance(body, (int, np.integer)) else body.bodyId
+    body = self.index.pop(bodyId)
+
+    self.slots[body.slot] = None
+    self.ids[body.slot] = -1
+    heapq.heappush(self.free, body.slot)
+    self.lifetimes[bodyId][2] = self.step
+    self.count -= 1
+    self._order = None
+
+  def get(self, bodyId):
+    """Body with the given ID"""
+    return self.index[bodyId]
+
+  def tick(self, steps=1):
+    """Count simulated steps, called by the integrators after every step"""
+    self.step += steps
+
+  def order(self):
+    """Slots of the living bodies in the order of iteration"""
+    if self._order is None:
+      self._order = np.flatnonzero(self.ids[:self.size] >= 0)
+    return self._order
+
+  def __len__(self):
+    return self.count
+
+  def __iter__(self):
+    slots = self.slots
+    return (slots[slot] for slot in self.order())
+
+  def __getitem__(self, i):
+    if isinstance(i, slice):
+      return [self.slots[slot] for slot in self.order()[i]]
+    return self.slots[self.order()[i]]
+
+  def __contains__(self, body):
+    return getattr(body, 'bodyId', None) in self.index and self.index[body.bodyId] is body
+
+  def existed(self, bodyId, step):
+    """Whether the body with the given ID existed at a step"""
+    slot, birth, death = self.lifetimes[bodyId]
+    return birth <= step and (death is None or step < death)
@@ -0,0 +1,107 @@
+import numpy as np
+
+from variational import variationalStep
+
+def megnoMap(build, xs, ys, time, dt, checkEvery=100, tMin=None, stableTol=0.05, chaoticAbove=8,
+             seed=0, path=None, verbose=False):
+  """MEGNO chaos indicator over a 2-D grid of initial conditions
+
+  Every grid point is integrated with one tangent vector in a single batch. The
+  mean exponential growth of nearby orbits <Y> goes to 2 for quasi-periodic
+  (stable) orbits and grows linearly in time for chaotic ones. Every checkEvery
+  steps after tMin, points with |<Y> - 2| < stableTol or <Y> > chaoticAbove are
+  settled and dropped from the batch, so the remaining compute goes to the
+  boundary between the stable and chaotic regions.
+
+  Inputs:
+    build: Function build(x, y) returning pos, vel, M, G of the initial condition
+    xs, ys: Grid values passed to build
+    time: Time to integrate the unsettled points over
+    dt: Time step
+    checkEvery: Number of steps between checks for settled points
+    tMin: Time before which no point is settled, default = time / 10
+    stableTol: Distance from 2 under which a point counts as stable
+    chaoticAbove: <Y> over which a point counts as chaotic, None to never stop them
+    seed: Seed of the random initial tangent vectors
+    path: Optional .npz file to write the map to (arrays megno, time, x and y)
+    verbose: Print the number of points left at every check
+
+  Outputs:
+    megno: <Y> of every grid point, shape (len(xs), len(ys)), NaN if it collided
+    stopTime: Time at which every grid point was settled
+
+  """
+  if tMin is None:
+    tMin = time / 10
+
+  X, Y = np.meshgrid(xs, ys, indexing='ij')
+  states = [build(x, y) for x, y in zip(X.flat, Y.flat)]
+
+  pos = np.array([state[0] for state in states], dtype='d')
+  vel = np.array([state[1] for state in states], dtype='d')
+  mass = np.array([state[2] for state in states], dtype='d')
+  G = states[0][3]
+
+  B, N, _ = pos.shape
+
+  # Random unit tangent vector for every point
+  rng = np.random.default_rng(seed)
+  delta = rng.normal(size=(B, 6 * N, 1))
+  delta /= np.linalg.norm(delta, axis=1, keepdims=True)
+  dR, dV = delta[:,:3*N], delta[:,3*N:]
+
+  ySum = np.zeros(B) # Integral of s * d(ln|delta|)/ds, gives Y(t) = 2 * ySum / t
+  yBarSum = np.zeros(B) # Integral of Y, gives <Y>(t) = yBarSum / t
+
+  megno = np.full(B, np.nan)
+  stopTime = np.full(B, float(time))
+  active = np.arange(B) # Grid points still being integrated
+
+  steps = int(time/dt)
+  t = 0
+  for step in range(steps):
+    pos, vel, dR, dV = variationalStep(pos, vel, dR, dV, mass, G, dt)
+
+    # Growth of the tangent vector over this step, then renormalize it
+    norm = np.sqrt((dR ** 2).sum(axis=(1,2)) + (dV ** 2).sum(axis=(1,2)))
+    dR /= norm[:,None,None]
+    dV /= norm[:,None,None]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+      ySum += (t + dt / 2) * np.log(norm)
+    t += dt
+    yBarSum += 2 * ySum / t * dt
+
+    if (step + 1) % checkEvery and step + 1 < steps:
+      continue
+
+    yBar = yBarSum / t
+
+    done = ~np.isfinite(yBar) # Collisions
+    if t >= tMin:
+      done |= np.abs(yBar - 2) < stableTol
+      if chaoticAbove is not None:
+        done |= yBar > chaoticAbove
+    if step + 1 == steps:
+      done[:] = True
+
+    megno[active[done]] = yBar[done]
+    stopTime[active[done]] = t
+
+    keep = ~done
+    active = active[keep]
+    pos, vel, dR, dV, mass = pos[keep], vel[keep], dR[keep], dV[keep], mass[keep]
+    ySum, yBarSum = ySum[keep], yBarSum[keep]
+
+    if verbose:
+      print(f"t = {t:.3f}: {len(active)}/{B} points left")
+    if not len(active):
+      break
+
+  megno = megno.reshape(X.shape)
+  stopTime = stopTime.reshape(X.shape)
+
+  if path is not None:
+    np.savez(path, megno=megno, time=stopTime, x=np.asarray(xs), y=np.asarray(ys))
+
+  return megno, stopTime
@@ -0,0 +1,100 @@
+import numpy as np
+import time as t
+from concurrent.futures import ProcessPoolExecutor
+
+from integrators import INTEGRATORS, integrate
+
+def _warmUp(pos, vel, mass, G, dt, methods):
+  # Worker process initializer: a step of every method loads the compiled force kernels
+  # before any run is timed, so no run pays for the JIT compile or cache load
+  for method in methods:
+    integrate(pos, vel, mass, G, dt, 1, method)
+
+def _run(pos, vel, mass, G, dt, steps, method, sampleEvery):
+  # Worker process: one (method, dt) run, timed
+  start = t.perf_counter()
+  positions, _, _ = integrate(pos, vel, mass, G, dt, steps, method, sampleEvery)
+  return positions, t.perf_counter() - start
+
+def convergenceStudy(pos, vel, mass, G, time, dts, methods=None, reference=None, tol=None,
+                     samples=100, referenceRefine=8, workers=None, verbose=True):
+  """Run a scenario over a ladder of time steps and integrators in parallel worker processes
+
+  Every run is compared against the reference at samples evenly spaced times. The
+  error of a run is the largest distance of any body from its reference position.
+
+  Inputs:
+    pos, vel, mass, G: Scenario, i.e. the first entries returned by Error()
+    time: Time interval to simulate over
+    dts: Ladder of time steps, time / samples has to be a multiple of every one of them
+    methods: Integrators to compare (keys of integrators.INTEGRATORS), default all
+    reference: Function reference(times) returning exact positions (N,3,len(times)),
+               i.e. an analytic Kepler orbit. Default = an RK4 run with the smallest dt
+               divided by referenceRefine
+    tol: Error target, reports the cheapest (method, dt) meeting it
+    samples: Number of times the runs are compared at
+    referenceRefine: How much smaller than min(dts) the step of the default reference is
+    workers: Number of worker processes, default the number of cores
+    verbose: Print the report
+
+  Outputs:
+    results: One dict per run with method, dt, error and wallTime
+    orders: Observed order of every method, the slope of log(error) over log(dt)
+    cheapest: The quickest result with error <= tol, or None
+
+  """
+  methods = list(INTEGRATORS) if methods is None else methods
+  interval = time / samples # Time between samples
+  times = np.arange(1, samples + 1) * interval
+
+  for dt in dts:
+    if abs(interval / dt - round(interval / dt)) > 1e-9:
+      raise ValueError(f"time / samples = {interval} is not a multiple of dt = {dt}")
+
+  args = [(pos, vel, mass, G, dt, int(round(time / dt)), method, int(round(interval / dt)))
+          for method in methods for dt in dts]
+
+  with ProcessPoolExecutor(workers, initializer=_warmUp, initargs=(pos, vel, mass, G, min(dts), methods)) as pool:
+    # Default reference, a finer RK4 run, goes along with the other runs
+    if reference is None:
+      dtRef = min(dts) / referenceRefine
+      referenceRun = pool.submit(_run, pos, vel, mass, G, dtRef, int(round(time / dtRef)), 'RK4',
+                                 int(round(interval / dtRef)))
+
+    runs = [pool.submit(_run, *arg) for arg in args]
+
+    exact = reference(times) if reference is not None else referenceRun.result()[0]
+
+    results = []
+    for arg, run in zip(args, runs):
+      positions, wallTime = run.result()
+      error = np.linalg.norm(positions - exact, axis=1).max()
+      results.append({'method': arg[6], 'dt': arg[4], 'error': error, 'wallTime': wallTime})
+
+  # Observed order, fit of log(error) against log(dt)
+  orders = {}
+  for method in methods:
+    dt = np.array([r['dt'] for r in results if r['method'] == method])
+    error = np.array([r['error'] for r in results if r['method'] == method])
+    valid = np.isfinite(error) & (error > 0)
+    orders[method] = np.polyfit(np.log(dt[valid]), np.log(error[valid]), 1)[0] if valid.sum() > 1 else np.nan
+
+  cheapest = None
+  if tol is not None:
+    meeting = [r for r in results if r['error'] <= tol]
+    cheapest = min(meeting, key=lambda r: r['wallTime']) if meeting else None
+
+  if verbose:
+    print(f"{'method':>10} {'dt':>10} {'error':>10} {'wall [s]':>10}")
+    for r in results:
+      print(f"{r['method']:>10} {r['dt']:10.3e} {r['error']:10.3e} {r['wallTime']:10.3f}")
+    for method, order in orders.items():
+      print(f"Observed order of {method}: {order:.2f}")
+    if tol is not None:
+      if cheapest is None:
+        print(f"No setting meets the tolerance {tol:.1e}")
+      else:
+        print(f"Cheapest setting meeting {tol:.1e}: {cheapest['method']} with dt = {cheapest['dt']:.3e} "
+              f"({cheapest['wallTime']:.3f} s)")
+
+  return results, orders, cheapest
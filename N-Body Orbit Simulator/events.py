@@ -0,0 +1,214 @@
+import json
+import numpy as np
+
+class Event:
+  """Base class of events found by the sign change of a function g(pos, vel)
+
+  direction: +1 to only keep g going from negative to positive, -1 for the
+             opposite, 0 for both
+  """
+  direction = 0
+
+  def __init__(self, name=None):
+    self.name = name or type(self).__name__
+
+  def value(self, pos, vel):
+    """Event function g, pos and vel are the (N,3) state of every body"""
+    raise NotImplementedError
+
+  def accept(self, pos, vel):
+    """Extra condition the state at the root has to meet for the event to be logged"""
+    return True
+
+  def record(self, pos, vel):
+    """Values logged along with the time of the event"""
+    return {}
+
+class CloseApproach(Event):
+  """Minimum of the distance between bodies i and j (periapsis if j is the primary)
+
+  g = (ri - rj) . (vi - vj) goes from negative to positive at every distance minimum.
+  A threshold only logs minima closer than it.
+  """
+  direction = 1
+
+  def __init__(self, i, j, threshold=None, name=None):
+    super().__init__(name)
+    self.i, self.j = i, j
+    self.threshold = threshold
+
+  def value(self, pos, vel):
+    return np.dot(pos[self.i] - pos[self.j], vel[self.i] - vel[self.j])
+
+  def accept(self, pos, vel):
+    return self.threshold is None or np.linalg.norm(pos[self.i] - pos[self.j]) < self.threshold
+
+  def record(self, pos, vel):
+    return {'bodies': [self.i, self.j], 'distance': float(np.linalg.norm(pos[self.i] - pos[self.j])),
+            'speed': float(np.linalg.norm(vel[self.i] - vel[self.j]))}
+
+class Periapsis(CloseApproach):
+  """Periapsis of body i around body j"""
+
+class Apoapsis(CloseApproach):
+  """Apoapsis of body i around body j, a distance maximum"""
+  direction = -1
+
+class PlaneCrossing(Event):
+  """Body i crossing the plane through point (or body j) with the given normal"""
+
+  def __init__(self, i, normal=(0,0,1), point=(0,0,0), j=None, direction=0, name=None):
+    super().__init__(name)
+    self.i, self.j = i, j
+    self.normal = np.array(normal, dtype='d') / np.linalg.norm(normal)
+    self.point = np.array(point, dtype='d')
+    self.direction = direction
+
+  def value(self, pos, vel):
+    origin = self.point if self.j is None else pos[self.j]
+    return np.dot(pos[self.i] - origin, self.normal)
+
+  def record(self, pos, vel):
+    return {'bodies': [self.i] if self.j is None else [self.i, self.j],
+            'position': pos[self.i].tolist(), 'ascending': bool(np.dot(vel[self.i], self.normal) > 0)}
+
+class Alignment(Event):
+  """Bodies j and k lining up as seen from body i (eclipse/transit geometry)
+
+  g is the component along normal of (rj - ri) x (rk - ri), which changes sign
+  whenever the three bodies are collinear. With conjunction only the alignments
+  with j and k on the same side of i (j in front of k) are logged, and a
+  maxAngle (radians) only logs them if the angle seen from i is small enough.
+  """
+
+  def __init__(self, i, j, k, normal=(0,0,1), conjunction=True, maxAngle=None, name=None):
+    super().__init__(name)
+    self.i, self.j, self.k = i, j, k
+    self.normal = np.array(normal, dtype='d') / np.linalg.norm(normal)
+    self.conjunction = conjunction
+    self.maxAngle = maxAngle
+
+  def value(self, pos, vel):
+    return np.dot(np.cross(pos[self.j] - pos[self.i], pos[self.k] - pos[self.i]), self.normal)
+
+  def angle(self, pos):
+    a = pos[self.j] - pos[self.i]
+    b = pos[self.k] - pos[self.i]
+    return np.arccos(np.clip(np.dot(a, b) / np.linalg.norm(a) / np.linalg.norm(b), -1, 1))
+
+  def accept(self, pos, vel):
+    angle = self.angle(pos)
+    if self.conjunction and angle > np.pi / 2:
+      return False
+    return self.maxAngle is None or angle < self.maxAngle
+
+  def record(self, pos, vel):
+    return {'bodies': [self.i, self.j, self.k], 'angle': float(self.angle(pos))}
+
+class EventLog:
+  """Collects events and optionally streams them as JSON lines to a file"""
+
+  def __init__(self, path=None, keep=True):
+    self.events = [] # Events kept in memory
+    self.keep = keep # Set to False to only stream to the file
+    self.file = open(path, 'a') if path is not None else None
+
+  def append(self, entry):
+    if self.keep:
+      self.events.append(entry)
+    if self.file is not None:
+      self.file.write(json.dumps(entry) + '\n')
+      self.file.flush()
+
+  def close(self):
+    if self.file is not None:
+      self.file.close()
+      self.file = None
+
+def hermite(s, dt, p0, v0, p1, v1):
+  """Cubic Hermite interpolant of a step at fraction s in [0,1], returns (pos, vel)"""
+  h00 = 2*s**3 - 3*s**2 + 1
+  h10 = s**3 - 2*s**2 + s
+  h01 = -2*s**3 + 3*s**2
+  h11 = s**3 - s**2
+
+  pos = h00 * p0 + h10 * dt * v0 + h01 * p1 + h11 * dt * v1
+  vel = ((6*s**2 - 6*s) * (p0 - p1) / dt + (3*s**2 - 4*s + 1) * v0 + (3*s**2 - 2*s) * v1)
+
+  return pos, vel
+
+class EventDetector:
+  """Checks events after every step and refines them on the step interpolant
+
+  Usage:
+    detector = EventDetector([Periapsis(1, 0), Alignment(0, 1, 2)])
+    solve_RK4(time, dt, G, events=detector, record=False)
+    times = [entry['time'] for entry in detector.log.events]
+
+  Inputs:
+    events: List of Event
+    log: EventLog the events go to, default a new in-memory EventLog
+    tol: Tolerance on the time of the event, as a fraction of the step
+
+  """
+
+  def __init__(self, events, log=None, tol=1e-12, maxIter=100):
+    self.events = list(events)
+    self.log = log if log is not None else EventLog()
+    self.tol = tol
+    self.maxIter = maxIter
+    self.previous = None # Values of g at the start of the current step
+
+  def check(self, t0, dt, p0, v0, p1, v1):
+    """Check the step from t0 to t0 + dt with states (p0, v0) and (p1, v1)"""
+    if self.previous is None:
+      self.previous = [event.value(p0, v0) for event in self.events]
+
+    current = [event.value(p1, v1) for event in self.events]
+
+    for event, g0, g1 in zip(self.events, self.previous, current):
+      # Look for a sign change in the allowed direction
+      if not ((g0 < 0 <= g1 and event.direction >= 0) or (g0 > 0 >= g1 and event.direction <= 0)):
+        continue
+
+      s = self.__root(event, dt, p0, v0, p1, v1, g0, g1)
+      pos, vel = hermite(s, dt, p0, v0, p1, v1)
+
+      if event.accept(pos, vel):
+        entry = {'event': event.name, 'time': float(t0 + s * dt)}
+        entry.update(event.record(pos, vel))
+        self.log.append(entry)
+
+    self.previous = current
+
+  def reset(self):
+    """Forget the last state, i.e. before integrating a new run"""
+    self.previous = None
+
+  def __root(self, event, dt, p0, v0, p1, v1, g0, g1):
+    # Illinois (regula falsi) root finding on g along the step interpolant
+    a, b = 0.0, 1.0
+    ga, gb = g0, g1
+    side = 0
+    s = last = 0.5
+
+    for _ in range(self.maxIter):
+      s = (a * gb - b * ga) / (gb - ga)
+      g = event.value(*hermite(s, dt, p0, v0, p1, v1))
+
+      if g == 0 or abs(s - last) < self.tol:
+        break
+      last = s
+
+      if (g > 0) == (gb > 0):
+        b, gb = s, g
+        if side == -1:
+          ga /= 2
+        side = -1
+      else:
+        a, ga = s, g
+        if side == 1:
+          gb /= 2
+        side = 1
+
+    return s
@@ -0,0 +1,321 @@
+import os
+import numpy as np
+import multiprocessing as mp
+from multiprocessing.shared_memory import SharedMemory
+
+# Numba is optional, without it every kernel runs on the NumPy path
+try:
+  import numba
+except ImportError:
+  numba = None
+
+# The parallel kernels are the default, so their threading layer has to survive the forks of
+# multiprocessing (convergence study, render stage). TBB and GNU OpenMP hang forked children at exit,
+# the workqueue layer does not. NUMBA_THREADING_LAYER still overrides this
+if numba is not None and 'NUMBA_THREADING_LAYER' not in os.environ:
+  numba.config.THREADING_LAYER = 'workqueue'
+
+BACKENDS = ['numba', 'numpy'] if numba is not None else ['numpy'] # Available force kernels
+BACKEND = BACKENDS[0] # Kernel used when none is asked for, the compiled one if it is importable
+
+# Workers are spawned, not forked: forking a process whose parallel kernel already started its
+# threading layer (TBB in particular) leaves the children unable to exit
+MP_CONTEXT = mp.get_context('spawn')
+
+def accelerations(poss, mass, G, start=0, stop=None, out=None, backend=None):
+  """Get accelerations on bodies start:stop due to every other body
+
+  Inputs:
+    poss: Positions of all bodies, shape (N,3). Float32 positions make the pairwise
+          terms single precision, anything else is computed in float64
+    mass: Masses of all bodies, shape (N,)
+    G: Gravitational constant
+    start, stop: Slice of target bodies to compute accelerations for, default all
+    out: Optional array of shape (stop - start, 3) to write the accelerations into
+    backend: 'numba' or 'numpy', default = BACKEND
+
+  Outputs:
+    out: Accelerations of the target bodies, shape (stop - start, 3)
+
+  """
+  dtype = _forceDtype(poss)
+  poss = np.ascontiguousarray(poss, dtype=dtype)
+  mass = np.ascontiguousarray(mass, dtype=dtype)
+
+  if stop is None:
+    stop = len(poss)
+  if out is None:
+    out = np.zeros((stop - start, 3), dtype=dtype)
+
+  if (backend or BACKEND) == 'numba':
+    _accelerationsJit(poss, mass, poss.dtype.type(G), start, stop, out)
+  else:
+    accelerationsNumpy(poss, mass, G, start, stop, out)
+
+  return out
+
+def accelerationsAndPotential(poss, mass, G, backend=None):
+  """Get accelerations of every body and the total potential energy in one pass
+
+  Inputs:
+    poss: Positions of all bodies, shape (N,3)
+    mass: Masses of all bodies, shape (N,)
+    G: Gravitational constant
+    backend: 'numba' or 'numpy', default = BACKEND
+
+  Outputs:
+    accs: Accelerations of every body, shape (N,3)
+    potential: Total potential energy -sum(G * mi * mj / rij) over every pair
+
+  """
+  poss = np.ascontiguousarray(poss, dtype='d')
+  mass = np.ascontiguousarray(mass, dtype='d')
+  accs = np.zeros((len(poss), 3))
+
+  if (backend or BACKEND) == 'numba':
+    potential = _accelerationsAndPotentialJit(poss, mass, float(G), accs)
+  else:
+    potential = _accelerationsAndPotentialNumpy(poss, mass, G, accs)
+
+  return accs, potential
+
+def accelerationsNumpy(poss, mass, G, start=0, stop=None, out=None, block=256):
+  """Get accelerations on bodies start:stop due to every other body using NumPy
+
+  Inputs:
+    poss: Positions of all bodies, shape (N,3)
+    mass: Masses of all bodies, shape (N,)
+    G: Gravitational constant
+    start, stop: Slice of target bodies to compute accelerations for, default all
+    out: Optional array of shape (stop - start, 3) to write the accelerations into
+    block: Number of target bodies handled at once, bounds temporary memory to block * N * 3
+
+  Outputs:
+    out: Accelerations of the target bodies, shape (stop - start, 3)
+
+  """
+  dtype = _forceDtype(poss)
+  poss = np.asarray(poss, dtype=dtype)
+  mass = np.asarray(mass, dtype=dtype)
+
+  if stop is None:
+    stop = len(poss)
+  if out is None:
+    out = np.zeros((stop - start, 3), dtype=dtype)
+
+  for b in range(start, stop, block):
+    e = min(b + block, stop)
+
+    diff = poss[b:e, None, :] - poss[None, :, :] # Separation of every target from every body
+    dist3 = np.einsum('ijk,ijk->ij', diff, diff) ** 1.5 # |r|^3 for every pair
+    dist3[np.arange(e - b), np.arange(b, e)] = np.inf # A body does not pull on itself
+
+    out[b - start:e - start] = -G * np.einsum('ij,ijk->ik', mass / dist3, diff)
+
+  return out
+
+def _forceDtype(poss):
+  # Single precision is kept as is, everything else (lists, ints, float64) runs in float64
+  return np.float32 if getattr(poss, 'dtype', None) == np.float32 else np.float64
+
+def _accelerationsAndPotentialNumpy(poss, mass, G, accs, block=256):
+  potential = 0
+  for b in range(0, len(poss), block):
+    e = min(b + block, len(poss))
+
+    diff = poss[b:e, None, :] - poss[None, :, :] # Separation of every target from every body
+    dist = np.sqrt(np.einsum('ijk,ijk->ij', diff, diff)) # |r| for every pair
+    dist[np.arange(e - b), np.arange(b, e)] = np.inf # A body does not pull on itself
+
+    accs[b:e] = -G * np.einsum('ij,ijk->ik', mass / dist**3, diff)
+    potential -= G * mass[b:e] @ (mass / dist).sum(axis=1) / 2 # Every pair is seen twice
+
+  return potential
+
+if numba is not None:
+  @numba.njit(parallel=True, cache=True)
+  def _accelerationsJit(poss, mass, G, start, stop, out):
+    for i in numba.prange(start, stop):
+      ax = 0.0
+      ay = 0.0
+      az = 0.0
+      for j in range(len(poss)):
+        if j == i:
+          continue # A body does not pull on itself
+
+        dx = poss[i, 0] - poss[j, 0]
+        dy = poss[i, 1] - poss[j, 1]
+        dz = poss[i, 2] - poss[j, 2]
+        r2 = dx * dx + dy * dy + dz * dz
+        f = mass[j] / (r2 * np.sqrt(r2))
+
+        ax -= f * dx
+        ay -= f * dy
+        az -= f * dz
+
+      out[i - start, 0] = G * ax
+      out[i - start, 1] = G * ay
+      out[i - start, 2] = G * az
+
+  @numba.njit(parallel=True, cache=True)
+  def _accelerationsAndPotentialJit(poss, mass, G, accs):
+    potential = 0.0
+    for i in numba.prange(len(poss)):
+      ax = 0.0
+      ay = 0.0
+      az = 0.0
+      u = 0.0
+      for j in range(len(poss)):
+        if j == i:
+          continue # A body does not pull on itself
+
+        dx = poss[i, 0] - poss[j, 0]
+        dy = poss[i, 1] - poss[j, 1]
+        dz = poss[i, 2] - poss[j, 2]
+        r2 = dx * dx + dy * dy + dz * dz
+        r = np.sqrt(r2)
+        f = mass[j] / (r2 * r)
+
+        ax -= f * dx
+        ay -= f * dy
+        az -= f * dz
+        u += mass[j] / r
+
+      accs[i, 0] = G * ax
+      accs[i, 1] = G * ay
+      accs[i, 2] = G * az
+      potential -= G * mass[i] * u / 2 # Every pair is seen twice
+
+    return potential
+
+def _forceWorker(names, bodyNum, dtype, start, stop, barrier):
+  # One thread per worker, the workers already take every core between them
+  if numba is not None:
+    numba.set_num_threads(1)
+
+  # Attach to the blocks owned by SharedForces, nothing is copied
+  blocks = [SharedMemory(name=name) for name in names]
+
+  try:
+    pos = np.ndarray((bodyNum, 3), dtype=dtype, buffer=blocks[0].buf)
+    acc = np.ndarray((bodyNum, 3), dtype=dtype, buffer=blocks[1].buf)
+    mass = np.ndarray((bodyNum,), dtype=dtype, buffer=blocks[2].buf)
+    ctrl = np.ndarray((2,), dtype='d', buffer=blocks[3].buf) # [G, stop flag]
+
+    while True:
+      barrier.wait() # Wait for the positions of this stage
+
+      if ctrl[1]:
+        break
+
+      try:
+        accelerations(pos, mass, ctrl[0], start, stop, out=acc[start:stop])
+      except BaseException:
+        barrier.abort() # Wake up everyone instead of leaving them stuck on the barrier
+        raise
+
+      barrier.wait() # Accelerations of this stage are written
+  finally:
+    del pos, acc, mass, ctrl
+    for block in blocks:
+      block.close()
+
+class SharedForces:
+  """Multiprocess force backend for getK/RK4_step/solve_RK4
+
+  Positions, accelerations and masses live in multiprocessing.shared_memory blocks.
+  Every worker owns a slice of target bodies and writes their accelerations in place.
+  Each call is one RK4 stage: the caller writes the positions and meets the workers on a
+  barrier, the workers compute their slices and meet the caller on the barrier again.
+  The workers are spawned, so a script creating one needs an if __name__ == '__main__' guard.
+  Every worker runs the force kernel on a single thread.
+
+  Usage:
+    with SharedForces(len(CelestialBody.bodies), workers=4) as forces:
+      position = solve_RK4(sim_time, dt, G, forces=forces)
+
+  Inputs:
+    bodyNum: Number of bodies
+    workers: Number of worker processes, default the number of cores
+    timeout: Seconds to wait on the workers before giving up, default forever
+    dtype: Type the pairwise forces are computed in, the forceDtype of solve_RK4 ('d'
+           or 'f'). Positions of another type raise a ValueError
+
+  """
+
+  def __init__(self, bodyNum, workers=None, timeout=None, dtype='d'):
+    self.bodyNum = bodyNum # Number of bodies the blocks are sized for
+    self.timeout = timeout # Seconds to wait on the barrier before giving up, default forever
+    self.dtype = np.dtype(dtype)
+    if self.dtype not in (np.float32, np.float64):
+      raise ValueError(f"SharedForces computes in float32 or float64, not {self.dtype}")
+
+    workers = min(workers or MP_CONTEXT.cpu_count(), bodyNum)
+
+    # Shared blocks for positions, accelerations, masses and control values (always float64)
+    itemsize = self.dtype.itemsize
+    sizes = [bodyNum * 3 * itemsize, bodyNum * 3 * itemsize, bodyNum * itemsize, 2 * 8]
+    self.blocks = [SharedMemory(create=True, size=size) for size in sizes]
+
+    self.pos = np.ndarray((bodyNum, 3), dtype=self.dtype, buffer=self.blocks[0].buf)
+    self.acc = np.ndarray((bodyNum, 3), dtype=self.dtype, buffer=self.blocks[1].buf)
+    self.mass = np.ndarray((bodyNum,), dtype=self.dtype, buffer=self.blocks[2].buf)
+    self.ctrl = np.ndarray((2,), dtype='d', buffer=self.blocks[3].buf)
+    self.ctrl[:] = 0
+
+    self.barrier = MP_CONTEXT.Barrier(workers + 1) # Workers plus the integrating process
+
+    # Split target bodies into contiguous slices, one per worker
+    edges = np.linspace(0, bodyNum, workers + 1).astype(int)
+    names = [block.name for block in self.blocks]
+
+    self.workers = []
+    for start, stop in zip(edges[:-1], edges[1:]):
+      worker = MP_CONTEXT.Process(target=_forceWorker, args=(names, bodyNum, self.dtype.str, start, stop, self.barrier), daemon=True)
+      worker.start()
+      self.workers.append(worker)
+
+  def __call__(self, poss, mass, G):
+    # Silently computing in another precision than asked for would hide it from the caller
+    poss = np.asarray(poss)
+    if poss.dtype != self.dtype:
+      raise ValueError(f"Positions are {poss.dtype} but SharedForces computes in {self.dtype}, "
+                       f"create it with dtype=forceDtype")
+
+    # Publish the inputs of this stage
+    self.pos[:] = poss
+    self.mass[:] = mass
+    self.ctrl[0] = G
+
+    self.barrier.wait(self.timeout) # Start the workers
+    self.barrier.wait(self.timeout) # Wait for every slice to be written
+
+    return self.acc.copy()
+
+  def close(self):
+    """Stop the workers and free the shared memory blocks"""
+    if not self.workers:
+      return
+
+    self.ctrl[1] = 1 # Tell the workers to exit on the next barrier
+    try:
+      self.barrier.wait(self.timeout)
+    except Exception:
+      pass
+
+    for worker in self.workers:
+      worker.join(1)
+      if worker.is_alive():
+        worker.terminate()
+    self.workers = []
+
+    del self.pos, self.acc, self.mass, self.ctrl
+    for block in self.blocks:
+      block.close()
+      block.unlink()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
@@ -0,0 +1,68 @@
+import numpy as np
+
+from forces import accelerations
+
+# Array versions of the integrators, working on (N,3) positions and velocities instead of
+# CelestialBody.bodies so they can run in worker processes
+
+def rk4Step(pos, vel, mass, G, dt, forces=accelerations):
+  """Classic RK4 step, the same scheme as RK4_step"""
+  k1r, k1v = vel, forces(pos, mass, G)
+  k2r, k2v = vel + k1v * dt / 2, forces(pos + k1r * dt / 2, mass, G)
+  k3r, k3v = vel + k2v * dt / 2, forces(pos + k2r * dt / 2, mass, G)
+  k4r, k4v = vel + k3v * dt, forces(pos + k3r * dt, mass, G)
+
+  pos = pos + (k1r + 2 * k2r + 2 * k3r + k4r) * dt / 6
+  vel = vel + (k1v + 2 * k2v + 2 * k3v + k4v) * dt / 6
+  return pos, vel
+
+def leapfrogStep(pos, vel, mass, G, dt, forces=accelerations):
+  """Kick-drift-kick leapfrog, second order and symplectic"""
+  vel = vel + forces(pos, mass, G) * dt / 2
+  pos = pos + vel * dt
+  vel = vel + forces(pos, mass, G) * dt / 2
+  return pos, vel
+
+# Yoshida's coefficients for a fourth order composition of three leapfrog steps
+YOSHIDA_W1 = 1 / (2 - 2 ** (1/3))
+YOSHIDA_W0 = -2 ** (1/3) * YOSHIDA_W1
+
+def yoshida4Step(pos, vel, mass, G, dt, forces=accelerations):
+  """Fourth order symplectic step made of three leapfrog steps"""
+  for w in (YOSHIDA_W1, YOSHIDA_W0, YOSHIDA_W1):
+    pos, vel = leapfrogStep(pos, vel, mass, G, w * dt, forces)
+  return pos, vel
+
+INTEGRATORS = {'RK4': rk4Step, 'leapfrog': leapfrogStep, 'yoshida4': yoshida4Step}
+ORDERS = {'RK4': 4, 'leapfrog': 2, 'yoshida4': 4} # Formal order of every integrator
+
+def integrate(pos, vel, mass, G, dt, steps, method='RK4', sampleEvery=1, forces=accelerations):
+  """Integrate an (N,3) state and sample its positions
+
+  Inputs:
+    pos, vel: Initial state of shape (N,3)
+    mass: Masses of shape (N,)
+    G: Gravitational constant
+    dt: Time step
+    steps: Number of steps
+    method: Key of INTEGRATORS, default = 'RK4'
+    sampleEvery: Number of steps between samples
+    forces: Force backend, see solve_RK4
+
+  Outputs:
+    positions: Positions after every sampleEvery steps, shape (N,3,steps // sampleEvery)
+    pos, vel: Final state
+
+  """
+  step = INTEGRATORS[method]
+  pos = np.array(pos, dtype='d')
+  vel = np.array(vel, dtype='d')
+  mass = np.asarray(mass, dtype='d')
+
+  positions = np.zeros((len(pos), 3, steps // sampleEvery))
+  for i in range(steps):
+    pos, vel = step(pos, vel, mass, G, dt, forces)
+    if (i + 1) % sampleEvery == 0:
+      positions[:,:,(i + 1) // sampleEvery - 1] = pos
+
+  return positions, pos, vel
@@ -0,0 +1,183 @@
+import math
+import numpy as np
+
+def stumpff(z):
+  """Stumpff functions C(z) and S(z) of an array z, with a series around z = 0"""
+  z = np.asarray(z, dtype='d')
+  C = np.empty_like(z)
+  S = np.empty_like(z)
+
+  small = np.abs(z) < 0.1
+  ell = (z > 0) & ~small # Elliptic
+  hyp = (z < 0) & ~small # Hyperbolic
+
+  s = np.sqrt(z[ell])
+  C[ell] = (1 - np.cos(s)) / z[ell]
+  S[ell] = (s - np.sin(s)) / s ** 3
+
+  s = np.sqrt(-z[hyp])
+  C[hyp] = (np.cosh(s) - 1) / -z[hyp]
+  S[hyp] = (np.sinh(s) - s) / s ** 3
+
+  # C = sum (-z)^k / (2k+2)!, S = sum (-z)^k / (2k+3)!
+  zs = z[small]
+  c, s, term = np.zeros_like(zs), np.zeros_like(zs), np.ones_like(zs)
+  for k in range(8):
+    c += term / math.factorial(2 * k + 2)
+    s += term / math.factorial(2 * k + 3)
+    term = term * -zs
+  C[small], S[small] = c, s
+
+  return C, S
+
+def propagate(r0, v0, mu, t, tol=1e-13, maxIter=50):
+  """Exact two-body propagation with the universal variable formulation
+
+  Works for elliptic, parabolic and hyperbolic orbits alike. All inputs broadcast
+  against each other, i.e. r0 of shape (B,1,3), mu (B,1) and t (1,T) give every
+  one of B orbits at every one of T times in one call. Elliptic orbits are reduced
+  modulo their period first, so long times cost no extra iterations.
+
+  Inputs:
+    r0, v0: Relative position and velocity at t = 0, shape (...,3)
+    mu: Gravitational parameter G (m1 + m2), shape (...)
+    t: Times to propagate to, shape (...), may be negative
+    tol: Tolerance of the universal anomaly, relative to its size
+    maxIter: Maximum number of Laguerre iterations
+
+  Outputs:
+    r, v: Relative position and velocity at the times t, shape (...,3)
+
+  """
+  r0 = np.asarray(r0, dtype='d')
+  v0 = np.asarray(v0, dtype='d')
+  shape = np.broadcast_shapes(r0.shape[:-1], v0.shape[:-1], np.shape(mu), np.shape(t))
+  scalar = shape == () # A single orbit at a single time is solved as a batch of one
+  if scalar:
+    shape = (1,)
+  r0 = np.broadcast_to(r0, shape + (3,))
+  v0 = np.broadcast_to(v0, shape + (3,))
+  mu = np.broadcast_to(np.asarray(mu, dtype='d'), shape)
+  t = np.array(np.broadcast_to(np.asarray(t, dtype='d'), shape))
+
+  sqrtMu = np.sqrt(mu)
+  r0n = np.linalg.norm(r0, axis=-1)
+  sigma0 = np.einsum('...i,...i->...', r0, v0) / sqrtMu # r0 . v0 / sqrt(mu)
+  alpha = 2 / r0n - np.einsum('...i,...i->...', v0, v0) / mu # 1 / semi-major axis
+
+  # Whole periods of elliptic orbits change nothing
+  elliptic = alpha > 1e-12
+  period = np.full(shape, np.inf)
+  period[elliptic] = 2 * np.pi / np.sqrt(mu[elliptic] * alpha[elliptic] ** 3)
+  t[elliptic] = np.fmod(t[elliptic], period[elliptic])
+
+  # Initial guess of the universal anomaly chi (Vallado), exact for circular orbits
+  chi = sqrtMu * alpha * t
+
+  hyperbolic = alpha < -1e-12
+  a = 1 / alpha[hyperbolic]
+  sign = np.sign(t[hyperbolic])
+  with np.errstate(invalid='ignore', divide='ignore'):
+    chi[hyperbolic] = sign * np.sqrt(-a) * np.log(-2 * mu[hyperbolic] * alpha[hyperbolic] * t[hyperbolic] /
+      (sigma0[hyperbolic] * sqrtMu[hyperbolic] + sign * np.sqrt(-mu[hyperbolic] * a) * (1 - r0n[hyperbolic] * alpha[hyperbolic])))
+
+  guess = ~elliptic & ~(np.isfinite(chi) & (chi * t >= 0)) # Near parabolic, or no log guess
+  chi[guess] = sqrtMu[guess] * t[guess] / r0n[guess]
+
+  # Laguerre-Conway iteration (n = 5) on F(chi) = sqrt(mu) t, converges from any guess
+  n = 5
+  for _ in range(maxIter):
+    z = alpha * chi ** 2
+    C, S = stumpff(z)
+    F = sigma0 * chi ** 2 * C + (1 - alpha * r0n) * chi ** 3 * S + r0n * chi - sqrtMu * t
+    dF = sigma0 * chi * (1 - z * S) + (1 - alpha * r0n) * chi ** 2 * C + r0n # = r
+    ddF = sigma0 * (1 - z * C) + (1 - alpha * r0n) * chi * (1 - z * S)
+
+    root = np.sqrt(np.abs((n - 1) ** 2 * dF ** 2 - n * (n - 1) * F * ddF))
+    step = n * F / (dF + np.where(dF >= 0, 1, -1) * root)
+    chi = chi - step
+
+    if np.all(np.abs(step) <= tol * np.maximum(np.abs(chi), 1)):
+      break
+
+  # Lagrange coefficients
+  z = alpha * chi ** 2
+  C, S = stumpff(z)
+  f = 1 - chi ** 2 / r0n * C
+  g = t - chi ** 3 / sqrtMu * S
+  r = f[...,None] * r0 + g[...,None] * v0
+
+  rn = np.linalg.norm(r, axis=-1)
+  df = sqrtMu / (rn * r0n) * (z * S - 1) * chi
+  dg = 1 - chi ** 2 / rn * C
+  v = df[...,None] * r0 + dg[...,None] * v0
+
+  if scalar:
+    return r[0], v[0]
+  return r, v
+
+def twoBody(pos, vel, mass, G, times):
+  """Exact positions of two bodies at arbitrary times, in the format of solve_RK4
+
+  Inputs:
+    pos, vel: Initial states of shape (2,3)
+    mass: Masses of shape (2,)
+    G: Gravitational constant
+    times: Times, shape (T,)
+
+  Outputs:
+    positions: Positions of shape (2,3,T)
+    velocities: Velocities of shape (2,3,T)
+
+  """
+  pos = np.asarray(pos, dtype='d')
+  vel = np.asarray(vel, dtype='d')
+  mass = np.asarray(mass, dtype='d')
+  times = np.asarray(times, dtype='d')
+
+  M = mass.sum()
+  comVel = mass @ vel / M
+  comPos = mass @ pos / M + times[:,None] * comVel # Center of mass moves in a line, (T,3)
+  r, v = propagate(pos[1] - pos[0], vel[1] - vel[0], G * M, times)
+
+  positions = np.stack([comPos - mass[1] / M * r, comPos + mass[0] / M * r])
+  velocities = np.stack([comVel - mass[1] / M * v, comVel + mass[0] / M * v])
+  return positions.transpose(0, 2, 1), velocities.transpose(0, 2, 1)
+
+def fastForward(pos, vel, mass, G, pairs, duration):
+  """Move isolated pairs of bodies along their Kepler orbits without stepping
+
+  Each pair is treated as an isolated two-body system, the pull of the other bodies
+  is ignored. This is exact for a lone binary, like the Sun-Earth system of
+  Error(), and a good approximation for a tight binary far from everything else.
+  Bodies in no pair keep their state.
+
+  Inputs:
+    pos, vel: States of shape (N,3)
+    mass: Masses of shape (N,)
+    G: Gravitational constant
+    pairs: Index pairs (i,j) of the binaries, shape (K,2)
+    duration: Time to move them forward by, scalar or one per pair
+
+  Outputs:
+    pos, vel: States after duration
+
+  """
+  pos = np.array(pos, dtype='d')
+  vel = np.array(vel, dtype='d')
+  mass = np.asarray(mass, dtype='d')
+  i, j = np.asarray(pairs).reshape(-1, 2).T
+  duration = np.broadcast_to(np.asarray(duration, dtype='d'), i.shape)
+
+  M = mass[i] + mass[j]
+  fi, fj = (mass[j] / M)[:,None], (mass[i] / M)[:,None]
+  comPos = (mass[i,None] * pos[i] + mass[j,None] * pos[j]) / M[:,None]
+  comVel = (mass[i,None] * vel[i] + mass[j,None] * vel[j]) / M[:,None]
+
+  r, v = propagate(pos[j] - pos[i], vel[j] - vel[i], G * M, duration)
+
+  comPos = comPos + comVel * duration[:,None]
+  pos[i], pos[j] = comPos - fi * r, comPos + fj * r
+  vel[i], vel[j] = comVel - fi * v, comVel + fj * v
+
+  return pos, vel
@@ -1,10 +1,21 @@
 from manimlib import *
+import os
 import numpy as np
 import matplotlib.pyplot as plt
 import time as t
 
+from forces import accelerations
+from trajectory import saveTrajectory, loadTrajectory, TrajectoryStore
+from bodies import BodyStore
+from events import EventDetector
+from chaos import megnoMap
+from convergence import convergenceStudy
+from profiling import profiler
+import kepler
+from render import CACHE_ENV, simulationKey, simulationPath
+
 class CelestialBody:
-  bodies = [] # List contains all instances of object CelestialBody
+  bodies = BodyStore() # Contains all instances of object CelestialBody, works like a list
   
   def __init__(self, mass, pos, vel, radius = 0.1, color = WHITE):
     # Initializing
@@ -16,27 +27,36 @@ class CelestialBody:
     
     self.bodyNum = len(CelestialBody.bodies) # Setting body number in array containing all bodies
 
-def getK(poss, vels, mass, G):
-  # Initializing variables
-  accs = np.zeros((len(CelestialBody.bodies),3))
-  
-  # Turning into numpy array
-  poss = np.array(poss)
+def getK(poss, vels, mass, G, forces=None, forceDtype='d'):
+  # Turning into numpy array, the pairwise forces are computed in forceDtype
+  poss = np.array(poss, dtype=forceDtype)
   vels = np.array(vels)
   
-  # Loop through the contribution of every "other" body
-  for i in range(len(CelestialBody.bodies)):
-    # np.delete makes sure the contributions from other bodies are taken into account
-    possCurr = np.delete(poss, i, axis = 0) # Positions of "other" bodies
-    massCurr = np.delete(mass, i, axis = 0) # Mass of "other" bodies
-    
-    for j in range(len(CelestialBody.bodies) - 1):
-      # Add contributions to the acceleration due to every "other" body
-      accs[i] -= G * massCurr[j] * ((poss[i] - possCurr[j]) / np.linalg.norm(poss[i] - possCurr[j]) ** 3)
+  # Acceleration of every body due to every "other" body. The default backend is the
+  # compiled kernel when Numba is importable and the vectorized NumPy kernel otherwise
+  if forces is None:
+    forces = accelerations
+  
+  # Accelerations go back to float64 so the step is always accumulated in double precision
+  with profiler.phase('force'):
+    accs = np.asarray(forces(poss, np.asarray(mass, dtype=forceDtype), G), dtype='d')
   
   return [vels, accs]
   
-def RK4_step(dt, G):
+def RK4_step(dt, G, forces=None, forceDtype='d', regularizer=None):
+  # Close encounters are stepped by the regularizer instead
+  if regularizer is not None:
+    poss = np.array([body.pos for body in CelestialBody.bodies])
+    mass = np.array([body.mass for body in CelestialBody.bodies], dtype='d')
+    
+    if regularizer.needed(poss, mass, G, dt):
+      vels = np.array([body.vel for body in CelestialBody.bodies])
+      poss, vels = regularizer.step(poss, vels, mass, G, dt)
+      
+      for body, pos, vel in zip(CelestialBody.bodies, poss, vels):
+        body.pos, body.vel = pos, vel
+      return
+  
   # Initializing empty arrays to store "K" values for Runge-Kutta algorithm 
   # for position and velocity independently
   KR = np.zeros((4,len(CelestialBody.bodies),3))
@@ -60,20 +80,32 @@ def RK4_step(dt, G):
       vels.append(body.vel + kv * dt / div[i])
       mass.append(body.mass)
 
-    KRcurr, KVcurr = getK(poss, vels, mass, G) # Get value of current "K"
+    KRcurr, KVcurr = getK(poss, vels, mass, G, forces, forceDtype) # Get value of current "K"
     KR[i], KV[i] = KRcurr, KVcurr # Set current K for position and velocity Independently
   
   for i in range(len(CelestialBody.bodies)):
     CelestialBody.bodies[i].pos += (1/6) * div @ KR[:,i] * dt # Add step
     CelestialBody.bodies[i].vel += (1/6) * div @ KV[:,i] * dt # Add step
 
-def solve_RK4(time, dt, G=1):
+def solve_RK4(time, dt, G=1, forces=None, dtype='d', forceDtype='d', events=None, record=True, regularizer=None):
   """Get positions of bodies over a given time interval using RK4 algorithm
   
   Inputs: 
     time: Time interval to simulate over    
     dt: Time step
     G: Gravitational constant, default = 1
+    forces: Force backend called as forces(poss, mass, G) for the accelerations,
+            i.e. SharedForces for mid-size N, default = forces.accelerations
+    dtype: Storage type of the returned positions, 'f' (float32) halves the memory of
+           the trajectory, default = 'd' (float64)
+    forceDtype: Type the pairwise forces are computed in, default = 'd'. The bodies'
+                positions and velocities are always accumulated in float64
+    events: EventDetector checked after every step, the events found go to its log,
+            which is kept by the caller (with record False it is the only output).
+            It is reset first, so a detector can be reused across runs. Default = None
+    record: Set to False to skip storing the trajectory, i.e. for event only runs
+    regularizer: Regularizer taking over the steps with close encounters, i.e. for
+                 near collisions in the choreographies or clusters, default = None
   
   Outputs:
     positions: Position of bodies at times t * dt of format
@@ -81,22 +113,173 @@ def solve_RK4(time, dt, G=1):
      [[x2,y2,z2], t],
      ...
      [[xN,yN,zN], t]]
+    or None if record is False
     
   """
+  if events is not None:
+    if not isinstance(events, EventDetector):
+      raise TypeError("events has to be an EventDetector, i.e. EventDetector([Periapsis(1, 0)])")
+    events.reset()
+  
   # Initialize empty array for position over time
-  positions = np.zeros((len(CelestialBody.bodies), 3, int(time/dt)))
+  positions = np.zeros((len(CelestialBody.bodies), 3, int(time/dt)), dtype=dtype) if record else None
   
   for t in range(int(time/dt)):
-    currPos = [] # Current position
+    with profiler.phase('record'):
+      currPos = [] # Current position
+      
+      for body in CelestialBody.bodies:
+        currPos.append(body.pos) # Append current position to index of body
+
+      if record:
+        positions[:,:,t] = np.array(currPos) # Set position at time t of each body
+    
+    if events is not None:
+      # State at the start of the step, for the step interpolant
+      p0 = np.array(currPos)
+      v0 = np.array([body.vel for body in CelestialBody.bodies])
+    
+    with profiler.phase('integrate'):
+      RK4_step(dt, G, forces, forceDtype, regularizer) # Take a RK step
+    CelestialBody.bodies.tick()
+    
+    if events is not None:
+      p1 = np.array([body.pos for body in CelestialBody.bodies])
+      v1 = np.array([body.vel for body in CelestialBody.bodies])
+      events.check(t * dt, dt, p0, v0, p1, v1) # Find and log events inside the step
+  
+  return np.array(positions) if record else None
+
+class Simulation:
+  """Stateful run of the current CelestialBody.bodies that can be extended step by step
+  
+  advance(duration) continues from where the last call stopped and appends to a
+  chunked TrajectoryStore, so the positions simulated so far are never reallocated or
+  copied. Calling advance(a) then advance(b) records the same positions as
+  solve_RK4(a + b, dt, G).
+  
+  Bodies can be added to or removed from CelestialBody.bodies between advance
+  calls. Positions are recorded by slot of the BodyStore, rows of bodies that did not
+  exist at a step are NaN, and CelestialBody.bodies.lifetimes tells which body a row
+  belonged to when.
+  
+  Usage:
+    sim = Simulation(dt, G)
+    sim.advance(10)
+    CelestialBody.bodies.append(CelestialBody(1e-12, pos, vel)) # Spacecraft
+    sim.advance(10) # 10 more years
+    curves = buildCurves(sim.positions())
+  
+  Inputs:
+    dt: Time step
+    G: Gravitational constant, default = 1
+    forces, forceDtype, events, regularizer: See solve_RK4
+    dtype: Storage type of the positions, default = 'd'
+    chunkSteps: Number of steps in a chunk of the store
+    
+  """
+  
+  def __init__(self, dt, G=1, forces=None, dtype='d', forceDtype='d', events=None, regularizer=None, chunkSteps=4096):
+    self.dt = dt
+    self.G = G
+    self.forces = forces
+    self.forceDtype = forceDtype
+    self.regularizer = regularizer
+    self.events = events
+    if events is not None:
+      if not isinstance(events, EventDetector):
+        raise TypeError("events has to be an EventDetector, i.e. EventDetector([Periapsis(1, 0)])")
+      events.reset()
     
-    for body in CelestialBody.bodies:
-      currPos.append(body.pos) # Append current position to index of body
+    self.store = TrajectoryStore(len(CelestialBody.bodies), dtype, chunkSteps) # Positions before every step
+    self.steps = 0 # Steps taken so far
+  
+  @property
+  def time(self):
+    return self.steps * self.dt
+  
+  def advance(self, duration):
+    """Simulate duration further and append its positions to the store
+    
+    Outputs:
+      views: Zero-copy views of the positions added, see TrajectoryStore.views
+    
+    """
+    start = self.steps
+    
+    bodies = CelestialBody.bodies
+    
+    for _ in range(int(round(duration/self.dt))):
+      p0 = np.array([body.pos for body in bodies])
+      
+      with profiler.phase('record'):
+        if bodies.size == len(bodies):
+          self.store.append(p0) # Every slot taken, rows are in slot order already
+        else:
+          rows = np.full((bodies.size, 3), np.nan)
+          rows[bodies.order()] = p0
+          self.store.append(rows)
+      
+      if self.events is not None:
+        v0 = np.array([body.vel for body in CelestialBody.bodies])
+      
+      with profiler.phase('integrate'):
+        RK4_step(self.dt, self.G, self.forces, self.forceDtype, self.regularizer)
+      bodies.tick()
+      
+      if self.events is not None:
+        p1 = np.array([body.pos for body in CelestialBody.bodies])
+        v1 = np.array([body.vel for body in CelestialBody.bodies])
+        self.events.check(self.steps * self.dt, self.dt, p0, v0, p1, v1)
+      
+      self.steps += 1
+    
+    return self.store.views(start, self.steps)
+  
+  def views(self, start=0, stop=None):
+    """Zero-copy views (N,3,t) of the steps start:stop, one per chunk"""
+    return self.store.views(start, stop)
+  
+  def positions(self, start=0, stop=None):
+    """Positions (N,3,stop - start) in the format of solve_RK4, a copy when they span chunks"""
+    return self.store.read(start, stop)
+  
+  def save(self, path, **kwargs):
+    """Write the positions so far to a trajectory file, see TrajectoryWriter"""
+    self.store.save(path, self.dt, self.G, **kwargs)
 
-    positions[:,:,t] = np.array(currPos) # Set position at time t of each body
+def precisionDrift(time, dt, G=1, dtype='f', forceDtype='f', forces=None):
+  """Measure how far a reduced precision run drifts from the float64 run
+  
+  Both runs start from the current state of the bodies, which end up at the end
+  state of the reduced precision run like after a single solve_RK4.
+  
+  Inputs: 
+    time: Time interval to simulate over    
+    dt: Time step
+    G: Gravitational constant, default = 1
+    dtype: Storage type of the reduced precision positions, default = 'f'
+    forceDtype: Type the reduced precision forces are computed in, default = 'f'
+    forces: Force backend, see solve_RK4
+  
+  Outputs:
+    drift: Distance between the two runs of each body at every time, shape (N, t)
+    positions: Positions of the reduced precision run, see solve_RK4
     
-    RK4_step(dt, G) # Take a RK step
+  """
+  # Keep the initial state to start the second run from it
+  start = [(body.pos.copy(), body.vel.copy()) for body in CelestialBody.bodies]
+  
+  reference = solve_RK4(time, dt, G, forces)
+  
+  for body, (pos, vel) in zip(CelestialBody.bodies, start):
+    body.pos[:] = pos
+    body.vel[:] = vel
+  
+  positions = solve_RK4(time, dt, G, forces, dtype, forceDtype)
+  drift = np.linalg.norm(positions - reference, axis=1)
   
-  return np.array(positions) 
+  return drift, positions
     
 def fig8():
   pos1 = np.array([0.97000436, -0.24308753, 0]) / scale
@@ -118,12 +301,10 @@ def fig8():
   
   return pos, vel, M, col, rad
 
-def figWeird():
+def figWeird(r = 25, v = (0.3471128135672417, 0.532726851767674, 0)):
   G = 1
   
-  r = 25
-  
-  v = np.array([0.3471128135672417, 0.532726851767674, 0])
+  v = np.array(v) # Velocity of the outer bodies of every figure eight
   
   pos1 = np.array([1, 0, 0])
   pos2 = np.array([-1, 0, 0])
@@ -185,6 +366,29 @@ def figWeird():
   
   return pos, vel, M, col, rad, G
 
+def figWeirdStability(vScales, rs, time, dt, path = 'figWeirdMEGNO.npz'):
+  """MEGNO map of figWeird over scalings of its velocity v and distances r
+  
+  Inputs:
+    vScales: Factors the default v of figWeird is multiplied with
+    rs: Distances r between the figure eights
+    time: Time to integrate every unsettled point over
+    dt: Time step
+    path: .npz file the heat map is written to
+  
+  Outputs:
+    megno: <Y> of shape (len(vScales), len(rs)), ~2 is stable and larger is chaotic
+    
+  """
+  v = np.array([0.3471128135672417, 0.532726851767674, 0])
+  
+  def build(vScale, r):
+    pos, vel, M, col, rad, G = figWeird(r, v * vScale)
+    return pos, vel, M, G
+  
+  megno, stopTime = megnoMap(build, vScales, rs, time, dt, path = path, verbose = True)
+  return megno
+
 def figCube():
   # G = 4 * np.pi**2
   G = 1
@@ -315,25 +519,116 @@ def Error():
   
   return [pos,vel,M,col,rad,G]
 
+def ErrorConvergence(dts = (0.01, 0.005, 0.0025, 0.00125), time = 10, tol = 1e-6):
+  """Convergence study of every integrator on the Sun-Earth system of Error()
+  
+  The runs are compared against the exact Kepler orbit of the system.
+  
+  Inputs:
+    dts: Ladder of time steps
+    time: Time interval to simulate over, in years
+    tol: Error target in AU
+  
+  Outputs:
+    See convergenceStudy
+    
+  """
+  pos, vel, M, col, rad, G = Error()
+  
+  def reference(times):
+    return kepler.twoBody(pos, vel, M, G, times)[0]
+  
+  return convergenceStudy(np.array(pos), np.array(vel), np.array(M), G, time, dts, reference = reference, tol = tol)
+
+def fastForward(duration, G, pairs = ((0, 1),)):
+  """Move isolated pairs of CelestialBody.bodies along their exact Kepler orbits
+  
+  Inputs:
+    duration: Time to skip
+    G: Gravitational constant
+    pairs: Index pairs of the bodies making up each isolated binary, default the
+           first two bodies, i.e. the whole system of Error()
+  
+  """
+  poss = np.array([body.pos for body in CelestialBody.bodies])
+  vels = np.array([body.vel for body in CelestialBody.bodies])
+  mass = np.array([body.mass for body in CelestialBody.bodies], dtype='d')
+  
+  poss, vels = kepler.fastForward(poss, vels, mass, G, pairs, duration)
+  
+  for body, pos, vel in zip(CelestialBody.bodies, poss, vels):
+    body.pos, body.vel = pos, vel
+
+def simulate(scenario, time, dt, cache=True):
+  """Set up CelestialBody.bodies from a scenario and get the positions of its bodies
+  
+  When the scene is rendered by renderScenes the simulation is read from its cache,
+  otherwise it is simulated with solve_RK4.
+  
+  Inputs:
+    scenario: Function returning pos, vel, M, col, rad, G, i.e. solarSystem
+    time: Time interval to simulate over
+    dt: Time step
+    cache: Whether to look for the simulation in the cache of renderScenes
+  
+  Outputs:
+    position: Positions of shape (N,3,time/dt), see solve_RK4
+    G: Gravitational constant of the scenario
+    
+  """
+  pos, vel, M, col, rad, G = scenario()
+  
+  # Initializing bodies in scene with initial conditions
+  CelestialBody.bodies.clear()
+  for i in range(len(M)):
+    CelestialBody.bodies.append(CelestialBody(M[i], pos[i], vel[i], radius = rad[i], color = col[i]))
+  
+  cacheDir = os.environ.get(CACHE_ENV)
+  if cache and cacheDir is not None:
+    path = simulationPath(cacheDir, scenario.__name__, time, dt, simulationKey(pos, vel, M, G, time, dt))
+    if os.path.exists(path):
+      with profiler.phase('io'):
+        position, header = loadTrajectory(path)
+      return position, G
+  
+  return solve_RK4(time, dt, G), G
+
+class ProfiledScene(Scene):
+  """Scene whose play calls are timed as the 'render' phase of the profiler"""
+  
+  def play(self, *args, **kwargs):
+    with profiler.phase('render'):
+      return super().play(*args, **kwargs)
+
+def buildCurves(position):
+  """Build the (invisible) curves the bodies of a scene follow from solve_RK4 positions"""
+  with profiler.phase('curves'):
+    curves = VGroup()
+    for i in range(len(CelestialBody.bodies)):
+      curve = VMobject().set_points_as_corners(position[i].T)
+      curve.set_stroke(CelestialBody.bodies[i].color)
+      curves.add(curve)
+  
+  return curves
+
 sim_time = 500
 # run_time = sim_time/100
 run_time = 10
 dt = 0.001 # Time Step
 
-class NBodyProblem(Scene):
+class NBodyProblem(ProfiledScene):
   def construct(self):
     pos, vel, M, col = figCube()
     # pos, vel, M, col = figWeird()
     # pos, vel, M, col = solarSystem()
   
     # Initializing bodies in scene with initial conditions
+    CelestialBody.bodies.clear()
     for i in range(len(M)):
       CelestialBody.bodies.append(CelestialBody(M[i], pos[i], vel[i], color = col[i]))
       
     position = solve_RK4(time, dt)
 
-    curves = VGroup()
-    
     axes = ThreeDAxes(
       x_range=(-1,1,0.5),
       y_range=(-1,1,0.5),
@@ -343,10 +638,7 @@ class NBodyProblem(Scene):
     axes.center()
     self.add(axes)
     
-    for i in range(len(CelestialBody.bodies)):
-      curve = VMobject().set_points_as_corners(position[i,:,:].T)
-      curve.set_stroke(CelestialBody.bodies[i].color)
-      curves.add(curve)
+    curves = buildCurves(position)
     
     dots = Group(GlowDot(color = body.color) for body in CelestialBody.bodies)
     
@@ -379,13 +671,11 @@ class NBodyProblem(Scene):
     #   run_time = time
     #   )
 
-class OrbitingFig8(Scene):
-  def construct(self):
-    pos, vel, M, col, rad, G = figWeird()
+class OrbitingFig8(ProfiledScene):
+  simulation = (figWeird, sim_time, dt)
   
-    # Initializing bodies in scene with initial conditions
-    for i in range(len(M)):
-      CelestialBody.bodies.append(CelestialBody(M[i], pos[i], vel[i], radius = rad[i], color = col[i]))
+  def construct(self):
+    position, G = simulate(*self.simulation)
     
     # region 
     axes = NumberPlane(x_range=(-10,10,5),
@@ -396,13 +686,7 @@ class OrbitingFig8(Scene):
     axes.center()
     # self.add(axes)
     
-    position = solve_RK4(sim_time, dt, G)
-    
-    curves = VGroup()
-    for i in range(len(CelestialBody.bodies)):
-      curve = VMobject().set_points_as_corners(position[i].T)
-      curve.set_stroke(CelestialBody.bodies[i].color)
-      curves.add(curve)
+    curves = buildCurves(position)
     
     dots = Group(Sphere(color = body.color, radius = body.radius) for body in CelestialBody.bodies)
     
@@ -451,12 +735,13 @@ class OrbitingFig8(Scene):
               frame.animate.set_height(ORIGIN + 60).set_anim_args(run_time = run_time/2, rate_func = rush_into)
               )
 
-class Figure8(Scene):
+class Figure8(ProfiledScene):
   def construct(self):
     G = 1
     pos, vel, M, col, rad = fig8()
   
     # Initializing bodies in scene with initial conditions
+    CelestialBody.bodies.clear()
     for i in range(len(M)):
       CelestialBody.bodies.append(CelestialBody(M[i], pos[i], vel[i], radius = rad[i], color = col[i]))
     
@@ -495,15 +780,11 @@ class Figure8(Scene):
       self.play(ShowCreation(dots), run_time=0.000001)
       RK4_step(dt, G)
 
-class FigureCube(Scene):
-  def construct(self):
-    # G = 1
-    pos, vel, M, col, rad, G = figCube()
+class FigureCube(ProfiledScene):
+  simulation = (figCube, sim_time, dt)
   
-    # Initializing bodies in scene with initial conditions
-    for i in range(len(M)):
-      CelestialBody.bodies.append(CelestialBody(M[i], pos[i], vel[i], radius = rad[i], color = col[i]))
-    
+  def construct(self):
+    position1, G = simulate(*self.simulation)
 
     axes = ThreeDAxes(x_range=(-1,1,0.5),
                        y_range=(-1,1,0.5),
@@ -514,13 +795,7 @@ class FigureCube(Scene):
     axes.center()
     # self.add(axes)
     
-    position1 = solve_RK4(sim_time, dt, G)
-    
-    curves = VGroup()
-    for i in range(len(CelestialBody.bodies)):
-      curve = VMobject().set_points_as_corners(position1[i].T)
-      curve.set_stroke(CelestialBody.bodies[i].color)
-      curves.add(curve)
+    curves = buildCurves(position1)
     
     dots = Group(Sphere(color = body.color, radius = body.radius) for body in CelestialBody.bodies)
     
@@ -548,26 +823,19 @@ class FigureCube(Scene):
               # frame.animate.set_height(ORIGIN + 10),
               run_time = run_time, rate_func = linear)
 
-class SolarSystemSun(Scene):
-  def construct(self):
-    
-    pos, vel, M, col, rad, G = solarSystem()
+class SolarSystemSun(ProfiledScene):
+  simulation = (solarSystem, sim_time, dt)
   
-    # Initializing bodies in scene with initial conditions
-    for i in range(len(M)):
-      CelestialBody.bodies.append(CelestialBody(M[i], pos[i], vel[i], radius = rad[i], color = col[i]))
+  def construct(self):
     
-    position = solve_RK4(sim_time, dt, G)
+    position, G = simulate(*self.simulation)
 
-    with open('solarSystem.npy', 'wb') as f:
-      np.save(f, position)
+    names = ['Sun', 'Mercury', 'Venus', 'Earth', 'Mars', 'Jupiter', 'Saturn', 'Uranus', 'Neptune']
+    with profiler.phase('io'):
+      saveTrajectory('solarSystem.traj', position, dt, G, names = names, scene = 'SolarSystemSun')
     
     # region Animation stuff
-    curves = VGroup()
-    for i in range(len(CelestialBody.bodies)):
-      curve = VMobject().set_points_as_corners(position[i].T)
-      curve.set_stroke(CelestialBody.bodies[i].color)
-      curves.add(curve)
+    curves = buildCurves(position)
     
     dots = Group(GlowDot(color = body.color, radius = body.radius) for body in CelestialBody.bodies)
     
@@ -594,23 +862,15 @@ class SolarSystemSun(Scene):
               frame.animate.set_height(dots[0].get_center() + 40).set_anim_args(run_time = run_time, rate_func = there_and_back))
     self.play(*[FadeOut(mob) for mob in self.mobjects])
    
-class SolarSystemEarth(Scene):
-  def construct(self):
-    
-    pos, vel, M, col, rad, G = solarSystem()
+class SolarSystemEarth(ProfiledScene):
+  simulation = (solarSystem, sim_time, dt)
   
-    # Initializing bodies in scene with initial conditions
-    for i in range(len(M)):
-      CelestialBody.bodies.append(CelestialBody(M[i], pos[i], vel[i], radius = rad[i], color = col[i]))
+  def construct(self):
     
-    position = solve_RK4(sim_time, dt, G)
+    position, G = simulate(*self.simulation)
  
     # region Animation stuff
-    curves = VGroup()
-    for i in range(len(CelestialBody.bodies)):
-      curve = VMobject().set_points_as_corners(position[i].T)
-      curve.set_stroke(CelestialBody.bodies[i].color)
-      curves.add(curve)
+    curves = buildCurves(position)
     
     dots = Group(GlowDot(color = body.color, radius = body.radius) for body in CelestialBody.bodies)
     
@@ -645,23 +905,15 @@ class SolarSystemEarth(Scene):
     self.play(*(ShowCreation(curve, rate_func = linear, run_time = run_time) for curve in curves))
     self.play(*[FadeOut(mob) for mob in self.mobjects])
       
-class SolarSystemMoon(Scene):
-  def construct(self):
-    
-    pos, vel, M, col, rad, G = solarSystem()
+class SolarSystemMoon(ProfiledScene):
+  simulation = (solarSystem, sim_time, dt)
   
-    # Initializing bodies in scene with initial conditions
-    for i in range(len(M)):
-      CelestialBody.bodies.append(CelestialBody(M[i], pos[i], vel[i], radius = rad[i], color = col[i]))
+  def construct(self):
     
-    position = solve_RK4(sim_time, dt, G)
+    position, G = simulate(*self.simulation)
  
     # region Animation stuff
-    curves = VGroup()
-    for i in range(len(CelestialBody.bodies)):
-      curve = VMobject().set_points_as_corners(position[i].T)
-      curve.set_stroke(CelestialBody.bodies[i].color)
-      curves.add(curve)
+    curves = buildCurves(position)
     
     dots = Group(GlowDot(color = body.color, radius = body.radius) for body in CelestialBody.bodies)
     
@@ -693,23 +945,15 @@ class SolarSystemMoon(Scene):
     self.play(*(ShowCreation(curve, rate_func = linear, run_time = run_time) for curve in curves))
     self.play(*[FadeOut(mob) for mob in self.mobjects])
 
-class ErrorTest(Scene):
-  def construct(self):
-    pos, vel, M, col, rad, G = Error()
+class ErrorTest(ProfiledScene):
+  simulation = (Error, sim_time, dt)
   
-    # Initializing bodies in scene with initial conditions
-    for i in range(len(M)):
-      CelestialBody.bodies.append(CelestialBody(M[i], pos[i], vel[i], radius = rad[i], color = col[i]))
-    
-    positionNumerical = solve_RK4(sim_time, dt, G)
+  def construct(self):
+    positionNumerical, G = simulate(*self.simulation)
   
   
     # region Animation stuff
-    curves = VGroup()
-    for i in range(len(CelestialBody.bodies)):
-      curve = VMobject().set_points_as_corners(positionNumerical[i].T)
-      curve.set_stroke(CelestialBody.bodies[i].color)
-      curves.add(curve)
+    curves = buildCurves(positionNumerical)
         
     dots = Group(GlowDot(color = body.color, radius = body.radius) for body in CelestialBody.bodies)
     
@@ -744,6 +988,8 @@ class ErrorTest(Scene):
 
 
 def main():
+  # Switch on with profiler.enable(trace = True) here or NBODY_PROFILE=1, it reports at exit
+  
   # Figure8().construct()
   # FigureCube().construct()
   # OrbitingFig8().construct()
@@ -752,20 +998,29 @@ def main():
   # SolarSystemEarth().construct() # 5 Years
   # SolarSystemMoon().construct() # 1 Year
   
+  # ErrorConvergence()
+  
+  # Every scene at once, simulations shared between scenes run once
+  # from render import renderScenes
+  # renderScenes([OrbitingFig8, FigureCube, SolarSystemSun, SolarSystemEarth, SolarSystemMoon, ErrorTest])
+  
+  # Quick look at a simulation without manim, in seconds
+  # from preview import preview, Camera
+  # preview('solarSystem.traj', 'solarSystemPreview.mp4', camera = Camera(frameHeight = 80, phi = 60 * DEGREES))
+  
   # # ErrorTest().construct()
   # pos, vel, M, col, rad, G = Error()
   
   #   # Initializing bodies in scene with initial conditions
+  # CelestialBody.bodies.clear()
   # for i in range(len(M)):
   #   CelestialBody.bodies.append(CelestialBody(M[i], pos[i], vel[i], radius = rad[i], color = col[i]))
     
   # position = solve_RK4(sim_time, dt, G)
 
-  # with open('SunEarthMoonSystem.npy', 'wb') as f:
-  #   np.save(f, position)
+  # saveTrajectory('SunEarthMoonSystem.traj', position, dt, G, names = ['Sun', 'Earth'])
   
-  # with open('SunEarthMoonSystem.npy', 'rb') as f:
-  #   position = np.load(f)
+  # position, header = loadTrajectory('SunEarthMoonSystem.traj')
   
   # t = np.arange(0, sim_time,dt)
   
@@ -784,6 +1039,9 @@ def main():
   # plt.plot(t, np.abs(error[1]))
   # # plt.plot(t,)
   # plt.show()
+  
+  if profiler.enabled:
+    profiler.reportAtExit()
 
 if __name__ == "__main__":
   main()
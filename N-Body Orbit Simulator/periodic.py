@@ -0,0 +1,277 @@
+import numpy as np
+
+from variational import propagate, batchAccelerations
+
+def returnMap(pos, vel, mass, G, T, steps):
+  """Residual of the return map and its Jacobian for a batch of candidate orbits
+
+  Inputs:
+    pos, vel: Initial states of shape (B,N,3)
+    mass: Masses of shape (N,) or (B,N)
+    G: Gravitational constant
+    T: Candidate periods, shape (B,)
+    steps: Number of RK4 steps per period
+
+  Outputs:
+    F: Residual y(T) - y(0), shape (B,6N)
+    J: Jacobian of F with respect to (y(0), T), shape (B,6N,6N+1)
+
+  """
+  B, N, _ = pos.shape
+
+  posT, velT, phi = propagate(pos, vel, mass, G, T, steps, period=True)
+
+  F = np.concatenate([(posT - pos).reshape(B, -1), (velT - vel).reshape(B, -1)], axis=1)
+
+  # dF/dy0 = Phi - I, the last column is dF/dT
+  J = phi.copy()
+  J[:,:,:6*N] -= np.eye(6 * N)
+
+  return F, J
+
+def removeDrift(pos, vel, mass):
+  """Move a batch of states to the center of mass frame and remove their angular momentum
+
+  A state with linear or angular momentum drifts or precesses, so it can only return
+  to itself up to a translation or rotation. Taking out the rigid rotation
+  w = I^-1 L keeps the shape of the orbit.
+
+  Inputs:
+    pos, vel: States of shape (B,N,3)
+    mass: Masses of shape (N,) or (B,N)
+
+  Outputs:
+    pos, vel: States with zero momentum, zero angular momentum and their center of
+              mass at the origin
+
+  """
+  mass = np.broadcast_to(mass, pos.shape[:2])[...,None]
+
+  pos = pos - (mass * pos).sum(axis=1, keepdims=True) / mass.sum(axis=1, keepdims=True)
+  vel = vel - (mass * vel).sum(axis=1, keepdims=True) / mass.sum(axis=1, keepdims=True)
+
+  L = (mass * np.cross(pos, vel)).sum(axis=1)
+  r2 = np.einsum('bij,bij->bi', pos, pos)
+  inertia = (mass[...,None] * (r2[...,None,None] * np.eye(3) - pos[...,:,None] * pos[...,None,:])).sum(axis=1)
+
+  # pinv, a collinear configuration (like the figure eight at t = 0) has no inertia about its line
+  w = np.einsum('bij,bj->bi', np.linalg.pinv(inertia, rcond=1e-6), L)
+  vel = vel - np.cross(w[:,None,:], pos)
+
+  return pos, vel
+
+def findPeriodicOrbits(pos, vel, mass, G, T, steps=2000, iters=50, tol=1e-9, lam=1e-3, zeroMomentum=True, verbose=False):
+  """Refine a batch of seeds into periodic orbits with Levenberg-Marquardt shooting
+
+  Every iteration integrates all candidates together with their state transition
+  matrix in one batched pass, then takes a damped Gauss-Newton step on the
+  return map residual of each candidate. The damping of every candidate adapts on
+  its own, it shrinks after a step that lowers the residual and grows otherwise.
+  The damping also takes care of the directions the residual does not depend on
+  (translations, rotations and the time shift along the orbit).
+
+  Usage, refining the figure eight from 1000 perturbed seeds:
+    P, V, T = perturbSeeds(pos, vel, 6.3259, 1000, spread=1e-2)
+    P, V, T, residual, converged = findPeriodicOrbits(P, V, np.ones(3), 1, T)
+
+  Inputs:
+    pos, vel: Initial guesses of shape (B,N,3)
+    mass: Masses of shape (N,) or (B,N)
+    G: Gravitational constant
+    T: Guessed periods, scalar or shape (B,)
+    steps: Number of RK4 steps per period
+    iters: Maximum number of iterations
+    tol: Residual norm below which a candidate counts as converged. The residual
+         cannot go below the RK4 error over one period (RK4 does not conserve
+         angular momentum exactly), which falls as (T / steps)^4
+    lam: Initial damping, relative to the largest singular value of J squared
+    zeroMomentum: Start from the seeds with their momentum and angular momentum
+                  removed (see removeDrift), otherwise most seeds can only
+                  converge to a drifting or precessing orbit
+    verbose: Print the progress of every iteration
+
+  Outputs:
+    pos, vel: Refined initial conditions
+    T: Refined periods
+    residual: Norm of the return map residual of every candidate
+    converged: Whether the residual of every candidate is below tol
+
+  """
+  pos = np.array(pos, dtype='d')
+  vel = np.array(vel, dtype='d')
+  B, N, _ = pos.shape
+  T = np.array(np.broadcast_to(T, (B,)), dtype='d')
+  lam = np.full(B, lam)
+
+  if zeroMomentum:
+    pos, vel = removeDrift(pos, vel, mass)
+
+  F, J = returnMap(pos, vel, mass, G, T, steps)
+  residual = np.linalg.norm(F, axis=1)
+
+  for it in range(iters):
+    # Candidates whose damping blew up have stalled, stop spending steps on them
+    stalled = (residual >= tol) & (lam >= 1e12)
+    active = (residual >= tol) & ~stalled
+    if verbose:
+      print(f"Iteration {it}: {np.sum(residual < tol)}/{B} converged, {np.sum(stalled)} stalled, "
+            f"median residual {np.median(residual):.3e}")
+    if not active.any():
+      break
+
+    # Damped least squares step dx = -(J^T J + lam * s_max^2 I)^-1 J^T F of the active
+    # candidates, solved through a batched SVD of J rather than the normal equations so
+    # the near singular directions do not square the condition number
+    U, S, Vt = np.linalg.svd(J[active], full_matrices=False)
+    damping = lam[active,None] * S[:,:1] ** 2
+    UF = np.einsum('bij,bi->bj', U, F[active])
+    dx = -np.einsum('bji,bj->bi', Vt, S / (S ** 2 + damping) * UF)
+
+    posTrial = pos[active] + dx[:,:3*N].reshape(-1, N, 3)
+    velTrial = vel[active] + dx[:,3*N:6*N].reshape(-1, N, 3)
+    TTrial = T[active] + dx[:,-1]
+
+    massActive = mass[active] if np.ndim(mass) == 2 else mass
+    FTrial, JTrial = returnMap(posTrial, velTrial, massActive, G, TTrial, steps)
+    residualTrial = np.linalg.norm(FTrial, axis=1)
+
+    # Keep the steps that lowered the residual (and did not run into a collision)
+    better = np.isfinite(residualTrial) & (residualTrial < residual[active]) & (TTrial > 0)
+    idx = np.flatnonzero(active)
+
+    accepted = idx[better]
+    pos[accepted], vel[accepted], T[accepted] = posTrial[better], velTrial[better], TTrial[better]
+    F[accepted], J[accepted], residual[accepted] = FTrial[better], JTrial[better], residualTrial[better]
+
+    lam[accepted] /= 3
+    lam[idx[~better]] *= 4
+
+  return pos, vel, T, residual, residual < tol
+
+def perturbSeeds(pos, vel, T, count, spread=1e-2, seed=None):
+  """Build count seeds around one initial condition by random relative perturbations
+
+  Axes along which the initial condition has no extent are not perturbed, so planar
+  orbits give planar seeds.
+
+  Inputs:
+    pos, vel: Initial condition of shape (N,3)
+    T: Period guess
+    count: Number of seeds
+    spread: Relative size of the perturbations
+    seed: Seed of the random generator
+
+  Outputs:
+    pos, vel, T: Seeds of shape (count,N,3), (count,N,3) and (count,)
+
+  """
+  rng = np.random.default_rng(seed)
+  pos = np.asarray(pos, dtype='d')
+  vel = np.asarray(vel, dtype='d')
+
+  axes = np.any(pos != 0, axis=0) | np.any(vel != 0, axis=0) # Axes the orbit lives in
+
+  posSeeds = pos + spread * np.abs(pos).max() * rng.normal(size=(count,) + pos.shape) * axes
+  velSeeds = vel + spread * np.abs(vel).max() * rng.normal(size=(count,) + vel.shape) * axes
+  TSeeds = T * (1 + spread * rng.normal(size=count))
+
+  return posSeeds, velSeeds, TSeeds
+
+def energy(pos, vel, mass, G):
+  """Total energy of a batch of states of shape (B,N,3)"""
+  mass = np.broadcast_to(mass, pos.shape[:2])
+
+  kinetic = 0.5 * np.einsum('bi,bij,bij->b', mass, vel, vel)
+
+  diff = pos[:,:,None,:] - pos[:,None,:,:]
+  r = np.sqrt(np.einsum('bijk,bijk->bij', diff, diff))
+  idx = np.arange(pos.shape[1])
+  r[:,idx,idx] = np.inf
+  potential = -G * np.einsum('bi,bj,bij->b', mass, mass, 1 / r) / 2 # Every pair is seen twice
+
+  return kinetic + potential
+
+def orbitSignature(pos, vel, mass, G, T, samples=64, steps=1024, harmonics=8):
+  """Description of the shape of a batch of orbits that doesn't depend on where they start
+
+  Scaling an orbit by r -> a * r, v -> v / sqrt(a), T -> a^(3/2) * T gives another
+  periodic orbit, so distances are measured in units of 1 / |E|. The power sums of the
+  pairwise distances do not change under rotations, reflections or relabelling equal
+  bodies, and the magnitudes of their Fourier coefficients over one period do not
+  change under a time shift or running the orbit backwards.
+
+  Inputs:
+    pos, vel: Initial states of shape (B,N,3)
+    mass: Masses of shape (N,) or (B,N)
+    G: Gravitational constant
+    T: Periods of shape (B,)
+    samples: Number of samples over one period
+    steps: Number of RK4 steps per period, a multiple of samples
+    harmonics: Number of Fourier coefficients kept
+
+  Outputs:
+    invariant: Scale free period T * |E|^(3/2), shape (B,)
+    signature: Shape of every orbit, shape (B,harmonics * N(N-1)/2)
+
+  """
+  pos = np.array(pos, dtype='d')
+  vel = np.array(vel, dtype='d')
+  B, N, _ = pos.shape
+  if steps % samples:
+    raise ValueError(f"steps = {steps} is not a multiple of samples = {samples}")
+
+  E = np.abs(energy(pos, vel, mass, G))
+  dt = (np.asarray(T, dtype='d') / steps)[:,None,None]
+
+  i, j = np.triu_indices(N, 1)
+  powers = np.arange(1, len(i) + 1)
+  sums = np.zeros((B, samples, len(i)))
+  for k in range(steps):
+    if k % (steps // samples) == 0:
+      dist = np.linalg.norm(pos[:,i] - pos[:,j], axis=-1) * E[:,None]
+      sums[:,k // (steps // samples)] = (dist[:,None,:] ** powers[:,None]).sum(axis=2)
+
+    # RK4 step of the whole batch
+    k1r, k1v = vel, batchAccelerations(pos, mass, G)
+    k2r, k2v = vel + k1v * dt / 2, batchAccelerations(pos + k1r * dt / 2, mass, G)
+    k3r, k3v = vel + k2v * dt / 2, batchAccelerations(pos + k2r * dt / 2, mass, G)
+    k4r, k4v = vel + k3v * dt, batchAccelerations(pos + k3r * dt, mass, G)
+    pos = pos + (k1r + 2 * k2r + 2 * k3r + k4r) * dt / 6
+    vel = vel + (k1v + 2 * k2v + 2 * k3v + k4v) * dt / 6
+
+  signature = np.abs(np.fft.rfft(sums, axis=1)[:,:harmonics]) / samples
+  return np.asarray(T) * E ** 1.5, signature.reshape(B, -1)
+
+def uniqueOrbits(pos, vel, T, converged, mass, G, tol=1e-3, **kwargs):
+  """Drop duplicate converged orbits
+
+  Two orbits are the same when their scale free periods and their shapes (see
+  orbitSignature) agree to the relative tolerance tol, whatever their scale, starting
+  point along the orbit, orientation and labelling of equal bodies. The first orbit of
+  every group of duplicates is kept.
+
+  Inputs:
+    pos, vel: Initial states of shape (B,N,3)
+    T: Periods of shape (B,)
+    converged: Which candidates are periodic orbits, only those are kept
+    mass: Masses of shape (N,) or (B,N)
+    G: Gravitational constant
+    tol: Relative tolerance of the comparison, it has to cover the integration error
+    kwargs: Passed on to orbitSignature
+
+  Outputs:
+    pos, vel, T: The unique orbits
+
+  """
+  idx = np.flatnonzero(converged)
+  massConverged = mass[idx] if np.ndim(mass) == 2 else mass
+  invariant, signature = orbitSignature(pos[idx], vel[idx], massConverged, G, T[idx], **kwargs)
+
+  kept = []
+  for a in range(len(idx)):
+    if not any(abs(invariant[a] - invariant[b]) <= tol * invariant[b] and
+               np.linalg.norm(signature[a] - signature[b]) <= tol * np.linalg.norm(signature[b]) for b in kept):
+      kept.append(a)
+
+  keep = idx[kept]
+  return pos[keep], vel[keep], T[keep]
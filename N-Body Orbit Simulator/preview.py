@@ -0,0 +1,256 @@
+import shutil
+import itertools
+import subprocess
+import numpy as np
+
+from trajectory import TrajectoryReader
+
+PALETTE = ['#FFFFFF', '#58C4DD', '#FC6255', '#83C167', '#FFFF00', '#FF862F', '#9A72AC', '#D147BD', '#A6CF8C']
+
+class _ArraySource:
+  # Positions (N,3,t) from memory or a .npy file, with the interface of TrajectoryReader
+  def __init__(self, positions):
+    self.positions = positions
+    self.bodyNum = len(positions)
+
+  def __len__(self):
+    return self.positions.shape[2]
+
+  def read(self, start=0, stop=None, bodies=None):
+    return np.asarray(self.positions[:,:,start:stop])
+
+  def close(self):
+    pass
+
+def _open(source):
+  # Trajectory file, .npy file (memory mapped) or positions array
+  if isinstance(source, str) and source.endswith('.npy'):
+    return _ArraySource(np.load(source, mmap_mode='r'))
+  if isinstance(source, str):
+    return TrajectoryReader(source)
+  return _ArraySource(source)
+
+def _rgb(color):
+  # '#RRGGBB', manim colors or RGB in 0-1 to a float RGB array
+  if hasattr(color, 'get_rgb'):
+    return np.array(color.get_rgb(), dtype='f')
+  if isinstance(color, str):
+    color = color.lstrip('#')
+    return np.array([int(color[i:i+2], 16) for i in (0, 2, 4)], dtype='f') / 255
+  return np.array(color, dtype='f')
+
+class Camera:
+  """Projection of 3-D positions onto the pixels of a frame
+
+  The angles work like frame.set_euler_angles of manim, theta turns about the z axis
+  and phi tilts the view away from looking down the z axis. With follow the camera
+  moves along with a body, like the frame of the Earth and Moon scenes.
+
+  Inputs:
+    width, height: Size of the frame in pixels
+    frameHeight: Height of the view in simulation units, like frame.set_height
+    center: Point the camera looks at
+    theta, phi: Euler angles in radians
+    focal: Distance of the eye from the center for a perspective projection,
+           None = orthographic
+    follow: Index of the body the camera is centered on in every frame, then center
+            is the offset from it, None = fixed center
+
+  """
+
+  def __init__(self, width=640, height=360, frameHeight=10, center=(0, 0, 0), theta=0, phi=0, focal=None,
+               follow=None):
+    self.width = width
+    self.height = height
+    self.frameHeight = frameHeight
+    self.center = np.array(center, dtype='d')
+    self.focal = focal
+    self.follow = follow
+
+    ct, st, cp, sp = np.cos(theta), np.sin(theta), np.cos(phi), np.sin(phi)
+    rotZ = np.array([[ct, st, 0], [-st, ct, 0], [0, 0, 1]])
+    rotX = np.array([[1, 0, 0], [0, cp, sp], [0, -sp, cp]])
+    self.rotation = rotX @ rotZ
+
+  def project(self, points, center=None):
+    """Pixel coordinates (x,y) of points of shape (...,3), as floats, looking at center (default self.center)"""
+    view = (points - (self.center if center is None else center)) @ self.rotation.T
+    x, y = view[...,0], view[...,1]
+
+    if self.focal is not None:
+      scale = self.focal / np.maximum(self.focal - view[...,2], 1e-9)
+      x, y = x * scale, y * scale
+
+    pixels = self.height / self.frameHeight # Pixels per simulation unit
+    return self.width / 2 + x * pixels, self.height / 2 - y * pixels
+
+def _splat(frame, x, y, rgb):
+  # Brighten the pixels (x,y) of frame to rgb, keeping the brighter value of overlaps
+  h, w, _ = frame.shape
+  x = np.rint(x).astype(np.intp)
+  y = np.rint(y).astype(np.intp)
+  inside = (x >= 0) & (x < w) & (y >= 0) & (y < h)
+
+  flat = frame.reshape(-1, 3)
+  idx = y[inside] * w + x[inside]
+  for c in range(3):
+    np.maximum.at(flat[:,c], idx, rgb[inside,c])
+
+def _clip(x0, y0, dx, dy, w, h):
+  # Liang-Barsky: the part t0 <= s <= t1 of the segments (x0,y0) + s (dx,dy) inside the frame w x h
+  t0 = np.zeros_like(x0)
+  t1 = np.ones_like(x0)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    for p, q in ((-dx, x0 + 1), (dx, w - x0), (-dy, y0 + 1), (dy, h - y0)): # One pixel of margin
+      r = q / p
+      t0 = np.where(p < 0, np.maximum(t0, r), t0)
+      t1 = np.where(p > 0, np.minimum(t1, r), t1)
+      t1 = np.where((p == 0) & (q < 0), -1, t1) # Parallel to this edge and outside of it
+
+  visible = (t0 <= t1) & np.isfinite(x0 + y0 + dx + dy)
+  return np.where(visible, t0, 0), np.where(visible, t1, 0), visible
+
+def _line(x, y, rgb, w, h):
+  # Points every pixel along the polylines (x,y) of shape (N,k) inside the frame w x h,
+  # fading rgb (N,k,3) along them. Segments are clipped first, so zooming in on a part of
+  # the tails costs no more than drawing them whole
+  x0, y0, c0 = x[:,:-1].ravel(), y[:,:-1].ravel(), rgb[:,:-1].reshape(-1, 3)
+  dx, dy, dc = np.diff(x, axis=1).ravel(), np.diff(y, axis=1).ravel(), np.diff(rgb, axis=1).reshape(-1, 3)
+
+  t0, t1, visible = _clip(x0, y0, dx, dy, w, h)
+  x0, y0, c0, dx, dy, dc, t0, t1 = (a[visible] for a in (x0, y0, c0, dx, dy, dc, t0, t1))
+  n = np.maximum(np.ceil((t1 - t0) * np.hypot(dx, dy)), 1).astype(np.intp) # Pixels per clipped segment
+
+  seg = np.repeat(np.arange(n.size), n)
+  s = (np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)) / np.repeat(n, n) # Position along the clipped part
+  s = t0[seg] + s * (t1 - t0)[seg] # Position along the whole segment
+
+  return x0[seg] + s * dx[seg], y0[seg] + s * dy[seg], c0[seg] + s[:,None] * dc[seg]
+
+def previewFrames(source, camera=None, stepsPerFrame=None, frames=None, tail=0.2, tailSamples=64,
+                  colors=None, radius=3, block=32):
+  """Raster frames of a trajectory with fading tails, streamed from its source
+
+  The trajectory is read block frames at a time, so a memory mapped .npy file or a
+  trajectory file never has to fit in memory.
+
+  Inputs:
+    source: Trajectory file, .npy file of positions (N,3,t) or positions array
+    camera: Camera, default one fitting the start of the trajectory, looking down z
+    stepsPerFrame: Time steps between frames, default fits the whole trajectory in frames
+    frames: Number of frames, default 300
+    tail: Length of the tails as a fraction of the trajectory
+    tailSamples: Number of points a tail is drawn through
+    colors: Color of every body, default PALETTE
+    radius: Radius of the bodies in pixels
+    block: Number of frames read from the source at a time
+
+  Outputs:
+    Generator of frames, uint8 arrays of shape (height,width,3)
+
+  """
+  reader = _open(source)
+  try:
+    steps = len(reader)
+    frames = frames if frames is not None else 300
+    stepsPerFrame = stepsPerFrame if stepsPerFrame is not None else max(steps // frames, 1)
+    frames = min(frames, steps // stepsPerFrame)
+    if frames == 0:
+      return
+
+    tailSteps = int(tail * steps) # Steps a tail reaches back
+    stride = max(tailSteps // tailSamples, 1)
+
+    first = reader.read(0, min(steps, block * stepsPerFrame))
+    N = len(first)
+    if camera is None:
+      extent = np.abs(first - first.mean(axis=(0, 2))[:,None]).max()
+      camera = Camera(frameHeight=2.4 * max(extent, 1e-12), center=first.mean(axis=(0, 2)))
+
+    colors = PALETTE if colors is None else colors
+    rgb = np.array([_rgb(colors[i % len(colors)]) for i in range(N)]) * 255
+
+    # Disk of the body heads
+    r = int(np.ceil(radius))
+    oy, ox = np.mgrid[-r:r+1, -r:r+1]
+    disk = ox ** 2 + oy ** 2 <= radius ** 2
+    ox, oy = ox[disk], oy[disk]
+
+    for f0 in range(0, frames, block):
+      f1 = min(f0 + block, frames)
+      start = max(f0 * stepsPerFrame - tailSteps, 0)
+      window = np.moveaxis(reader.read(start, (f1 - 1) * stepsPerFrame + 1), 1, 2) # (N,t,3)
+
+      for f in range(f0, f1):
+        frame = np.zeros((camera.height, camera.width, 3), dtype=np.uint8)
+        now = f * stepsPerFrame - start
+
+        # Tail samples from oldest to now, projected as seen from this frame's camera
+        idx = np.arange(now, max(now - tailSteps, 0) - 1, -stride)[::-1]
+        center = None if camera.follow is None else window[camera.follow, now] + camera.center
+        x, y = camera.project(window[:,idx], center) # (N,len(idx)) pixel coordinates, now is last
+
+        # Fading in along the tail
+        if len(idx) > 1:
+          fade = np.linspace(0, 1, len(idx)) ** 2
+          tailRgb = rgb[:,None,:] * fade[None,:,None]
+          px, py, pc = _line(x, y, tailRgb, camera.width, camera.height)
+          _splat(frame, px, py, pc.astype(np.uint8))
+
+        hx = (x[:,-1,None] + ox).ravel()
+        hy = (y[:,-1,None] + oy).ravel()
+        _splat(frame, hx, hy, np.repeat(rgb, len(ox), axis=0).astype(np.uint8))
+
+        yield frame
+  finally:
+    reader.close()
+
+def preview(source, path='preview.mp4', fps=30, duration=10, camera=None, ffmpeg='ffmpeg', **kwargs):
+  """Write a quick preview video of a trajectory without manim
+
+  Frames from previewFrames are piped as raw RGB into ffmpeg.
+
+  Usage:
+    preview('solarSystem.traj', 'solarSystem.mp4', camera=Camera(frameHeight=80, phi=60 * DEGREES))
+
+  Inputs:
+    source: Trajectory file, .npy file of positions (N,3,t) or positions array
+    path: Video file to write
+    fps: Frames per second of the video
+    duration: Length of the video in seconds, like run_time of the scenes
+    camera: Camera, see previewFrames
+    ffmpeg: ffmpeg executable
+    kwargs: Passed on to previewFrames
+
+  Outputs:
+    frames: Number of frames written
+
+  Frames with an odd width or height lose their last column or row, libx264 needs
+  even sizes for yuv420p.
+
+  """
+  if shutil.which(ffmpeg) is None:
+    raise RuntimeError(f"{ffmpeg} not found, it is needed to write the preview video")
+
+  frames = previewFrames(source, camera, frames=int(fps * duration), **kwargs)
+  first = next(frames, None)
+  if first is None:
+    raise ValueError("The trajectory is shorter than the steps of one frame, there is nothing to preview")
+  h, w, _ = first.shape
+  h, w = h - h % 2, w - w % 2
+
+  command = [ffmpeg, '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f"{w}x{h}",
+             '-r', str(fps), '-i', '-', '-pix_fmt', 'yuv420p', '-vcodec', 'libx264', path]
+  process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+  count = 0
+  try:
+    for frame in itertools.chain([first], frames):
+      process.stdin.write(frame[:h,:w].tobytes())
+      count += 1
+  finally:
+    process.stdin.close()
+    if process.wait():
+      raise RuntimeError(f"{ffmpeg} failed writing {path}")
+
+  return count
@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import atexit
+import threading
+import multiprocessing as mp
+
+class _Phase:
+  # Times one phase with the monotonic clock and adds it to the profiler
+  __slots__ = ('profiler', 'name', 'start')
+
+  def __init__(self, profiler, name):
+    self.profiler = profiler
+    self.name = name
+
+  def __enter__(self):
+    self.start = time.perf_counter_ns()
+    return self
+
+  def __exit__(self, *exc):
+    self.profiler.add(self.name, self.start, time.perf_counter_ns())
+
+class _NoPhase:
+  # Shared do-nothing phase handed out while the profiler is off
+  __slots__ = ()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    pass
+
+_NO_PHASE = _NoPhase()
+
+class Profiler:
+  """Low overhead per-phase timer for the simulation and rendering loop
+
+  Phases nest, so a phase's time includes the phases inside it (i.e. 'integrate'
+  includes 'force'). While disabled, phase() returns a shared no-op object and costs
+  one attribute check.
+
+  Usage:
+    profiler.enable(trace=True)
+    with profiler.phase('force'):
+      ...
+    profiler.report('profile.txt', 'profile.json')
+
+  With NBODY_PROFILE=1 the profiler is on from the start and reports to profile.txt
+  (and profile.json with NBODY_PROFILE_TRACE=1) when the program exits, so
+  NBODY_PROFILE=1 manimgl main.py SolarSystemSun profiles a render too.
+
+  """
+
+  def __init__(self, enabled=False, trace=False):
+    self.enabled = enabled # Whether phases are timed at all
+    self.trace = trace # Whether every phase is also kept for the Chrome trace
+    self.exitPaths = None # Files the report goes to at exit, see reportAtExit
+    self.reset()
+
+  def enable(self, trace=False):
+    self.enabled = True
+    self.trace = trace
+
+  def disable(self):
+    self.enabled = False
+
+  def reset(self):
+    """Forget everything measured so far"""
+    self.totals = {} # Total nanoseconds spent in every phase
+    self.counts = {} # Number of times every phase was entered
+    self.events = [] # Chrome trace events
+    self.origin = time.perf_counter_ns() # Start of the run
+
+  def phase(self, name):
+    """Context manager timing the code inside it as phase name"""
+    if not self.enabled:
+      return _NO_PHASE
+    return _Phase(self, name)
+
+  def add(self, name, start, stop):
+    """Add a measured phase given its start and stop times in nanoseconds"""
+    self.totals[name] = self.totals.get(name, 0) + stop - start
+    self.counts[name] = self.counts.get(name, 0) + 1
+
+    if self.trace:
+      self.events.append({'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                          'ts': (start - self.origin) / 1000, 'dur': (stop - start) / 1000})
+
+  def summary(self):
+    """Table of total, count and mean time of every phase"""
+    wall = time.perf_counter_ns() - self.origin
+    lines = [f"{'phase':>12} {'total [s]':>10} {'count':>10} {'mean [us]':>10} {'of run':>7}"]
+
+    for name, total in sorted(self.totals.items(), key=lambda item: -item[1]):
+      count = self.counts[name]
+      lines.append(f"{name:>12} {total / 1e9:10.3f} {count:10d} {total / count / 1e3:10.2f} {total / wall:7.1%}")
+
+    lines.append(f"{'run':>12} {wall / 1e9:10.3f}")
+    return '\n'.join(lines)
+
+  def report(self, summaryPath=None, tracePath=None):
+    """Print the summary, optionally writing it and the Chrome trace (chrome://tracing) to files"""
+    summary = self.summary()
+    print(summary)
+
+    if summaryPath is not None:
+      with open(summaryPath, 'w') as f:
+        f.write(summary + '\n')
+
+    if tracePath is not None:
+      with open(tracePath, 'w') as f:
+        json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+
+  def reportAtExit(self, summaryPath='profile.txt', tracePath='profile.json'):
+    """Report when the interpreter exits if the profiler is still on, the trace only if tracing
+
+    For runs that don't end in code of ours, like manimgl rendering a scene. Calling it
+    again only changes the files.
+    """
+    if self.exitPaths is None:
+      atexit.register(self._reportAtExit, os.getpid())
+    self.exitPaths = (summaryPath, tracePath)
+
+  def _reportAtExit(self, pid):
+    # Forked children inherit the handler, they report nothing
+    if self.enabled and os.getpid() == pid:
+      summaryPath, tracePath = self.exitPaths
+      self.report(summaryPath, tracePath if self.trace else None)
+
+# Shared profiler of the simulator, NBODY_PROFILE=1 switches it on from the start
+profiler = Profiler(enabled=os.environ.get('NBODY_PROFILE') == '1',
+                    trace=os.environ.get('NBODY_PROFILE_TRACE') == '1')
+
+# Worker processes (SharedForces, convergenceStudy) inherit the variable, only the main process reports
+if profiler.enabled and mp.current_process().name == 'MainProcess':
+  profiler.reportAtExit()
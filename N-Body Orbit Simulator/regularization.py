@@ -0,0 +1,124 @@
+import warnings
+import numpy as np
+
+from forces import accelerations
+from integrators import YOSHIDA_W0, YOSHIDA_W1, yoshida4Step
+
+def potential(pos, mass, G):
+  """Force function U = sum over pairs of G m_i m_j / r_ij (minus the potential energy)"""
+  diff = pos[:,None,:] - pos[None,:,:]
+  r = np.sqrt(np.einsum('ijk,ijk->ij', diff, diff))
+  i, j = np.triu_indices(len(pos), 1)
+  return G * np.sum(mass[i] * mass[j] / r[i,j])
+
+def kinetic(vel, mass):
+  return 0.5 * np.einsum('i,ij,ij->', mass, vel, vel)
+
+def closestPair(pos, mass, G):
+  """Smallest pair distance and smallest pair free fall time sqrt(r^3 / (G (m_i + m_j)))"""
+  diff = pos[:,None,:] - pos[None,:,:]
+  r = np.sqrt(np.einsum('ijk,ijk->ij', diff, diff))
+  i, j = np.triu_indices(len(pos), 1)
+  r = r[i,j]
+  return r.min(), np.sqrt(r ** 3 / (G * (mass[i] + mass[j]))).min()
+
+def logHLeapfrog(pos, vel, mass, G, h, B, forces=accelerations):
+  """Drift-kick-drift step of the logarithmic Hamiltonian leapfrog in fictitious time h
+
+  The physical time of the drifts is h / (T + B) and of the kick h / U, where the
+  binding energy B = -E is constant for an isolated system, so T + B = U along the
+  exact solution. The step shrinks in physical time as 1 / U when bodies close in,
+  and Kepler orbits come out with the right shape even through collisions.
+
+  Outputs:
+    pos, vel: State after the step
+    tau: Physical time the step covered
+
+  """
+  tau = h / 2 / (kinetic(vel, mass) + B)
+  pos = pos + vel * tau
+
+  kick = h / potential(pos, mass, G)
+  vel = vel + forces(pos, mass, G) * kick
+
+  drift = h / 2 / (kinetic(vel, mass) + B)
+  pos = pos + vel * drift
+
+  return pos, vel, tau + drift
+
+class Regularizer:
+  """Algorithmic regularization of close encounters for fixed step integrators
+
+  While no pair of bodies is close, steps are left to the ordinary integrator.
+  When some pair comes closer than threshold, or its free fall time falls below
+  dt / eta, the step dt is taken as a number of logarithmic Hamiltonian leapfrog
+  steps of the whole system (Mikkola & Tanikawa 1999, Preto & Tremaine 1999),
+  composed to fourth order like integrators.yoshida4Step. These take ordinary
+  size steps in fictitious time, so close passes neither need a smaller global dt
+  nor blow up the energy error. The last part of dt that does not fill a whole
+  substep is taken with a physical time yoshida4Step.
+
+  The substeps are set by the potential U of the whole system, so they only shrink
+  when the close pair holds a good part of U. A close pass of two light bodies (a
+  spacecraft by a moon, next to a planet and the Sun) barely changes U and gets no
+  finer steps than the ordinary integrator, those need a smaller dt instead.
+
+  Usage:
+    positions = solve_RK4(time, dt, G, regularizer = Regularizer())
+
+  Inputs:
+    threshold: Pair distance under which the step is regularized, None = only use eta
+    eta: The step is regularized when dt > eta * (free fall time of any pair)
+    substeps: Number of fictitious time steps per dt at the potential at the
+              start of the step, more are taken automatically as U grows
+    maxSubsteps: Limit on the substeps of one step. A step that runs into it takes
+                 the rest of dt with yoshida4Step, warns and is counted in truncated
+    forces: Force backend, see solve_RK4
+
+  """
+
+  def __init__(self, threshold=None, eta=0.03, substeps=64, maxSubsteps=100000, forces=accelerations):
+    self.threshold = threshold
+    self.eta = eta
+    self.substeps = substeps
+    self.maxSubsteps = maxSubsteps
+    self.forces = forces
+    self.regularized = 0 # Number of regularized steps taken so far
+    self.truncated = 0 # Number of those that ran out of substeps
+
+  def needed(self, pos, mass, G, dt):
+    """Whether a step dt from positions pos has a close pair in it"""
+    if len(pos) < 2:
+      return False
+    rMin, tMin = closestPair(pos, mass, G)
+    return (self.threshold is not None and rMin < self.threshold) or dt > self.eta * tMin
+
+  def step(self, pos, vel, mass, G, dt):
+    """Regularized step of physical time dt, returns the new pos and vel"""
+    pos = np.array(pos, dtype='d')
+    vel = np.array(vel, dtype='d')
+    mass = np.asarray(mass, dtype='d')
+
+    U = potential(pos, mass, G)
+    B = U - kinetic(vel, mass) # Binding energy, -E
+    h = dt * U / self.substeps # Fictitious time step, substeps steps of physical length ~ h / U
+
+    t = 0
+    for _ in range(self.maxSubsteps):
+      # Stop once the next substep (physical time ~ h / U) would pass the end of the step
+      if t + h / U >= dt:
+        break
+      for w in (YOSHIDA_W1, YOSHIDA_W0, YOSHIDA_W1):
+        pos, vel, tau = logHLeapfrog(pos, vel, mass, G, w * h, B, self.forces)
+        t += tau
+      U = potential(pos, mass, G)
+    else:
+      self.truncated += 1
+      warnings.warn(f"Regularized step ran out of its {self.maxSubsteps} substeps, the last "
+                    f"{dt - t:.3e} of dt = {dt:.3e} is taken unregularized", RuntimeWarning)
+
+    # Rest of the step in physical time, about one substep long unless the substeps ran out
+    pos, vel = yoshida4Step(pos, vel, mass, G, dt - t, self.forces)
+
+    self.regularized += 1
+    return pos, vel
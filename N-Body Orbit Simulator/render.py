@@ -0,0 +1,148 @@
+import os
+import sys
+import shutil
+import hashlib
+import subprocess
+import importlib.util
+import time as t
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+# Directory the scenes look for simulations run by renderScenes in, see main.simulate
+CACHE_ENV = 'NBODY_SIM_CACHE'
+
+# Integrator settings of main.simulate, part of the key of every cached simulation
+INTEGRATOR = 'RK4 float64'
+
+def simulationKey(pos, vel, mass, G, time, dt, integrator=INTEGRATOR):
+  """Hash of everything a simulation depends on, its initial state, G, time, dt and integrator"""
+  digest = hashlib.sha1()
+  for array in (pos, vel, mass):
+    array = np.ascontiguousarray(array, dtype='<f8')
+    digest.update(str(array.shape).encode())
+    digest.update(array.tobytes())
+  digest.update(repr((float(G), float(time), float(dt), integrator)).encode())
+  return digest.hexdigest()[:16]
+
+def simulationPath(cacheDir, scenario, time, dt, key):
+  """Trajectory file a simulation of scenario (its name) over time with step dt is cached in
+
+  key is its simulationKey, so editing the initial conditions of a scenario or the
+  integrator settings never picks up a stale simulation
+  """
+  return os.path.join(cacheDir, f"{scenario}_{time:g}_{dt:g}_{key}.traj")
+
+_scripts = {} # Modules of the scripts loaded by this worker process
+
+def _loadScript(script):
+  # The module of a script, run once per worker process. Its directory goes on the
+  # path so it can import the modules next to it
+  if script not in _scripts:
+    directory = os.path.dirname(script)
+    if directory not in sys.path:
+      sys.path.insert(0, directory)
+
+    name = os.path.splitext(os.path.basename(script))[0]
+    spec = importlib.util.spec_from_file_location(name, script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    _scripts[script] = module
+  return _scripts[script]
+
+def _simulate(script, scenario, time, dt, path):
+  # Worker process: run one simulation of the script's scenario and store it in the cache
+  module = _loadScript(script)
+
+  start = t.perf_counter()
+  position, G = module.simulate(getattr(module, scenario), time, dt, cache=False)
+  module.saveTrajectory(path, position, dt, G, scenario=scenario)
+  return t.perf_counter() - start
+
+def _render(scene, script, flags, cacheDir, logDir):
+  # Render one scene in its own manimgl process, its output goes to a log file.
+  # script and cacheDir are absolute paths
+  manimgl = shutil.which('manimgl')
+  command = [manimgl] if manimgl is not None else [sys.executable, '-m', 'manimlib']
+  command += [script, scene] + list(flags)
+
+  env = dict(os.environ, **{CACHE_ENV: cacheDir})
+
+  start = t.perf_counter()
+  with open(os.path.join(logDir, scene + '.log'), 'w') as log:
+    code = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT, env=env,
+                          cwd=os.path.dirname(script)).returncode
+  return code, t.perf_counter() - start
+
+def renderScenes(scenes, script='main.py', flags=('-w',), workers=None, cacheDir='simCache', verbose=True):
+  """Render a list of scenes in parallel, running every simulation they share only once
+
+  Scenes declare their simulation with a class attribute simulation = (scenario,
+  time, dt), i.e. (solarSystem, sim_time, dt). First every unique simulation runs
+  once in a pool of worker processes and is cached as a trajectory file in
+  cacheDir, keyed by a hash of its initial state and settings (see simulationKey).
+  Then every scene renders in its own manimgl process, reading its
+  simulation from the cache instead of integrating it again.
+
+  Usage:
+    renderScenes([SolarSystemSun, SolarSystemEarth, SolarSystemMoon, OrbitingFig8])
+
+  Inputs:
+    scenes: Scene classes of script to render
+    script: File the scenes are defined in
+    flags: Command line flags of manimgl, default write the video file
+    workers: Number of simulations / renders at a time, default the number of cores
+    cacheDir: Directory of the cached simulations, the manimgl logs go in cacheDir/logs
+    verbose: Print the status and timing of every simulation and scene
+
+  Outputs:
+    status: Dict of scene name to (return code of manimgl, render time in seconds)
+
+  """
+  workers = workers if workers is not None else os.cpu_count()
+
+  # The renders run in the script's directory, so every path they get has to be absolute
+  script = os.path.abspath(script)
+  cacheDir = os.path.abspath(cacheDir)
+  logDir = os.path.join(cacheDir, 'logs')
+  os.makedirs(logDir, exist_ok=True)
+  start = t.perf_counter()
+
+  # Stage 1, every unique simulation once
+  simulations = {}
+  for scene in scenes:
+    simulation = getattr(scene, 'simulation', None)
+    if simulation is not None:
+      scenario, time, dt = simulation
+      pos, vel, M, col, rad, G = scenario()
+      key = simulationKey(pos, vel, M, G, time, dt)
+      simulations[(scenario.__name__, time, dt)] = simulationPath(cacheDir, scenario.__name__, time, dt, key)
+
+  missing = {key: path for key, path in simulations.items() if not os.path.exists(path)}
+  if verbose:
+    print(f"{len(simulations)} simulations for {len(scenes)} scenes, {len(simulations) - len(missing)} cached")
+
+  with ProcessPoolExecutor(min(workers, max(len(missing), 1))) as pool:
+    runs = {pool.submit(_simulate, script, *key, path): key for key, path in missing.items()}
+    for run in as_completed(runs):
+      scenario, time, dt = runs[run]
+      if verbose:
+        print(f"[sim]    {scenario} (time = {time:g}, dt = {dt:g}) done in {run.result():.1f} s")
+
+  # Stage 2, the renders. Every render is its own process, threads only wait on them
+  status = {}
+  with ThreadPoolExecutor(workers) as pool:
+    renders = {pool.submit(_render, scene.__name__, script, flags, cacheDir, logDir): scene.__name__
+               for scene in scenes}
+    for render in as_completed(renders):
+      name = renders[render]
+      status[name] = render.result()
+      if verbose:
+        code, wallTime = status[name]
+        result = 'done' if code == 0 else f"FAILED ({code}), see {os.path.join(logDir, name + '.log')}"
+        print(f"[render] {name} {result} in {wallTime:.1f} s")
+
+  if verbose:
+    failed = sum(code != 0 for code, _ in status.values())
+    print(f"Rendered {len(scenes) - failed}/{len(scenes)} scenes in {t.perf_counter() - start:.1f} s")
+
+  return status
@@ -0,0 +1,50 @@
+from bodies import BodyStore
+
+class _Body:
+  def __init__(self, name):
+    self.name = name
+
+def _names(store):
+  return [body.name for body in store]
+
+def test_remove_keeps_the_order_of_the_others():
+  store = BodyStore(capacity=2)
+  ids = [store.add(_Body(name)) for name in 'abcde']
+  assert store.capacity == 8 and _names(store) == list('abcde')
+
+  store.remove(ids[3])
+  store.remove(ids[1])
+  assert _names(store) == list('ace') and store[1].name == 'c'
+
+def test_freed_slots_are_reused_lowest_first():
+  store = BodyStore()
+  bodies = [_Body(name) for name in 'abcde']
+  for body in bodies:
+    store.add(body)
+
+  # Freed in either order, the bodies added next go in the order they were added
+  store.remove(bodies[1])
+  store.remove(bodies[3])
+  store.add(_Body('x'))
+  store.add(_Body('y'))
+  assert _names(store) == ['a', 'x', 'c', 'y', 'e']
+  assert store.size == 5 and len(store) == 5
+
+def test_lifetimes():
+  store = BodyStore()
+  a = store.add(_Body('a'))
+  store.tick(3)
+  store.remove(a)
+  b = store.add(_Body('b'))
+
+  assert store.lifetimes[a] == [0, 0, 3] and store.lifetimes[b] == [0, 3, None]
+  assert store.existed(a, 2) and not store.existed(a, 3) and store.existed(b, 3)
+
+def test_clear():
+  store = BodyStore()
+  body = _Body('a')
+  store.add(body)
+  store.clear()
+
+  assert len(store) == 0 and body not in store and store.lifetimes == {}
+  assert store.add(_Body('b')) == 0
@@ -0,0 +1,60 @@
+import numpy as np
+
+import kepler
+from events import EventDetector, CloseApproach, Periapsis, Apoapsis, Alignment
+
+def _run(detector, r0, v0, dt, steps):
+  # Bodies around a primary fixed at the origin (body 0), stepped along their exact Kepler orbits
+  times = np.arange(steps + 1) * dt
+  r, v = kepler.propagate(np.array(r0)[:,None], np.array(v0)[:,None], 1.0, times)
+  pos = np.concatenate([np.zeros((1,) + r.shape[1:]), r]).transpose(1, 0, 2) # (t,N,3)
+  vel = np.concatenate([np.zeros((1,) + v.shape[1:]), v]).transpose(1, 0, 2)
+
+  for k in range(steps):
+    detector.check(times[k], dt, pos[k], vel[k], pos[k+1], vel[k+1])
+  return detector.log.events
+
+def test_periapsis_and_apoapsis():
+  # Started at apoapsis r = 1 with speed 0.6, so a = 1 / 1.64 and periapsis at a (1 - e),
+  # over 4.2 periods
+  a = 1 / 1.64
+  period = 2 * np.pi * a ** 1.5
+  detector = EventDetector([Periapsis(1, 0), Apoapsis(1, 0)])
+  log = _run(detector, [[1, 0, 0]], [[0, 0.6, 0]], period / 250, 1050)
+
+  periapses = [entry for entry in log if entry['event'] == 'Periapsis']
+  apoapses = [entry for entry in log if entry['event'] == 'Apoapsis']
+  assert np.allclose([entry['time'] for entry in periapses], (np.arange(4) + 0.5) * period, rtol=0, atol=1e-6)
+  assert np.allclose([entry['time'] for entry in apoapses], (np.arange(4) + 1) * period, rtol=0, atol=1e-6)
+  assert np.allclose([entry['distance'] for entry in periapses], 2 * a - 1, rtol=1e-6)
+
+def test_close_approach_and_alignment():
+  # Circular orbits of radius 1 and 2, body 2 half a turn ahead. Body 1 catches up after
+  # pi / (1 - 2^-1.5), and laps it every 2 pi / (1 - 2^-1.5). Run over 3.2 laps
+  synodic = 2 * np.pi / (1 - 2 ** -1.5)
+  r0 = [[1, 0, 0], [-2, 0, 0]]
+  v0 = [[0, 1, 0], [0, -np.sqrt(0.5), 0]]
+
+  close = CloseApproach(1, 2, threshold=1.5)
+  conjunction = Alignment(0, 1, 2)
+  both = Alignment(0, 1, 2, conjunction=False, name='Opposition or conjunction')
+  log = _run(EventDetector([close, conjunction, both]), r0, v0, synodic / 100, 320)
+
+  closeTimes = [entry['time'] for entry in log if entry['event'] == 'CloseApproach']
+  assert np.allclose(closeTimes, (np.arange(3) + 0.5) * synodic, rtol=0, atol=1e-6)
+  assert np.allclose([entry['distance'] for entry in log if entry['event'] == 'CloseApproach'], 1, rtol=1e-9)
+
+  # The start is an opposition, g = 0 there is not a sign change
+  conjunctions = [entry['time'] for entry in log if entry['event'] == 'Alignment']
+  alignments = [entry['time'] for entry in log if entry['event'] == 'Opposition or conjunction']
+  assert np.allclose(conjunctions, closeTimes, rtol=0, atol=1e-6)
+  assert np.allclose(alignments, np.arange(1, 7) * synodic / 2, rtol=0, atol=1e-6)
+
+def test_reset_forgets_the_last_state():
+  detector = EventDetector([Periapsis(1, 0), Apoapsis(1, 0)])
+  first = list(_run(detector, [[1, 0, 0]], [[0, 0.6, 0]], 0.01, 500))
+
+  # Without the reset the first step of the new run would be compared with the end of the last
+  detector.reset()
+  detector.log.events.clear()
+  assert len(first) == 3 and _run(detector, [[1, 0, 0]], [[0, 0.6, 0]], 0.01, 500) == first
@@ -0,0 +1,133 @@
+import os
+import sys
+import subprocess
+import textwrap
+
+import numpy as np
+import pytest
+
+import forces
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RTOL = 1e-10
+
+def _cluster(N, seed=0):
+  rng = np.random.default_rng(seed)
+  return rng.normal(size=(N, 3)), rng.uniform(0.5, 1.5, size=N) / N
+
+def _loopAccelerations(poss, mass, G):
+  # The original per-pair loop of getK
+  accs = np.zeros((len(poss), 3))
+  for i in range(len(poss)):
+    for j in range(len(poss)):
+      if i != j:
+        diff = poss[i] - poss[j]
+        accs[i] -= G * mass[j] * diff / np.linalg.norm(diff) ** 3
+  return accs
+
+def _loopPotential(poss, mass, G):
+  return -sum(G * mass[i] * mass[j] / np.linalg.norm(poss[i] - poss[j])
+              for i in range(len(poss)) for j in range(i + 1, len(poss)))
+
+@pytest.mark.parametrize('backend', forces.BACKENDS)
+@pytest.mark.parametrize('N', [2, 3, 40, 300])
+def test_accelerations_match_loop(backend, N):
+  poss, mass = _cluster(N)
+  reference = _loopAccelerations(poss, mass, 1.5)
+  scale = np.abs(reference).max()
+
+  accs = forces.accelerations(poss, mass, 1.5, backend=backend)
+  assert np.abs(accs - reference).max() / scale < RTOL
+
+  accsPot, potential = forces.accelerationsAndPotential(poss, mass, 1.5, backend=backend)
+  assert np.abs(accsPot - reference).max() / scale < RTOL
+  assert np.isclose(potential, _loopPotential(poss, mass, 1.5), rtol=RTOL)
+
+@pytest.mark.parametrize('backend', forces.BACKENDS)
+def test_accelerations_slice(backend):
+  poss, mass = _cluster(30)
+  out = np.zeros((10, 3))
+
+  accs = forces.accelerations(poss, mass, 1.0, start=10, stop=20, out=out, backend=backend)
+  assert accs is out
+  assert np.allclose(out, forces.accelerationsNumpy(poss, mass, 1.0)[10:20], rtol=RTOL, atol=0)
+
+@pytest.mark.parametrize('backend', forces.BACKENDS)
+def test_accelerations_single_precision(backend):
+  poss, mass = _cluster(50)
+  accs = forces.accelerations(poss.astype(np.float32), mass.astype(np.float32), 1.0, backend=backend)
+
+  assert accs.dtype == np.float32
+  assert np.allclose(accs, _loopAccelerations(poss, mass, 1.0), rtol=1e-3, atol=0)
+
+def _runScript(tmp_path, body, timeout=120):
+  # Hangs only show up at interpreter exit, so every case runs in its own interpreter
+  script = tmp_path / 'script.py'
+  script.write_text(f"import sys\nsys.path.insert(0, {HERE!r})\n" + textwrap.dedent(body))
+  return subprocess.run([sys.executable, str(script)], timeout=timeout, capture_output=True, text=True)
+
+def test_shared_forces_after_compiled_kernel(tmp_path):
+  # Running the default kernel before starting the workers used to hang at exit
+  result = _runScript(tmp_path, """
+    import numpy as np
+    import forces
+
+    if __name__ == '__main__':
+      rng = np.random.default_rng(0)
+      poss, mass = rng.normal(size=(50, 3)), np.ones(50)
+
+      expected = [forces.accelerations(poss, mass, 1.0, backend=backend) for backend in forces.BACKENDS]
+      with forces.SharedForces(50, workers=2, timeout=60) as shared:
+        accs = shared(poss, mass, 1.0)
+
+      for other in expected:
+        assert np.allclose(accs, other, rtol=1e-10, atol=0)
+      print('ok')
+  """)
+  assert result.returncode == 0, result.stderr
+  assert result.stdout.strip() == 'ok'
+
+def test_shared_forces_matches_kernel():
+  rng = np.random.default_rng(1)
+  poss, mass = rng.normal(size=(20, 3)), rng.uniform(0.5, 1, size=20)
+
+  with forces.SharedForces(20, workers=3, timeout=60) as shared:
+    accs = shared(poss, mass, 2.0)
+
+  assert np.allclose(accs, forces.accelerationsNumpy(poss, mass, 2.0), rtol=1e-10, atol=0)
+
+def test_shared_forces_float32():
+  rng = np.random.default_rng(2)
+  poss, mass = rng.normal(size=(20, 3)).astype(np.float32), rng.uniform(0.5, 1, size=20).astype(np.float32)
+
+  with forces.SharedForces(20, workers=2, timeout=60, dtype='f') as shared:
+    accs = shared(poss, mass, 1.0)
+
+    with pytest.raises(ValueError, match="create it with dtype=forceDtype"):
+      shared(poss.astype('d'), mass, 1.0)
+
+  assert accs.dtype == np.float32
+  assert np.allclose(accs, forces.accelerations(poss, mass, 1.0), rtol=1e-6, atol=0)
+
+  with pytest.raises(ValueError):
+    forces.SharedForces(20, dtype='i')
+
+def test_fork_after_compiled_kernel(tmp_path):
+  # Forked pools (convergence study, render stage) after the default kernel ran used to hang at exit
+  result = _runScript(tmp_path, """
+    import multiprocessing as mp
+    import numpy as np
+    import forces
+
+    def work(seed):
+      poss = np.random.default_rng(seed).normal(size=(20, 3))
+      return forces.accelerations(poss, np.ones(20), 1.0).sum()
+
+    if __name__ == '__main__':
+      work(0)
+      with mp.get_context('fork').Pool(2) as pool:
+        pool.map(work, range(4))
+      print('ok')
+  """)
+  assert result.returncode == 0, result.stderr
+  assert result.stdout.strip() == 'ok'
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+import kepler
+
+# Elliptic, parabolic and hyperbolic orbits around mu = 1
+ORBITS = [([1, 0, 0], [0, 1, 0]), ([1, 0, 0], [0, np.sqrt(2), 0]), ([1, 0, 0], [0.3, 2, 0.1])]
+
+def test_scalar_circular():
+  r, v = kepler.propagate([1, 0, 0], [0, 1, 0], 1.0, 1.0)
+
+  assert r.shape == v.shape == (3,)
+  assert np.allclose(r, [np.cos(1), np.sin(1), 0], rtol=0, atol=1e-12)
+  assert np.allclose(v, [-np.sin(1), np.cos(1), 0], rtol=0, atol=1e-12)
+
+@pytest.mark.parametrize('r0, v0', ORBITS)
+def test_scalar_matches_batch(r0, v0):
+  times = np.array([-3.0, 0.5, 7.0])
+  rs, vs = kepler.propagate(r0, v0, 1.0, times)
+
+  for time, rBatch, vBatch in zip(times, rs, vs):
+    # Numpy scalars and 0-d arrays are scalars too
+    for mu, t in [(1.0, float(time)), (np.float64(1), np.array(time))]:
+      r, v = kepler.propagate(np.array(r0), np.array(v0), mu, t)
+      assert r.shape == v.shape == (3,)
+      assert np.allclose(r, rBatch, rtol=1e-12, atol=1e-12)
+      assert np.allclose(v, vBatch, rtol=1e-12, atol=1e-12)
+
+@pytest.mark.parametrize('r0, v0', ORBITS)
+def test_energy_and_momentum_conserved(r0, v0):
+  r, v = kepler.propagate(r0, v0, 1.0, np.linspace(-5, 5, 11))
+
+  energy = np.einsum('...i,...i', v, v) / 2 - 1 / np.linalg.norm(r, axis=-1)
+  momentum = np.cross(r, v)
+  assert np.allclose(energy, np.dot(v0, v0) / 2 - 1 / np.linalg.norm(r0), rtol=0, atol=1e-10)
+  assert np.allclose(momentum, np.cross(r0, v0), rtol=0, atol=1e-10)
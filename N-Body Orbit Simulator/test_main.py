@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('manimlib') # main.py builds its scenes with manimgl
+import main
+
+# Figure eight choreography
+MASS = [1, 1, 1]
+POS = [[0.97000436, -0.24308753, 0], [-0.97000436, 0.24308753, 0], [0, 0, 0]]
+VEL = [[0.46620368, 0.43215730, 0], [0.46620368, 0.43215730, 0], [-0.93240737, -0.8643146, 0]]
+
+def _figure8():
+  main.CelestialBody.bodies.clear()
+  for i in range(3):
+    main.CelestialBody.bodies.append(main.CelestialBody(MASS[i], POS[i], VEL[i]))
+
+def test_advance_matches_solve_RK4():
+  dt = 0.125 # Exact in binary, so both split the run into the same steps
+  _figure8()
+  expected = main.solve_RK4(5, dt)
+  
+  _figure8()
+  sim = main.Simulation(dt, chunkSteps=16)
+  sim.advance(2)
+  sim.advance(3)
+  
+  assert sim.steps == 40 and sim.time == 5
+  assert np.array_equal(sim.positions(), expected)
+  assert np.array_equal(np.concatenate(sim.views(), axis=2), expected)
@@ -0,0 +1,59 @@
+import numpy as np
+
+import periodic
+from variational import propagate
+
+# Figure eight of Chenciner and Montgomery, G = 1 and unit masses
+FIG8_POS = np.array([[0.97000436, -0.24308753, 0], [-0.97000436, 0.24308753, 0], [0, 0, 0]])
+FIG8_VEL = np.array([[0.46620369, 0.43236573, 0], [0.46620369, 0.43236573, 0], [-0.93240737, -0.86473146, 0]])
+FIG8_T = 6.32591398
+
+# Lagrange's equilateral triangle of side 1, rigidly rotating
+LAGRANGE_ANGLES = np.array([0, 2, 4]) * np.pi / 3
+LAGRANGE_POS = np.stack([np.cos(LAGRANGE_ANGLES), np.sin(LAGRANGE_ANGLES), np.zeros(3)], axis=1) / np.sqrt(3)
+LAGRANGE_VEL = np.stack([-np.sin(LAGRANGE_ANGLES), np.cos(LAGRANGE_ANGLES), np.zeros(3)], axis=1)
+LAGRANGE_T = 2 * np.pi / np.sqrt(3)
+
+def _rotation(angle):
+  c, s = np.cos(angle), np.sin(angle)
+  return np.array([[c, -s, 0], [s, c, 0], [0, 0, 1]])
+
+def _figureEights():
+  # The same figure eight, started elsewhere along it, scaled, rotated, mirrored, relabelled and reversed
+  shiftedPos, shiftedVel, _ = propagate(FIG8_POS[None], FIG8_VEL[None], np.ones(3), 1, 1.3, 400, phi=np.zeros((1, 18, 0)))
+  a = 1.7
+  mirror = np.diag([1, -1, 1])
+
+  pos = [FIG8_POS, shiftedPos[0], FIG8_POS * a, FIG8_POS @ _rotation(0.4).T, FIG8_POS @ mirror, FIG8_POS[[2, 0, 1]], FIG8_POS]
+  vel = [FIG8_VEL, shiftedVel[0], FIG8_VEL / np.sqrt(a), FIG8_VEL @ _rotation(0.4).T, FIG8_VEL @ mirror, FIG8_VEL[[2, 0, 1]], -FIG8_VEL]
+  T = [FIG8_T, FIG8_T, FIG8_T * a ** 1.5, FIG8_T, FIG8_T, FIG8_T, FIG8_T]
+  return np.array(pos), np.array(vel), np.array(T)
+
+def test_unique_orbits_merges_equivalent_figure_eights():
+  pos, vel, T = _figureEights()
+  pos = np.concatenate([pos, LAGRANGE_POS[None]])
+  vel = np.concatenate([vel, LAGRANGE_VEL[None]])
+  T = np.append(T, LAGRANGE_T)
+
+  uniquePos, _, uniqueT = periodic.uniqueOrbits(pos, vel, T, np.ones(len(T), dtype=bool), np.ones(3), 1)
+
+  assert len(uniqueT) == 2
+  assert np.allclose(uniqueT, [FIG8_T, LAGRANGE_T])
+  assert np.array_equal(uniquePos[0], FIG8_POS)
+
+def test_unique_orbits_skips_unconverged():
+  pos, vel, T = _figureEights()
+  converged = np.zeros(len(T), dtype=bool)
+  converged[3] = True
+
+  uniquePos, _, _ = periodic.uniqueOrbits(pos, vel, T, converged, np.ones(3), 1)
+  assert len(uniquePos) == 1 and np.array_equal(uniquePos[0], pos[3])
+
+def test_unique_orbits_merges_shooting_results():
+  # Seeds close to the figure eight converge to copies of it with different periods and starting points
+  pos, vel, T = periodic.perturbSeeds(FIG8_POS, FIG8_VEL, FIG8_T, 8, spread=1e-3, seed=0)
+  pos, vel, T, _, converged = periodic.findPeriodicOrbits(pos, vel, np.ones(3), 1, T, steps=1000, iters=40, tol=1e-7)
+  assert converged.all() and np.ptp(T) > 1e-2
+
+  _, _, uniqueT = periodic.uniqueOrbits(pos, vel, T, converged, np.ones(3), 1)
+  assert len(uniqueT) == 1
@@ -0,0 +1,45 @@
+import os
+import sys
+import json
+import numpy as np
+import pytest
+
+from preview import Camera, preview, previewFrames
+
+# Stand-in for ffmpeg that records its arguments and how many bytes it was piped
+FFMPEG = """#!{python}
+import sys, json
+data = sys.stdin.buffer.read()
+with open(sys.argv[-1], 'w') as f:
+  json.dump({{'args': sys.argv[1:], 'bytes': len(data)}}, f)
+"""
+
+def _fakeFFmpeg(tmp_path):
+  path = tmp_path / 'ffmpeg'
+  path.write_text(FFMPEG.format(python=sys.executable))
+  os.chmod(path, 0o755)
+  return str(path)
+
+def _circle(steps):
+  t = np.linspace(0, 2 * np.pi, steps)
+  return np.stack([np.stack([np.cos(t), np.sin(t), 0 * t]), np.zeros((3, steps))])
+
+def test_preview_even_size(tmp_path):
+  out = tmp_path / 'out.json'
+  count = preview(_circle(200), str(out), fps=10, duration=2, camera=Camera(width=101, height=51, frameHeight=3),
+                  ffmpeg=_fakeFFmpeg(tmp_path))
+
+  record = json.loads(out.read_text())
+  assert count == 20
+  assert record['args'][record['args'].index('-s') + 1] == '100x50'
+  assert record['bytes'] == count * 100 * 50 * 3
+
+def test_preview_too_short(tmp_path):
+  ffmpeg = _fakeFFmpeg(tmp_path)
+  with pytest.raises(ValueError):
+    preview(_circle(5), str(tmp_path / 'out.json'), ffmpeg=ffmpeg, stepsPerFrame=10)
+  with pytest.raises(ValueError):
+    preview(np.zeros((2, 3, 0)), str(tmp_path / 'out.json'), ffmpeg=ffmpeg)
+
+  assert list(previewFrames(_circle(5), stepsPerFrame=10)) == []
+  assert not (tmp_path / 'out.json').exists()
@@ -0,0 +1,37 @@
+import os
+import sys
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Like manimgl, the script ends without calling report, and a spawned worker inherits NBODY_PROFILE
+SCRIPT = f"""
+import sys
+sys.path.insert(0, {HERE!r})
+import multiprocessing as mp
+from profiling import profiler
+
+def worker():
+  with profiler.phase('worker'):
+    pass
+
+if __name__ == '__main__':
+  with profiler.phase('force'):
+    pass
+  process = mp.get_context('spawn').Process(target=worker)
+  process.start()
+  process.join()
+  assert process.exitcode == 0
+"""
+
+def test_report_at_exit(tmp_path):
+  script = tmp_path / 'scene.py'
+  script.write_text(SCRIPT)
+  env = dict(os.environ, NBODY_PROFILE='1', NBODY_PROFILE_TRACE='1')
+  result = subprocess.run([sys.executable, str(script)], cwd=tmp_path, env=env, capture_output=True, text=True,
+                          timeout=60)
+
+  assert result.returncode == 0, result.stderr
+  assert result.stdout.count('phase') == 1 # Only the main process reports
+  assert 'force' in (tmp_path / 'profile.txt').read_text()
+  assert (tmp_path / 'profile.json').exists()
@@ -0,0 +1,31 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from regularization import Regularizer, potential, kinetic
+
+# Binary of unit masses on an orbit of eccentricity 0.99, started at apoapsis
+E_BINARY = 0.99
+POS = np.array([[-0.5, 0, 0], [0.5, 0, 0]])
+VEL = np.array([[0, -0.5, 0], [0, 0.5, 0]]) * np.sqrt(2 * (1 - E_BINARY))
+
+def _energy(pos, vel):
+  return kinetic(vel, np.ones(2)) - potential(pos, np.ones(2), 1)
+
+def test_step_through_periapsis_keeps_energy():
+  regularizer = Regularizer()
+  pos, vel = POS, VEL
+  with warnings.catch_warnings():
+    warnings.simplefilter('error')
+    for _ in range(10):
+      pos, vel = regularizer.step(pos, vel, np.ones(2), 1, 0.25)
+
+  assert regularizer.regularized == 10 and regularizer.truncated == 0
+  assert abs(_energy(pos, vel) / _energy(POS, VEL) - 1) < 1e-6
+
+def test_step_warns_when_out_of_substeps():
+  regularizer = Regularizer(maxSubsteps=2)
+  with pytest.warns(RuntimeWarning, match="ran out of its 2 substeps"):
+    regularizer.step(POS, VEL, np.ones(2), 1, 0.25)
+  assert regularizer.truncated == 1
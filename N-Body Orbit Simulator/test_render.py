@@ -0,0 +1,46 @@
+import numpy as np
+
+import render
+
+POS = [[0, 0, 0], [1, 0, 0]]
+VEL = [[0, 0, 0], [0, 1, 0]]
+MASS = [1, 1e-6]
+
+# Stand-in for main.py, render only needs its simulate and saveTrajectory
+SCRIPT = """
+import numpy as np
+
+def binary():
+  return [[0, 0, 0], [1, 0, 0]], [[0, 0, 0], [0, 1, 0]], [1, 1e-6], None, None, 1
+
+def simulate(scenario, time, dt, cache=True):
+  pos, vel, M, col, rad, G = scenario()
+  return np.zeros((len(M), 3, int(time / dt))), G
+
+def saveTrajectory(path, position, dt, G, **metadata):
+  with open(path, 'w') as f:
+    f.write(f"{metadata['scenario']} {position.shape} {dt} {G}")
+"""
+
+def test_simulation_key():
+  key = render.simulationKey(POS, VEL, MASS, 1, 10, 0.01)
+  assert key == render.simulationKey(np.array(POS, dtype='f'), VEL, np.array(MASS), 1.0, 10.0, 0.01)
+
+  # Editing the initial state or the settings gives another key
+  moved = np.array(POS, dtype='d')
+  moved[1,0] += 1e-12
+  assert render.simulationKey(moved, VEL, MASS, 1, 10, 0.01) != key
+  assert render.simulationKey(POS, VEL, [1, 2e-6], 1, 10, 0.01) != key
+  assert render.simulationKey(POS, VEL, MASS, 1, 10, 0.02) != key
+  assert render.simulationKey(POS, VEL, MASS, 1, 10, 0.01, integrator='Yoshida4') != key
+
+  path = render.simulationPath('cache', 'binary', 10, 0.01, key)
+  assert path.endswith(f"binary_10_0.01_{key}.traj")
+
+def test_simulate_loads_the_script(tmp_path):
+  script = tmp_path / 'scenes.py'
+  script.write_text(SCRIPT)
+  path = tmp_path / 'binary.traj'
+
+  render._simulate(str(script), 'binary', 1, 0.1, str(path))
+  assert path.read_text() == "binary (2, 3, 10) 0.1 1"
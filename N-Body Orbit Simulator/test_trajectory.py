@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from trajectory import TrajectoryWriter, TrajectoryReader, TrajectoryStore, saveTrajectory, loadTrajectory
+
+QUANTUM = 1e-6
+
+def _positions(bodyNum=3, steps=1000, seed=0):
+  # Orbit like paths with a random walk, so the deltas of some chunks need more than int8
+  rng = np.random.default_rng(seed)
+  t = np.arange(steps) * 0.01
+  radii = rng.uniform(0.5, 5, bodyNum)[:,None]
+  positions = np.stack([radii*np.cos(t/radii), radii*np.sin(t/radii), np.zeros((bodyNum, steps))], axis=1)
+  return positions + np.cumsum(rng.normal(0, 1e-3, positions.shape), axis=2)
+
+def test_round_trip(tmp_path):
+  positions = _positions()
+  path = tmp_path / 'orbit.traj'
+
+  # Writes that don't line up with the chunks
+  with TrajectoryWriter(str(path), 3, 0.01, 1, names=['a', 'b', 'c'], quantum=QUANTUM, chunkSteps=128, scenario='test') as f:
+    for start in range(0, 1000, 300):
+      f.write(positions[:,:,start:start + 300])
+
+  with TrajectoryReader(str(path)) as f:
+    assert len(f) == 1000 and f.names == ['a', 'b', 'c'] and f.header['scenario'] == 'test'
+    read = f.read()
+    assert read.shape == positions.shape
+    assert np.abs(read - positions).max() <= QUANTUM/2 * (1 + 1e-6)
+    assert np.allclose(f.times(10, 13), [0.1, 0.11, 0.12])
+
+def test_windows_across_chunks(tmp_path):
+  positions = _positions(steps=700)
+  path = tmp_path / 'orbit.traj'
+  saveTrajectory(str(path), positions, 0.01, 1, quantum=QUANTUM, chunkSteps=100)
+
+  with TrajectoryReader(str(path)) as f:
+    whole = f.read()
+    for start, stop in [(0, 100), (99, 101), (150, 450), (250, 700), (699, 700), (-50, None), (300, 300)]:
+      window = f.read(start, stop)
+      assert np.array_equal(window, whole[:,:,start:stop])
+      assert np.abs(window - positions[:,:,start:stop]).max(initial=0) <= QUANTUM/2 * (1 + 1e-6)
+
+    assert np.array_equal(f.read(120, 380, bodies=[2]), whole[[2],:,120:380])
+
+  read, header = loadTrajectory(str(path), 95, 205)
+  assert np.array_equal(read, whole[:,:,95:205]) and header['chunkSteps'] == 100
+
+def test_empty_and_unclosed(tmp_path):
+  path = tmp_path / 'empty.traj'
+  TrajectoryWriter(str(path), 2, 0.01, 1).close()
+  with TrajectoryReader(str(path)) as f:
+    assert len(f) == 0 and f.read().shape == (2, 3, 0)
+
+  path = tmp_path / 'unclosed.traj'
+  writer = TrajectoryWriter(str(path), 2, 0.01, 1, chunkSteps=10)
+  writer.write(np.zeros((2, 3, 25)))
+  writer.file.flush()
+  with pytest.raises(ValueError):
+    TrajectoryReader(str(path))
+  writer.close()
+
+def test_store_save(tmp_path):
+  positions = _positions(steps=300)
+  store = TrajectoryStore(3, chunkSteps=64)
+  for step in range(0, 300, 7):
+    store.append(positions[:,:,step:step + 7])
+  assert np.array_equal(store.read(50, 200), positions[:,:,50:200])
+
+  path = tmp_path / 'store.traj'
+  store.save(str(path), 0.01, 1, quantum=QUANTUM)
+  read, _ = loadTrajectory(str(path))
+  assert np.abs(read - positions).max() <= QUANTUM/2 * (1 + 1e-6)
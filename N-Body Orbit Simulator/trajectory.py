@@ -0,0 +1,315 @@
+import json
+import zlib
+import struct
+import bisect
+import numpy as np
+
+# File layout, all little endian:
+#   MAGIC
+#   uint32 header length, header as JSON (dt, G, names, integrator, quantum, ...)
+#   chunks, each one is
+#     uint32 steps, uint8 delta type, uint64 compressed length
+#     float64 origins (N,3), the first sample of the chunk
+#     zlib compressed deltas (N,3,steps) of the quantized positions
+#   index, one (uint64 first step, uint64 file offset) per chunk
+#   uint64 number of chunks, uint64 index offset, END
+MAGIC = b'NBTRAJ1\n'
+END = b'NBTREND\n'
+
+CHUNK = struct.Struct('<IBQ')
+INDEX = struct.Struct('<QQ')
+FOOTER = struct.Struct('<QQ')
+
+DELTA_TYPES = [np.int8, np.int16, np.int32, np.int64] # Smallest type the deltas fit in is used
+
+class TrajectoryWriter:
+  """Streams positions into a chunked, compressed trajectory file
+
+  Positions are quantized to multiples of quantum relative to the first sample of their
+  chunk, so the error of any stored coordinate is at most quantum / 2 and never adds up
+  over time. The quantized values are delta encoded along time and zlib compressed.
+
+  Usage:
+    with TrajectoryWriter('solarSystem.traj', len(CelestialBody.bodies), dt, G) as f:
+      f.write(positions)
+
+  """
+
+  def __init__(self, path, bodyNum, dt, G, names=None, integrator='RK4', quantum=1e-9, chunkSteps=4096, **metadata):
+    self.bodyNum = bodyNum # Number of bodies in every sample
+    self.quantum = quantum # Resolution the positions are stored with
+    self.chunkSteps = chunkSteps # Number of steps in a chunk, the unit of random access
+
+    self.header = dict(metadata, bodyNum=bodyNum, dt=dt, G=G, integrator=integrator,
+                       names=names if names is not None else [str(i) for i in range(bodyNum)],
+                       quantum=quantum, chunkSteps=chunkSteps)
+
+    self.file = open(path, 'wb')
+    header = json.dumps(self.header).encode()
+    self.file.write(MAGIC + struct.pack('<I', len(header)) + header)
+
+    self.index = [] # (first step, file offset) of every chunk
+    self.steps = 0 # Steps written to chunks so far
+    self.pending = [] # Positions not yet making up a full chunk
+    self.pendingSteps = 0
+
+  def write(self, positions):
+    """Append positions of shape (N,3,t) to the trajectory"""
+    positions = np.asarray(positions)
+    self.pending.append(positions)
+    self.pendingSteps += positions.shape[2]
+
+    if self.pendingSteps >= self.chunkSteps:
+      pending = np.concatenate(self.pending, axis=2)
+      full = (pending.shape[2] // self.chunkSteps) * self.chunkSteps
+
+      for start in range(0, full, self.chunkSteps):
+        self._writeChunk(pending[:,:,start:start + self.chunkSteps])
+
+      self.pending = [pending[:,:,full:]]
+      self.pendingSteps = pending.shape[2] - full
+
+  def close(self):
+    """Write the last partial chunk and the index"""
+    if self.file is None:
+      return
+
+    if self.pendingSteps:
+      self._writeChunk(np.concatenate(self.pending, axis=2))
+    self.pending = []
+
+    indexOffset = self.file.tell()
+    for entry in self.index:
+      self.file.write(INDEX.pack(*entry))
+    self.file.write(FOOTER.pack(len(self.index), indexOffset) + END)
+
+    self.file.close()
+    self.file = None
+
+  def _writeChunk(self, positions):
+    origins = np.array(positions[:,:,0], dtype='<f8')
+
+    # Quantize relative to the first sample, then delta encode along time
+    quantized = np.rint((positions - origins[:,:,None]) / self.quantum).astype(np.int64)
+    deltas = np.diff(quantized, axis=2, prepend=0)
+
+    for code, deltaType in enumerate(DELTA_TYPES):
+      info = np.iinfo(deltaType)
+      if deltas.size == 0 or (deltas.min() >= info.min and deltas.max() <= info.max):
+        break
+
+    data = zlib.compress(deltas.astype(np.dtype(deltaType).newbyteorder('<')).tobytes())
+
+    self.index.append((self.steps, self.file.tell()))
+    self.file.write(CHUNK.pack(positions.shape[2], code, len(data)))
+    self.file.write(origins.tobytes())
+    self.file.write(data)
+
+    self.steps += positions.shape[2]
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+class TrajectoryReader:
+  """Random access reader for files written by TrajectoryWriter
+
+  Only the header and the chunk index are read on open. read(start, stop) then
+  decompresses just the chunks overlapping the requested window.
+
+  """
+
+  def __init__(self, path):
+    self.file = open(path, 'rb')
+
+    if self.file.read(len(MAGIC)) != MAGIC:
+      raise ValueError(path + " is not a trajectory file")
+
+    length, = struct.unpack('<I', self.file.read(4))
+    self.header = json.loads(self.file.read(length))
+    self.bodyNum = self.header['bodyNum']
+    self.dt = self.header['dt']
+    self.G = self.header['G']
+    self.names = self.header['names']
+
+    # Footer and index at the end of the file
+    self.file.seek(-(FOOTER.size + len(END)), 2)
+    chunks, indexOffset = FOOTER.unpack(self.file.read(FOOTER.size))
+    if self.file.read(len(END)) != END:
+      raise ValueError(path + " was not closed properly")
+
+    self.file.seek(indexOffset)
+    index = [INDEX.unpack(self.file.read(INDEX.size)) for _ in range(chunks)]
+    self.starts = [start for start, _ in index] # First step of every chunk
+    self.offsets = [offset for _, offset in index] # Where every chunk starts in the file
+
+    # The last chunk's length gives the total number of steps
+    self.steps = 0
+    if index:
+      self.file.seek(self.offsets[-1])
+      steps, _, _ = CHUNK.unpack(self.file.read(CHUNK.size))
+      self.steps = self.starts[-1] + steps
+
+  def __len__(self):
+    return self.steps
+
+  def read(self, start=0, stop=None, bodies=None):
+    """Get positions in the time window start:stop (in steps)
+
+    Inputs:
+      start, stop: Window of steps to read, default the whole trajectory
+      bodies: Indices of bodies to return, default all
+
+    Outputs:
+      positions: Positions of shape (N,3,stop - start), same format as solve_RK4
+
+    """
+    start, stop, _ = slice(start, stop).indices(self.steps)
+    stop = max(start, stop)
+    bodies = slice(None) if bodies is None else bodies
+
+    parts = []
+    first = max(bisect.bisect_right(self.starts, start) - 1, 0)
+    for i in range(first, len(self.starts)):
+      if self.starts[i] >= stop:
+        break
+
+      chunk = self._readChunk(i)[bodies]
+      parts.append(chunk[:,:,max(start - self.starts[i], 0):stop - self.starts[i]])
+
+    if not parts:
+      return np.zeros((self.bodyNum, 3, 0))[bodies]
+    return np.concatenate(parts, axis=2)
+
+  def times(self, start=0, stop=None):
+    """Get the simulation times of the steps start:stop"""
+    start, stop, _ = slice(start, stop).indices(self.steps)
+    return np.arange(start, stop) * self.dt
+
+  def close(self):
+    self.file.close()
+
+  def _readChunk(self, i):
+    self.file.seek(self.offsets[i])
+    steps, code, length = CHUNK.unpack(self.file.read(CHUNK.size))
+
+    origins = np.frombuffer(self.file.read(self.bodyNum * 3 * 8), dtype='<f8').reshape(self.bodyNum, 3)
+    deltaType = np.dtype(DELTA_TYPES[code]).newbyteorder('<')
+    deltas = np.frombuffer(zlib.decompress(self.file.read(length)), dtype=deltaType).reshape(self.bodyNum, 3, steps)
+
+    return origins[:,:,None] + np.cumsum(deltas, axis=2, dtype=np.int64) * self.header['quantum']
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+class TrajectoryStore:
+  """Growable in memory trajectory made of fixed size chunks
+
+  Appending fills the last chunk and starts a new one when it is full, so the
+  steps already stored are never copied or moved and views of them stay valid
+  while the trajectory grows.
+
+  The number of bodies may grow too (see bodies.BodyStore). Appending more rows
+  than before widens only the last chunk, earlier chunks and their views keep
+  fewer rows, and read fills the rows they lack with NaN.
+
+  Usage:
+    store = TrajectoryStore(len(CelestialBody.bodies))
+    store.append(positions) # (N,3) or (N,3,t)
+    for chunk in store.views(): # Zero-copy (N,3,t) views
+      ...
+
+  """
+
+  def __init__(self, bodyNum, dtype='d', chunkSteps=4096):
+    self.bodyNum = bodyNum
+    self.dtype = np.dtype(dtype)
+    self.chunkSteps = chunkSteps # Number of steps in a chunk
+    self.chunks = [] # Full size (N,3,chunkSteps) arrays, only the last one is partly filled
+    self.steps = 0 # Number of steps stored
+
+  def __len__(self):
+    return self.steps
+
+  def append(self, positions):
+    """Append positions of shape (N,3) for one step or (N,3,t) for t steps"""
+    positions = np.asarray(positions)
+    if positions.ndim == 2:
+      positions = positions[:,:,None]
+
+    if len(positions) > self.bodyNum:
+      self.bodyNum = len(positions)
+      if self.steps % self.chunkSteps: # Widen the partly filled last chunk
+        self.chunks[-1] = self._pad(self.chunks[-1], np.nan)
+
+    done = 0
+    while done < positions.shape[2]:
+      offset = self.steps % self.chunkSteps
+      if self.steps == len(self.chunks) * self.chunkSteps: # All chunks full
+        self.chunks.append(np.empty((self.bodyNum, 3, self.chunkSteps), dtype=self.dtype))
+
+      count = min(self.chunkSteps - offset, positions.shape[2] - done)
+      self.chunks[-1][:len(positions),:,offset:offset + count] = positions[:,:,done:done + count]
+      self.chunks[-1][len(positions):,:,offset:offset + count] = np.nan
+      done += count
+      self.steps += count
+
+  def views(self, start=0, stop=None):
+    """Zero-copy views (n,3,t) of the steps start:stop, one per chunk they overlap
+
+    Views of chunks filled before the number of bodies grew have fewer rows n.
+    """
+    start, stop, _ = slice(start, stop).indices(self.steps)
+
+    views = []
+    for i in range(start // self.chunkSteps, (stop - 1) // self.chunkSteps + 1 if stop > start else 0):
+      first = i * self.chunkSteps
+      views.append(self.chunks[i][:,:,max(start - first, 0):min(stop - first, self.chunkSteps)])
+    return views
+
+  def read(self, start=0, stop=None, bodies=None):
+    """Positions (N,3,stop - start), a view if the window lies in one chunk, else a copy"""
+    views = self.views(start, stop)
+    bodies = slice(None) if bodies is None else bodies
+
+    if len(views) == 1 and len(views[0]) == self.bodyNum:
+      return views[0][bodies]
+    if not views:
+      return np.zeros((self.bodyNum, 3, 0), dtype=self.dtype)[bodies]
+    return np.concatenate([self._pad(view, np.nan)[bodies] for view in views], axis=2)
+
+  def _pad(self, positions, value):
+    # Positions with rows added up to bodyNum
+    if len(positions) == self.bodyNum:
+      return positions
+    padded = np.full((self.bodyNum,) + positions.shape[1:], value, dtype=self.dtype)
+    padded[:len(positions)] = positions
+    return padded
+
+  def save(self, path, dt, G, **kwargs):
+    """Write the trajectory to a trajectory file, kwargs are passed to TrajectoryWriter
+
+    The file format has no gaps, so every stored position has to be finite (a fixed
+    set of bodies).
+    """
+    with TrajectoryWriter(path, self.bodyNum, dt, G, **kwargs) as f:
+      for view in self.views():
+        view = self._pad(view, np.nan)
+        if not np.isfinite(view).all():
+          raise ValueError("Trajectories with bodies added or removed cannot be saved")
+        f.write(view)
+
+def saveTrajectory(path, positions, dt, G, **kwargs):
+  """Write a whole (N,3,t) positions array, kwargs are passed to TrajectoryWriter"""
+  with TrajectoryWriter(path, len(positions), dt, G, **kwargs) as f:
+    f.write(positions)
+
+def loadTrajectory(path, start=0, stop=None):
+  """Read positions (N,3,t) and the header of a trajectory file"""
+  with TrajectoryReader(path) as f:
+    return f.read(start, stop), f.header
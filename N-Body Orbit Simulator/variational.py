@@ -0,0 +1,145 @@
+import numpy as np
+
+# Batched versions of the force and RK4 step that integrate B independent systems at
+# once, together with their variational equations. Positions and velocities have shape
+# (B,N,3), masses (N,) or (B,N), and the tangent vectors/state transition matrix
+# (phiR, phiV) have shape (B,3N,k) for k tangent vectors.
+
+def batchAccelerations(pos, mass, G):
+  """Accelerations of every body of every system, shape (B,N,3)"""
+  mass = np.broadcast_to(mass, pos.shape[:2])
+
+  diff = pos[:,:,None,:] - pos[:,None,:,:] # (B,N,N,3) separation ri - rj
+  r2 = np.einsum('bijk,bijk->bij', diff, diff)
+  idx = np.arange(pos.shape[1])
+  r2[:,idx,idx] = np.inf # A body does not pull on itself
+
+  return -G * np.einsum('bj,bij,bijk->bik', mass, r2 ** -1.5, diff)
+
+def batchJacobian(pos, mass, G):
+  """Jacobian d(acc)/d(pos) of every system, shape (B,3N,3N)
+
+  For i != j the block is G * mj * (I / r^3 - 3 * d d^T / r^5) with d = ri - rj,
+  and the diagonal blocks are minus the sum of the other blocks of their row.
+  """
+  B, N, _ = pos.shape
+  mass = np.broadcast_to(mass, (B, N))
+
+  diff = pos[:,:,None,:] - pos[:,None,:,:]
+  r2 = np.einsum('bijk,bijk->bij', diff, diff)
+  idx = np.arange(N)
+  r2[:,idx,idx] = np.inf
+
+  r3 = r2 ** -1.5
+  r5 = r2 ** -2.5
+  blocks = G * mass[:,None,:,None,None] * (np.eye(3) * r3[...,None,None]
+                                           - 3 * np.einsum('bijk,bijl->bijkl', diff, diff) * r5[...,None,None])
+
+  blocks[:,idx,idx] = -blocks.sum(axis=2) # Diagonal blocks, own term is zero because r = inf
+
+  return blocks.transpose(0, 1, 3, 2, 4).reshape(B, 3 * N, 3 * N)
+
+def batchJacobianProduct(pos, dR, mass, G):
+  """Jacobian d(acc)/d(pos) times tangent vectors dR of shape (B,3N,k), without forming it
+
+  Cheaper than batchJacobian(...) @ dR when there are only a few tangent vectors.
+  """
+  B, N, _ = pos.shape
+  mass = np.broadcast_to(mass, (B, N))
+  dR = dR.reshape(B, N, 3, -1)
+
+  diff = pos[:,:,None,:] - pos[:,None,:,:] # (B,N,N,3) separation ri - rj
+  r2 = np.einsum('bijk,bijk->bij', diff, diff)
+  idx = np.arange(N)
+  r2[:,idx,idx] = np.inf
+
+  dDiff = dR[:,:,None] - dR[:,None,:] # (B,N,N,3,k) change of the separation
+  proj = np.einsum('bijk,bijkl->bijl', diff, dDiff)
+
+  # d(acc_i) = -G sum_j mj (dDiff / r^3 - 3 d (d . dDiff) / r^5)
+  dAcc = -G * (np.einsum('bj,bij,bijkl->bikl', mass, r2 ** -1.5, dDiff)
+               - 3 * np.einsum('bj,bij,bijk,bijl->bikl', mass, r2 ** -2.5, diff, proj))
+
+  return dAcc.reshape(B, 3 * N, -1)
+
+def variationalStep(pos, vel, phiR, phiV, mass, G, dt, invT=None):
+  """RK4 step of the state and its tangent vectors
+
+  Inputs:
+    pos, vel: States of shape (B,N,3)
+    phiR, phiV: Position and velocity parts of the tangent vectors, shape (B,3N,k)
+    mass: Masses of shape (N,) or (B,N)
+    G: Gravitational constant
+    dt: Time step, scalar or one per system of shape (B,)
+    invT: 1 / T of shape (B,) when the last tangent vector is the derivative with
+          respect to the total time T of a run whose step is dt = T / steps
+
+  Outputs:
+    pos, vel, phiR, phiV: The state and tangent vectors after the step
+
+  """
+  dt = np.asarray(dt, dtype='d').reshape(-1, 1, 1)
+
+  def derivative(pos, vel, phiR, phiV):
+    acc = batchAccelerations(pos, mass, G)
+
+    # Few tangent vectors (i.e. chaos indicators) skip building the full Jacobian
+    if phiR.shape[2] < pos.shape[1]:
+      dphiR, dphiV = phiV, batchJacobianProduct(pos, phiR, mass, G)
+    else:
+      dphiR, dphiV = phiV, batchJacobian(pos, mass, G) @ phiR
+
+    # Stretching T stretches every step, which forces dy/dT with f(y) / T
+    if invT is not None:
+      dphiR = dphiR.copy()
+      dphiR[:,:,-1] += vel.reshape(len(vel), -1) * invT[:,None]
+      dphiV[:,:,-1] += acc.reshape(len(acc), -1) * invT[:,None]
+
+    return vel, acc, dphiR, dphiV
+
+  div = np.array([1,2,2,1]) # This is the constants for each iteration of "K"
+  K = [np.zeros_like(pos), np.zeros_like(vel), np.zeros_like(phiR), np.zeros_like(phiV)]
+  total = [np.zeros_like(pos), np.zeros_like(vel), np.zeros_like(phiR), np.zeros_like(phiV)]
+
+  for i in range(4):
+    K = derivative(*(x + k * dt / div[i] for x, k in zip((pos, vel, phiR, phiV), K)))
+    for s, k in zip(total, K):
+      s += k * (div[i] / 6)
+
+  return tuple(x + s * dt for x, s in zip((pos, vel, phiR, phiV), total))
+
+def propagate(pos, vel, mass, G, T, steps, phi=None, period=False):
+  """Integrate systems over times T in a fixed number of steps, with their tangent vectors
+
+  Inputs:
+    pos, vel: Initial states of shape (B,N,3)
+    mass: Masses of shape (N,) or (B,N)
+    G: Gravitational constant
+    T: Time to integrate over, scalar or one per system of shape (B,)
+    steps: Number of RK4 steps, each system uses dt = T / steps
+    phi: Initial tangent vectors of shape (B,6N,k), default the identity (the
+         state transition matrix)
+    period: Also integrate dy/dT, the derivative of the final state with respect
+            to T, as an extra last tangent vector. It is exact for the fixed step
+            map, unlike f(y(T))
+
+  Outputs:
+    pos, vel: Final states
+    phi: Final tangent vectors, shape (B,6N,k), or (B,6N,k+1) with period
+
+  """
+  B, N, _ = pos.shape
+  if phi is None:
+    phi = np.broadcast_to(np.eye(6 * N), (B, 6 * N, 6 * N))
+  if period:
+    phi = np.concatenate([phi, np.zeros((B, 6 * N, 1))], axis=2)
+
+  phiR, phiV = phi[:,:3*N].copy(), phi[:,3*N:].copy()
+  T = np.broadcast_to(np.asarray(T, dtype='d'), (B,))
+  dt = T / steps
+  invT = 1 / T if period else None
+
+  for _ in range(steps):
+    pos, vel, phiR, phiV = variationalStep(pos, vel, phiR, phiV, mass, G, dt, invT)
+
+  return pos, vel, np.concatenate([phiR, phiV], axis=1)
@@ -1,15 +1,20 @@
-from typing import List, Tuple, Union
-import struct
+from typing import List, Union
 import time
 import threading
 
 import libs.Constants as Constants
 from libs.Constants import SerialPacketIDs
 from libs.SerialInterface import SerialPortInterface
-from libs.SerialInterface import ReadingThread
+from libs.PacketSchema import PacketSchemaRegistry
 import libs.SerialPortScanner as SerialPortScanner
 
 
+# The layouts of the Test Serial Interface packets. Each one gets a WritePacket_<name> method
+# on TestSerialInterface, and is parsed when it is received.
+TestPacketSchemas = PacketSchemaRegistry()
+TestPacketSchemas.Register(SerialPacketIDs.INT_PACKET_ID, 'Int', [('value', 'uint32_t')])
+
+
 ###################################################################################################
 #<!--                                  ButtonHandler Serial Port Interface                      -->
 ###################################################################################################
@@ -31,28 +36,15 @@ class TestSerialInterface(SerialPortInterface):
 
         # Create the SerialPortInterface object and bind it to the SensorHubInterface class
         super().__init__(port, Constants.TEST_SERIAL_BAUD_RATE, 
-                         self.__ParseTestSerialPacket__, self.__PacketReceived__)
+                         TestPacketSchemas.ParsePacket, self.__PacketReceived__,
+                         Constants.TEST_SERIAL_FRAMED)
 
         # We can now call any methods from SerialPortInterface using self rather than super()
 
         # Start reading on the backgrond thread
         self.StartReading()
 
-    ###################################################################################################
-    #<!--                                  Write Methods                                            -->
-    ###################################################################################################
-
-    def WritePacket_Int(self, value: int) -> bool:
-        """
-        Writes an LED packet over the serial port to turn an LED on or off.
-
-        @param ledID (Constants.LedIDs) - The LED to control.
-        @param state (bool)             - True to turn LED HIGH, or False to set it LOW
-
-        @return (bool)    - True if the packet was successfully written.
-        """
-        packet = struct.pack('>I', value)
-        return self.__WritePacket__(SerialPacketIDs.INT_PACKET_ID, packet)
+    # The WritePacket_<name> methods are generated from TestPacketSchemas, see the end of the file
 
     ###################################################################################################
     #<!--                          Parsing Packet Helper Functions (Don't Call)                     -->
@@ -66,28 +58,10 @@ class TestSerialInterface(SerialPortInterface):
 
         @return (bool) - Whether to add this packet to the serial packet buffer or not.
         """
-        print("Received packet: " + packet)
+        print("Received packet: " + str(packet))
         # We want to add all packets to the buffer
-        return False
-
-
-    def __ParseTestSerialPacket__(self, packet: dict, packetID: int, packetBytes: bytearray) -> Tuple[dict, bytearray, bool]:
-        """
-        Parses serial packets specific to the Test Serial Interface.
-
-        @param packet (dict)           - The current packet to parse the data into
-        @param packetID (int)          - The packetID to parse
-        @param packetBytes (bytearray) - The bytes of the packet read over the serial port
-
-        @return (Tuple[dict, bytearray, bool])
-                - dict      - The parsed packet.
-                - bytearray - The remaining bytes that were not parsed into the packet.
-                - bool      - Whether the packet was parsed or not.
-        """
-        didParsePacket = False
+        return True
 
-        if packetID == SerialPacketIDs.INT_PACKET_ID:
-            packet["value"], packetBytes    = ReadingThread.UnpackUint32_t(packetBytes)
-            didParsePacket = True
 
-        return (packet, packetBytes, didParsePacket)
\ No newline at end of file
+# Generate the write methods of the Test Serial Interface packets, i.e. WritePacket_Int(value)
+TestPacketSchemas.AddWriteMethods(TestSerialInterface)
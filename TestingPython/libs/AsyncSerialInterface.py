@@ -0,0 +1,501 @@
+import os
+import re
+import serial
+import asyncio
+from collections import deque
+from typing import List, Callable
+
+from libs.Constants import SerialPacketIDs
+from libs.SerialInterface import PACKET_BUFFER_SIZE, SerialPacketSchemas, DecodeSerialLine, ParseSerialPacket, FramePacket
+from libs.Framing import FrameParser, LineParser, EncodePacketFrame
+from libs.PacketCursor import AdaptPacketParsingFunc
+from libs.PacketBuffer import PacketBuffer
+
+READ_CHUNK_SIZE = 4096 # The maximum number of bytes read from the serial port per readiness callback
+
+
+###################################################################################################
+#<!--                                 Async Serial Port Interface                               -->
+###################################################################################################
+
+class AsyncSerialPortInterface:
+    """
+    An asyncio version of SerialPortInterface. Instead of a background reading thread, the serial
+    port's file descriptor is put in non-blocking mode and registered with the event loop
+    (loop.add_reader), so lines are parsed on the event loop as soon as they arrive.
+
+    Waiting for packets or strings only parks a future, so any number of concurrent waits costs no
+    threads. Packets that no one is waiting for are kept in a buffer, like SerialPortInterface, and
+    are handed to the next wait that matches them. Waits that don't match a buffered packet leave
+    it in the buffer for other waits.
+
+    Needs an event loop that supports add_reader on ttys, i.e. the default loop on Linux and macOS.
+
+    Usage:
+        async with AsyncSerialPortInterface('/dev/ttyACM0', 9600, parseFunc) as interface:
+            await interface.WritePacket_PingRequest(5)
+            reply = await interface.WaitForPacket([SerialPacketIDs.PING_REPLY_PACKET_ID], timeoutSeconds=1)
+
+            async for packet in interface:
+                ...
+    """
+
+    def __init__(self,
+                 comPort: str,
+                 baudRate: int=9600,
+                 packetParsingFunc: Callable=None,
+                 packetInterruptFunc: Callable[[dict], bool]=None,
+                 framed: bool=False
+                 ) -> None:
+        """
+        Creates a new Async Serial Port Interface object. Call ConnectSerialPort() (or use it with
+        `async with`) from inside the event loop to open the port.
+
+        @param comPort (str)                   - The serial port to connect to (i.e. '/dev/ttyACM0')
+        @param baudRate (int)                  - The Baud Rate to use on the serial port
+        @param packetParsingFunc (Callable)    - A function that is used to parse additional packets, of either kind
+                                                 described in libs/PacketCursor.py
+        @param packetInterruptFunc (Callable[[dict], bool]) - A function that is called whenever a packet is received. If false
+                                                              is returned, it won't be handed to any waits.
+        @param framed (bool)                   - True to use the length-prefixed, checksummed framed protocol (see libs/Framing.py)
+                                                 instead of text lines. It carries packets only, there are no serial strings.
+        """
+        self.__serPort = None               # the serial port object
+        self.__fd = None                    # the serial port's file descriptor
+        self.__loop = None                  # the event loop the port is registered with
+        self.__comPort = comPort            # the COM port
+        self.__baudRate = baudRate          # the baud rate to use
+
+        self.packetParsingFunc = AdaptPacketParsingFunc(packetParsingFunc) # A function that is used to parse additional packets
+        self.packetInterruptFunc = packetInterruptFunc # A function that is called whenever a packet is received. If false is returned,
+                                                       # it won't add that packet to the packet buffer.
+
+        self.serialStringInputBuffer = deque()  # Type: Deque[str] the serial println's no one was waiting for
+        self.serialPacketInputBuffer = PacketBuffer(PACKET_BUFFER_SIZE) # Type: PacketBuffer the packets no one was waiting for, indexed by packet ID
+
+        self.__lineParser = LineParser()    # the parser of incoming lines, if the text protocol is used
+        self.__frameParser = FrameParser()  # the parser of incoming frames, if the framed protocol is used
+        self.framed = framed                # True if the framed protocol is used
+        self.__writeLock = asyncio.Lock()   # keeps concurrent writes from interleaving their bytes
+        self.__writableFuture = None        # the future a write blocked on a full output buffer is waiting on
+
+        # Futures waiting for packets, by the packet ID they wait for. A future waiting for several IDs
+        # is in several queues until its wait returns, and is skipped if it is found already resolved.
+        self.__packetWaiters = {}           # Type: Dict[int, Deque[asyncio.Future]]
+        self.__anyPacketWaiters = deque()   # Type: Deque[asyncio.Future] futures waiting for any packet
+        self.__stringWaiters = []           # Type: List[Tuple[re.Pattern, asyncio.Future]] futures waiting for a string
+
+
+    async def __aenter__(self) -> 'AsyncSerialPortInterface':
+        self.ConnectSerialPort()
+        return self
+
+
+    async def __aexit__(self, *exc) -> None:
+        self.DisconnectSerialPort()
+
+
+    ###################################################################################################
+    #<!--                                  Connections                                              -->
+    ###################################################################################################
+
+    def ConnectSerialPort(self) -> None:
+        """
+        Opens the serial port in non-blocking mode and starts reading it on the running event loop.
+        """
+        self.__loop = asyncio.get_running_loop()
+        self.__serPort = serial.Serial(
+                port=self.__comPort,
+                baudrate=self.__baudRate,
+                parity=serial.PARITY_NONE,
+                stopbits=serial.STOPBITS_ONE,
+                bytesize=serial.EIGHTBITS,
+                timeout=0)
+        self.__fd = self.__serPort.fileno()
+        os.set_blocking(self.__fd, False)
+        self.__loop.add_reader(self.__fd, self.__OnReadable__)
+
+
+    def DisconnectSerialPort(self) -> None:
+        """
+        Stops reading and closes the serial port. Every pending wait returns None, and every pending write returns False.
+        """
+        if self.__serPort == None:
+            return
+
+        self.__loop.remove_reader(self.__fd)
+        self.__loop.remove_writer(self.__fd)
+        self.__serPort.close()
+        self.__serPort = None
+        self.__fd = None
+
+        # Wake the write waiting on the port, it gives up once it sees the port is closed
+        if self.__writableFuture != None and not self.__writableFuture.done():
+            self.__writableFuture.set_result(None)
+
+        # Wake every pending wait, as if it timed out
+        for waiters in list(self.__packetWaiters.values()) + [self.__anyPacketWaiters]:
+            for future in waiters:
+                if not future.done():
+                    future.set_result(None)
+        for _, future in self.__stringWaiters:
+            if not future.done():
+                future.set_result(None)
+        self.__packetWaiters.clear()
+        self.__anyPacketWaiters.clear()
+        self.__stringWaiters.clear()
+
+
+    def IsConnected(self) -> bool:
+        """
+        @return (bool)  - True if the serial port is open
+        """
+        return self.__serPort != None
+
+
+    ###################################################################################################
+    #<!--                                  Write Packet                                             -->
+    ###################################################################################################
+
+    async def WritePacket(self, packetId: int, packet: bytearray) -> bool:
+        """
+        Writes the given packet bytes across the serial port with the given packet ID, waiting
+        on the event loop whenever the port's output buffer is full.
+
+        @param packetId (int)      - The Packet's ID.
+        @param packet (bytearray)  - The Packet's data to send.
+
+        @return (bool)  - Whether the packet was successfully written or not
+        """
+        if self.__serPort == None:
+            return False
+
+        if self.framed:
+            data = memoryview(EncodePacketFrame(packetId, packet))
+        else:
+            data = memoryview(FramePacket(packetId, packet))
+        async with self.__writeLock:
+            try:
+                while data:
+                    # The port was closed while this write was waiting
+                    if self.__serPort == None:
+                        return False
+
+                    try:
+                        data = data[os.write(self.__fd, data):]
+                    except BlockingIOError:
+                        pass
+
+                    if data:
+                        await self.__WaitForWritable__()
+            except OSError as e:
+                print("Serial Port Write Failed: " + str(e))
+                return False
+
+        return True
+
+
+    async def WritePacket_PingRequest(self, sequenceNum: int=0) -> bool:
+        """
+        Writes a ping request packet over the serial port.
+
+        @param sequenceNum (int)   - The sequence number to send
+
+        @return (bool)   True: If the packet was successfully written.
+                         False: If the packet was not successfully written.
+        """
+        packet = SerialPacketSchemas.Encode(SerialPacketIDs.PING_REQUEST_PACKET_ID, sequenceNum)
+        return await self.WritePacket(SerialPacketIDs.PING_REQUEST_PACKET_ID, packet)
+
+
+    async def WritePacket_PingReply(self, sequenceNum: int=0) -> bool:
+        """
+        Writes a ping reply packet over the serial port.
+
+        @param sequenceNum (int)   - The sequence number to send
+
+        @return (bool)   True: If the packet was successfully written.
+                         False: If the packet was not successfully written.
+        """
+        packet = SerialPacketSchemas.Encode(SerialPacketIDs.PING_REPLY_PACKET_ID, sequenceNum)
+        return await self.WritePacket(SerialPacketIDs.PING_REPLY_PACKET_ID, packet)
+
+
+    ###################################################################################################
+    #<!--                                  Read Packet                                              -->
+    ###################################################################################################
+
+    async def WaitForPacket(self, packetIDsToMatch: List[int]=None, timeoutSeconds: float=None) -> dict:
+        """
+        Waits until a packet with one of the packet IDs in packetIDsToMatch is received, or takes the
+        oldest matching one from the packet buffer. Packets that don't match are left in the buffer.
+
+        @param packetIDsToMatch (List[int])  - The packet IDs to match (or a single packet ID). If set to None,
+                                               any packet matches
+        @param timeoutSeconds (float)        - The amount of seconds before this method times out and returns None.
+                                               If set to None, this method won't time out.
+
+        @return (dict)  - The packet matched or None on timeout
+        """
+        if isinstance(packetIDsToMatch, int):
+            packetIDsToMatch = [packetIDsToMatch]
+
+        # Take the oldest matching packet that is already buffered
+        packet = self.serialPacketInputBuffer.Pop(packetIDsToMatch)
+        if packet != None:
+            return packet
+
+        if self.__serPort == None:
+            return None
+
+        future = self.__loop.create_future()
+        if packetIDsToMatch == None:
+            queues = [self.__anyPacketWaiters]
+        else:
+            queues = [self.__packetWaiters.setdefault(int(packetID), deque()) for packetID in packetIDsToMatch]
+        for waiters in queues:
+            waiters.append(future)
+
+        try:
+            return await self.__WaitForFuture__(future, timeoutSeconds)
+        except asyncio.CancelledError:
+            # A packet handed to this wait just as it was cancelled goes back to the buffer
+            if future.done() and not future.cancelled() and future.result() != None:
+                self.__BufferPacket__(future.result())
+            raise
+        finally:
+            # Take the future out of the queues it wasn't resolved from. Waits are resolved oldest
+            # first, so it is usually close to the front.
+            for waiters in queues:
+                try:
+                    waiters.remove(future)
+                except ValueError:
+                    pass
+
+
+    async def WaitForAllPackets(self, packetIDsToMatch: List[int], timeoutSeconds: float=None) -> List[dict]:
+        """
+        Waits until all of the packet IDs in the array packetIDsToMatch are matched. It doesn't matter
+        the order in which they are received. Only one packet ID from packetIDsToMatch can match each packet.
+
+        @param packetIDsToMatch (List[int])  - The packet IDs to match
+        @param timeoutSeconds (float)        - The amount of seconds before this method times out and returns None.
+                                               If set to None, this method won't time out.
+
+        @return (List[dict])  - The packets matched, in the order of packetIDsToMatch, or None on timeout.
+                                The packets matched before a timeout go back to the packet buffer
+        """
+        waits = [asyncio.ensure_future(self.WaitForPacket([packetID])) for packetID in packetIDsToMatch]
+        try:
+            await asyncio.wait(waits, timeout=timeoutSeconds)
+        finally:
+            # Stop the waits still going, a wait cancelled as it was handed a packet buffers it again
+            for wait in waits:
+                wait.cancel()
+            await asyncio.gather(*waits, return_exceptions=True)
+
+            packets = [None if wait.cancelled() else wait.result() for wait in waits]
+            if None in packets:
+                # Timed out, disconnected or cancelled, leave the packets matched so far for other waits
+                for packet in packets:
+                    if packet != None:
+                        self.__BufferPacket__(packet)
+
+        if None in packets:
+            return None
+        return packets
+
+
+    def __aiter__(self) -> 'AsyncSerialPortInterface':
+        return self
+
+
+    async def __anext__(self) -> dict:
+        """
+        Iterating over the interface yields every packet as it arrives (starting with the buffered ones),
+        until the port is disconnected.
+        """
+        packet = await self.WaitForPacket()
+        if packet == None:
+            raise StopAsyncIteration
+        return packet
+
+
+    ###################################################################################################
+    #<!--                                   Read Serial String                                      -->
+    ###################################################################################################
+
+    async def WaitForSerialString(self, strToMatch: str=None, timeoutSeconds: float=None) -> str:
+        """
+        Waits until a serial string fully matching strToMatch is received, or takes the oldest
+        matching one from the string buffer. Strings that don't match are left in the buffer.
+
+        @param strToMatch (str)        - The string to match (supports regex). If set to None, any string matches
+        @param timeoutSeconds (float)  - The amount of seconds before this method times out and returns None.
+                                         If set to None, this method won't time out.
+
+        @return (str)  - The string matched or None on timeout
+        """
+        pattern = re.compile(strToMatch if strToMatch != None else ".*", re.DOTALL)
+
+        # Take the oldest matching string that is already buffered
+        for idx, line in enumerate(self.serialStringInputBuffer):
+            match = pattern.fullmatch(line)
+            if match:
+                del self.serialStringInputBuffer[idx]
+                return match.group(0)
+
+        if self.__serPort == None:
+            return None
+
+        future = self.__loop.create_future()
+        self.__stringWaiters.append((pattern, future))
+        try:
+            return await self.__WaitForFuture__(future, timeoutSeconds)
+        finally:
+            # Timed out or cancelled waits are still in the list
+            self.__stringWaiters = [(p, f) for p, f in self.__stringWaiters if f is not future]
+
+
+    ###################################################################################################
+    #<!--                                  Private Methods (Don't Call)                             -->
+    ###################################################################################################
+
+    async def __WaitForFuture__(self, future: asyncio.Future, timeoutSeconds: float) -> object:
+        """
+        Waits for a wait's future to be resolved by the reader.
+
+        @param future (asyncio.Future)  - The future of the wait
+        @param timeoutSeconds (float)   - The amount of seconds before giving up. If set to None, it waits forever
+
+        @return (object)  - The future's result, or None on timeout
+        """
+        try:
+            return await asyncio.wait_for(future, timeoutSeconds)
+        except asyncio.TimeoutError:
+            return None
+
+
+    async def __WaitForWritable__(self) -> None:
+        """
+        Waits until the serial port can be written to again.
+        """
+        future = self.__loop.create_future()
+        self.__writableFuture = future
+
+        def OnWritable() -> None:
+            self.__loop.remove_writer(self.__fd)
+            if not future.done():
+                future.set_result(None)
+
+        self.__loop.add_writer(self.__fd, OnWritable)
+        try:
+            await future
+        finally:
+            self.__writableFuture = None
+            if self.__fd != None:
+                self.__loop.remove_writer(self.__fd)
+
+
+    def __OnReadable__(self) -> None:
+        """
+        Called by the event loop when the serial port has bytes to read. Reads what is available
+        and handles every whole line.
+        """
+        try:
+            data = os.read(self.__fd, READ_CHUNK_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            print("Serial Port Read Failed: " + str(e))
+            self.DisconnectSerialPort()
+            return
+
+        if self.framed:
+            for packetBytes in self.__frameParser.Feed(data):
+                self.__HandlePacket__(packetBytes)
+            return
+
+        for line in self.__lineParser.Feed(data):
+            self.__HandleLine__(line)
+
+
+    def __HandleLine__(self, line: bytes) -> None:
+        """
+        Parses a single line read from the serial port and hands it to a wait, or buffers it.
+
+        @param line (bytes)  - The line read, without the newline
+        """
+        readStr, didReadPacket = DecodeSerialLine(line)
+        if readStr == None:
+            return
+
+        if didReadPacket: # We are reading a packet
+            self.__HandlePacket__(readStr[1:]) # remove the first char, which is '%'
+        else: # We are reading a serial print
+            self.__DeliverSerialString__(readStr)
+
+
+    def __HandlePacket__(self, packetBytes: bytes) -> None:
+        """
+        Parses a single packet and hands it to a wait, or buffers it.
+
+        @param packetBytes (bytes)  - The packet ID and data of the packet
+        """
+        try:
+            packet = ParseSerialPacket(packetBytes, self.packetParsingFunc)
+        except Exception as e:
+            print("Could not parse packet. " + str(e))
+            return
+
+        # Only hand this packet on if the interrupt function dictates
+        if self.packetInterruptFunc == None or self.packetInterruptFunc(packet):
+            self.__DeliverPacket__(packet)
+
+
+    def __DeliverPacket__(self, packet: dict) -> None:
+        """
+        Resolves the oldest wait for this packet's ID (or for any packet), or buffers the packet.
+
+        @param packet (dict)  - The packet received
+        """
+        for waiters in (self.__packetWaiters.get(packet['packetID']), self.__anyPacketWaiters):
+            while waiters:
+                future = waiters.popleft()
+                if not future.done():
+                    future.set_result(packet)
+                    return
+
+        # No one is waiting for this packet ID anymore
+        self.__packetWaiters.pop(packet['packetID'], None)
+        self.__BufferPacket__(packet)
+
+
+    def __BufferPacket__(self, packet: dict) -> None:
+        """
+        Keeps a packet no wait took in the packet buffer, for the next wait that matches it.
+
+        @param packet (dict)  - The packet
+        """
+        if not self.serialPacketInputBuffer.TryPush(packet):
+            print("Serial Packet Buffer Full")
+
+
+    def __DeliverSerialString__(self, line: str) -> None:
+        """
+        Resolves the oldest wait whose pattern matches this string, or buffers the string.
+
+        @param line (str)  - The serial string received
+        """
+        for idx, (pattern, future) in enumerate(self.__stringWaiters):
+            if not future.done():
+                match = pattern.fullmatch(line)
+                if match:
+                    del self.__stringWaiters[idx]
+                    future.set_result(match.group(0))
+                    return
+
+        if len(self.serialStringInputBuffer) >= PACKET_BUFFER_SIZE:
+            print("Serial Message Buffer Full")
+        else:
+            self.serialStringInputBuffer.append(line)
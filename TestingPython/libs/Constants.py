@@ -14,6 +14,7 @@ TEST_SERIAL_BAUD_RATE = 9600
 TEST_SERIAL_COM_PORT = '/dev/serial0'             # This value gets set automatically at runtime if set to None
                                         # Set this to non-None value to override automatic port connecting like: '/dev/ttyACM1' or 'COM11'
 TEST_SERIAL_DEVICE_NAME = 'ttyACM0'     # This can be found by connecting it and running the command `python -m serial.tools.list_ports -v`
+TEST_SERIAL_FRAMED = False              # True to talk to the Test Serial Interface with the framed protocol (see libs/Framing.py)
 
 # All Serial Packet IDs
 @unique # Make sure each ID is unique
@@ -0,0 +1,356 @@
+import struct
+import binascii
+from typing import List
+
+# Framed protocol
+# ---------------
+# Every frame on the wire is the COBS encoding of
+#     [Length (uint16)][Payload (Length bytes)][CRC (uint16)]
+# followed by a single 0x00 delimiter. All integers are little endian.
+#   - COBS (Consistent Overhead Byte Stuffing) removes every 0x00 from the encoded bytes, so the
+#     delimiter can only ever mean "end of frame", whatever the payload contains.
+#   - The CRC is CRC-16/CCITT-FALSE (polynomial 0x1021, initial value 0xFFFF) over the length and payload.
+# A packet's payload is its packet ID (uint32) followed by its data.
+#
+# Since frames are delimited by 0x00, the parser is back in sync at the first intact delimiter after
+# any corruption. A corrupted byte inside a frame only loses that frame. A corrupted delimiter merges
+# the frames on both sides of it, the parser then finds the end of the first one from its length
+# prefix and decodes both, so a single bad byte loses at most one frame.
+
+MAX_PAYLOAD_SIZE = 0xFFFF   # The largest payload the uint16 length field can describe
+FRAME_DELIMITER = 0         # The byte that ends every frame
+
+CRC_INIT = 0xFFFF           # The initial value of the CRC
+
+
+###################################################################################################
+#<!--                                          COBS                                             -->
+###################################################################################################
+
+def CobsEncode(data: bytes) -> bytes:
+    """
+    Encodes bytes with Consistent Overhead Byte Stuffing, so the result contains no 0x00.
+
+    @param data (bytes)  - The bytes to encode
+
+    @return (bytes)  - The encoded bytes, at most len(data) / 254 + 1 bytes longer
+    """
+    out = bytearray()
+    start = 0
+    while True:
+        end = min(start + 254, len(data))
+        zeroIdx = data.find(FRAME_DELIMITER, start, end)
+
+        if zeroIdx != -1:
+            # a block of non-zero bytes ended by a zero
+            out.append(zeroIdx - start + 1)
+            out += data[start:zeroIdx]
+            start = zeroIdx + 1
+        elif end - start == 254:
+            # a full block of 254 non-zero bytes, which doesn't stand for a zero
+            out.append(0xFF)
+            out += data[start:end]
+            start = end
+        else:
+            # the last block
+            out.append(end - start + 1)
+            out += data[start:end]
+            return bytes(out)
+
+
+def CobsDecode(data: bytes) -> bytes:
+    """
+    Decodes bytes encoded by CobsEncode.
+
+    @param data (bytes)  - The encoded bytes, without the frame delimiter
+
+    @return (bytes)  - The decoded bytes
+
+    @raise ValueError  - If the data is not valid COBS
+    """
+    out = bytearray()
+    idx = 0
+    while idx < len(data):
+        code = data[idx]
+        end = idx + code
+        if code == 0 or end > len(data):
+            raise ValueError("Invalid COBS data")
+
+        out += data[idx + 1:end]
+        idx = end
+        if code != 0xFF and idx < len(data):
+            out.append(0)
+
+    return bytes(out)
+
+
+###################################################################################################
+#<!--                                         Frames                                            -->
+###################################################################################################
+
+def Crc16(data: bytes, crc: int=CRC_INIT) -> int:
+    """
+    Computes the CRC-16/CCITT-FALSE of the data.
+
+    @param data (bytes)  - The bytes to compute the CRC of
+    @param crc (int)     - The CRC to continue from, for computing it over several pieces
+
+    @return (int)  - The CRC
+    """
+    return binascii.crc_hqx(data, crc)
+
+
+def EncodeFrame(payload: bytes) -> bytes:
+    """
+    Builds the bytes to write across the serial port for a payload in the framed protocol.
+
+    @param payload (bytes)  - The payload of the frame
+
+    @return (bytes)  - The frame, including the trailing delimiter
+    """
+    if len(payload) > MAX_PAYLOAD_SIZE:
+        raise ValueError("Frame payload of " + str(len(payload)) + " bytes is too large")
+
+    body = struct.pack('<H', len(payload)) + bytes(payload)
+    return CobsEncode(body + struct.pack('<H', Crc16(body))) + bytes([FRAME_DELIMITER])
+
+
+def EncodePacketFrame(packetId: int, packet: bytes) -> bytes:
+    """
+    Builds the frame of a packet in the framed protocol.
+
+    @param packetId (int)   - The Packet's ID.
+    @param packet (bytes)   - The Packet's data to send.
+
+    @return (bytes)  - The frame, including the trailing delimiter
+    """
+    return EncodeFrame(struct.pack('<I', packetId) + bytes(packet))
+
+
+def DecodeFrame(frame: bytes) -> bytes:
+    """
+    Decodes and checks a single frame.
+
+    @param frame (bytes)  - The encoded frame, without the delimiter
+
+    @return (bytes)  - The payload of the frame
+
+    @raise ValueError  - If the frame is corrupted
+    """
+    body = CobsDecode(frame)
+    if len(body) < 4:
+        raise ValueError("Frame too short")
+
+    length, = struct.unpack_from('<H', body, 0)
+    if length != len(body) - 4:
+        raise ValueError("Frame length mismatch")
+
+    crc, = struct.unpack_from('<H', body, len(body) - 2)
+    if crc != Crc16(body[:-2]):
+        raise ValueError("Frame CRC mismatch")
+
+    return body[2:-2]
+
+
+def FindFrameEnd(data: bytes) -> int:
+    """
+    Finds where the first frame ends in encoded frames that were merged by a lost delimiter. The COBS
+    blocks of the first frame are decoded until they hold its length prefix and as many bytes as it
+    gives.
+
+    @param data (bytes)  - The encoded frames, without the final delimiter
+
+    @return (int)  - The index of the byte that took the place of the first frame's delimiter, or -1
+                     if the blocks don't add up to the length of a frame
+    """
+    body = bytearray()
+    idx = 0
+    while idx < len(data):
+        code = data[idx]
+        end = idx + code
+        if code == 0 or end > len(data):
+            return -1
+
+        body += data[idx + 1:end]
+        idx = end
+        if len(body) >= 2:
+            frameSize = struct.unpack_from('<H', body, 0)[0] + 4
+            if len(body) == frameSize:
+                return idx
+            if len(body) > frameSize:
+                return -1
+
+        if code != 0xFF:
+            body.append(0)
+
+    return -1
+
+
+###################################################################################################
+#<!--                                      Frame Parser                                         -->
+###################################################################################################
+
+class FrameParser:
+    """
+    Incremental parser of the framed protocol. It takes the bytes read from the serial port in
+    chunks of any size and returns the payloads of the frames they complete.
+
+    Corrupted frames are dropped and counted. Since the parser splits frames on the delimiter
+    first, it is back in sync with the frame after the next intact delimiter. A run of bytes that
+    doesn't decode is split after the length of its first frame (see FindFrameEnd), so the frames
+    merged by a corrupted delimiter are still parsed.
+    """
+
+    def __init__(self, maxPayloadSize: int=MAX_PAYLOAD_SIZE) -> None:
+        """
+        @param maxPayloadSize (int)  - The largest payload accepted. Longer runs of bytes without a
+                                       delimiter are thrown away rather than buffered forever
+        """
+        self.__buffer = bytearray()     # the bytes of the frame read so far
+        self.__discarding = False       # True while skipping the rest of a frame that was too long
+        self.__maxFrameSize = len(CobsEncode(bytes(maxPayloadSize + 4))) # the longest valid encoded frame
+
+        self.frameCount = 0             # the number of frames parsed
+        self.errorCount = 0             # the number of frames dropped because they were corrupted
+
+
+    def Feed(self, data: bytes) -> List[bytes]:
+        """
+        Adds bytes read from the serial port and parses the frames they complete.
+
+        @param data (bytes)  - The bytes read
+
+        @return (List[bytes])  - The payloads of the frames completed, in order
+        """
+        self.__buffer += data
+
+        payloads = []
+        start = 0
+        end = self.__buffer.find(FRAME_DELIMITER)
+        while end != -1:
+            if self.__discarding:
+                self.__discarding = False
+            elif end > start: # Empty frames (back to back delimiters) are just padding
+                payloads += self.__DecodeFrames__(self.__buffer[start:end])
+
+            start = end + 1
+            end = self.__buffer.find(FRAME_DELIMITER, start)
+        del self.__buffer[:start]
+
+        # A frame this long can't be valid, skip everything up to the next delimiter
+        if len(self.__buffer) > self.__maxFrameSize:
+            self.__buffer.clear()
+            if not self.__discarding:
+                self.__discarding = True
+                self.errorCount += 1
+
+        return payloads
+
+
+    def Reset(self) -> None:
+        """
+        Throws away the bytes of a partially read frame.
+        """
+        self.__buffer.clear()
+        self.__discarding = False
+
+
+    def __DecodeFrames__(self, data: bytes) -> List[bytes]:
+        """
+        Decodes the bytes between two delimiters, which are one frame unless a delimiter was corrupted.
+
+        @param data (bytes)  - The encoded bytes, without the delimiter
+
+        @return (List[bytes])  - The payloads of the frames that decoded
+        """
+        payloads = []
+        while data:
+            try:
+                payloads.append(DecodeFrame(data))
+                self.frameCount += 1
+                break
+            except ValueError:
+                pass
+
+            # Split off the first frame by its length and go on with the rest
+            frameEnd = FindFrameEnd(data)
+            if frameEnd == -1 or frameEnd >= len(data):
+                self.errorCount += 1
+                break
+
+            try:
+                payloads.append(DecodeFrame(data[:frameEnd]))
+                self.frameCount += 1
+            except ValueError:
+                self.errorCount += 1
+            data = data[frameEnd + 1:]
+
+        return payloads
+
+
+###################################################################################################
+#<!--                                       Line Parser                                         -->
+###################################################################################################
+
+class LineParser:
+    """
+    Incremental parser of the text protocol, where serial prints and packets (starting with '%')
+    are each ended by a newline. It takes the bytes read from the serial port in chunks of any size
+    and splits all the lines they complete at once, so the work per read scales with the bytes
+    read rather than with the number of lines.
+    """
+
+    def __init__(self, maxLineSize: int=MAX_PAYLOAD_SIZE) -> None:
+        """
+        @param maxLineSize (int)  - The longest line accepted. Longer runs of bytes without a
+                                    newline are thrown away rather than buffered forever
+        """
+        self.__buffer = bytearray()     # the bytes of the line read so far
+        self.__discarding = False       # True while skipping the rest of a line that was too long
+        self.__maxLineSize = maxLineSize
+
+        self.errorCount = 0             # the number of lines dropped because they were longer than maxLineSize
+
+
+    def Feed(self, data: bytes) -> List[bytearray]:
+        """
+        Adds bytes read from the serial port and splits off the lines they complete.
+
+        @param data (bytes)  - The bytes read
+
+        @return (List[bytearray])  - The lines completed, in order and without their newlines
+        """
+        self.__buffer += data
+
+        lines = []
+        end = self.__buffer.rfind(b'\n')
+        if end != -1:
+            lines = self.__buffer[:end].split(b'\n')
+            del self.__buffer[:end + 1]
+
+            if self.__discarding:
+                self.__discarding = False
+                del lines[0]
+
+            # Lines completed within a single chunk never sat in the buffer, check them too
+            if any(len(line) > self.__maxLineSize for line in lines):
+                keptLines = [line for line in lines if len(line) <= self.__maxLineSize]
+                self.errorCount += len(lines) - len(keptLines)
+                lines = keptLines
+
+        # A line this long is not something we can use, skip everything up to the next newline
+        if len(self.__buffer) > self.__maxLineSize:
+            self.__buffer.clear()
+            if not self.__discarding:
+                self.__discarding = True
+                self.errorCount += 1
+
+        return lines
+
+
+    def Reset(self) -> None:
+        """
+        Throws away the bytes of a partially read line.
+        """
+        self.__buffer.clear()
+        self.__discarding = False
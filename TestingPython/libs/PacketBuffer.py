@@ -0,0 +1,201 @@
+import time
+import itertools
+import threading
+from collections import deque
+from typing import Iterable, List
+
+
+###################################################################################################
+#<!--                                      Packet Buffer                                        -->
+###################################################################################################
+
+class PacketBuffer:
+    """
+    A bounded, thread-safe buffer of packets indexed by packet ID. Every packet ID has its own FIFO
+    queue, so taking the oldest packet of an ID is O(1) and leaves the packets of other IDs for their
+    own consumers. Every packet also gets a global sequence number as it arrives, which keeps the
+    order across IDs for taking the oldest packet of any ID.
+
+    Consumers can block in WaitPop, which wakes up as soon as a packet is pushed.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        """
+        Creates an empty packet buffer.
+
+        @param capacity (int)  - The maximum number of packets the buffer can hold
+        """
+        self.__queues = {}                 # Type: Dict[int, Deque[Tuple[int, dict]]] the (sequence, packet) of every packet ID
+        self.__order = deque()             # Type: Deque[Tuple[int, int]] the (sequence, packetID) of the packets in arrival order.
+                                           # Packets taken by ID leave their entry behind, see __IsInBuffer__
+        self.__sequence = itertools.count() # the global sequence numbers
+        self.__capacity = capacity         # the maximum number of packets
+        self.__count = 0                   # the number of packets in the buffer
+        self.__lock = threading.Lock()     # the mutex lock guarding the buffer
+        self.__notEmpty = threading.Condition(self.__lock) # notified whenever a packet is pushed
+
+        self.droppedCount = 0              # the number of packets dropped because the buffer was full
+
+
+    def TryPush(self, packet: dict) -> bool:
+        """
+        Appends a packet to the queue of its packet ID if there is room for it, as one atomic operation.
+
+        @param packet (dict)  - The packet to append
+
+        @return (bool)     - True if the packet was appended, False if the buffer was full and it was dropped
+        """
+        with self.__lock:
+            if self.__count == self.__capacity:
+                self.droppedCount += 1
+                return False
+
+            sequence = next(self.__sequence)
+            packetID = packet['packetID']
+            queue = self.__queues.get(packetID)
+            if queue == None:
+                queue = self.__queues[packetID] = deque()
+            queue.append((sequence, packet))
+            self.__order.append((sequence, packetID))
+            self.__count += 1
+
+            # Packets taken by ID leave entries behind in the order, drop them once they pile up
+            if len(self.__order) > 2 * self.__count + 64:
+                self.__order = deque(entry for entry in self.__order if self.__IsInBuffer__(entry))
+
+            self.__notEmpty.notify_all()
+            return True
+
+
+    def Pop(self, packetIDs: Iterable[int]=None) -> dict:
+        """
+        Removes and returns the oldest packet with one of the packet IDs.
+
+        @param packetIDs (Iterable[int])  - The packet IDs to take a packet of. If set to None, the oldest packet of any ID is taken
+
+        @return (dict)  - The oldest packet, or None if there is none
+        """
+        with self.__lock:
+            return self.__PopPacket__(packetIDs)
+
+
+    def WaitPop(self, packetIDs: Iterable[int]=None, timeoutSeconds: float=None) -> dict:
+        """
+        Removes and returns the oldest packet with one of the packet IDs, waiting for one to be pushed if there is none.
+
+        @param packetIDs (Iterable[int])  - The packet IDs to take a packet of. If set to None, the oldest packet of any ID is taken
+        @param timeoutSeconds (float)     - The maximum amount of seconds to wait. If set to None, it waits forever
+
+        @return (dict)  - The oldest packet, or None on timeout
+        """
+        timeoutTargetTime = None if timeoutSeconds == None else time.monotonic() + timeoutSeconds
+        with self.__lock:
+            while True:
+                packet = self.__PopPacket__(packetIDs)
+                if packet != None:
+                    return packet
+
+                if timeoutTargetTime == None:
+                    self.__notEmpty.wait()
+                else:
+                    secondsLeft = timeoutTargetTime - time.monotonic()
+                    if secondsLeft <= 0:
+                        return None
+                    self.__notEmpty.wait(secondsLeft)
+
+
+    def Drain(self, maxItems: int=None) -> List[dict]:
+        """
+        Removes and returns up to maxItems of the oldest packets of any ID under a single lock acquisition.
+
+        @param maxItems (int)  - The maximum number of packets to remove. If set to None, all packets are removed
+
+        @return (List[dict])   - The packets removed, oldest first
+        """
+        with self.__lock:
+            count = self.__count if maxItems == None else min(maxItems, self.__count)
+            return [self.__PopPacket__(None) for _ in range(count)]
+
+
+    def Clear(self) -> None:
+        """
+        Removes all packets from the buffer.
+        """
+        with self.__lock:
+            self.__queues.clear()
+            self.__order.clear()
+            self.__count = 0
+
+
+    def Snapshot(self) -> List[dict]:
+        """
+        Returns a copy of the packets in the buffer without removing them.
+
+        @return (List[dict])  - The packets in the buffer, oldest first
+        """
+        with self.__lock:
+            packets = [entry for queue in self.__queues.values() for entry in queue]
+        packets.sort(key=lambda entry: entry[0])
+        return [packet for _, packet in packets]
+
+
+    def Count(self, packetID: int) -> int:
+        """
+        @param packetID (int)  - The packet ID
+
+        @return (int)  - The number of packets of the packet ID in the buffer
+        """
+        with self.__lock:
+            queue = self.__queues.get(packetID)
+            return 0 if queue == None else len(queue)
+
+
+    def __PopPacket__(self, packetIDs: Iterable[int]) -> dict:
+        """
+        Removes and returns the oldest packet with one of the packet IDs. The lock must already be held.
+
+        @param packetIDs (Iterable[int])  - The packet IDs to take a packet of, or None for any ID
+
+        @return (dict)  - The oldest packet, or None if there is none
+        """
+        if packetIDs == None:
+            # Skip the entries of packets already taken by ID
+            while self.__order and not self.__IsInBuffer__(self.__order[0]):
+                self.__order.popleft()
+            if not self.__order:
+                return None
+            queue = self.__queues[self.__order.popleft()[1]]
+        else:
+            # The oldest of the heads of the queues of the packet IDs
+            queue = None
+            for packetID in packetIDs:
+                candidate = self.__queues.get(packetID)
+                if candidate and (queue == None or candidate[0][0] < queue[0][0]):
+                    queue = candidate
+            if queue == None:
+                return None
+
+        self.__count -= 1
+        return queue.popleft()[1]
+
+
+    def __IsInBuffer__(self, entry: tuple) -> bool:
+        """
+        Whether the packet of an entry of the arrival order is still in the buffer. Packets of an ID
+        are always taken oldest first, so it is if it isn't older than the head of its ID's queue.
+
+        @param entry (tuple)  - The (sequence, packetID) entry
+
+        @return (bool)  - True if the packet is still in the buffer
+        """
+        queue = self.__queues.get(entry[1])
+        return bool(queue) and queue[0][0] <= entry[0]
+
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return self.__count
+
+
+    def __repr__(self) -> str:
+        return repr(self.Snapshot())
@@ -0,0 +1,156 @@
+import struct
+from typing import Callable, Union
+
+# Precompiled structs of the data types packets are made of, so their formats are parsed only once
+UINT64_STRUCT = struct.Struct('<Q')
+UINT32_STRUCT = struct.Struct('<I')
+UINT16_STRUCT = struct.Struct('<H')
+UINT8_STRUCT  = struct.Struct('<B')
+DOUBLE_STRUCT = struct.Struct('<d')
+FLOAT_STRUCT  = struct.Struct('<f')
+
+
+###################################################################################################
+#<!--                                      Packet Cursor                                        -->
+###################################################################################################
+
+class PacketCursor:
+    """
+    Decodes the fields of a packet by moving an offset through a memoryview of its bytes, so
+    decoding never copies the rest of the packet. Formats should be precompiled struct.Struct
+    objects, and a packet body with a fixed layout is best decoded with a single Unpack call.
+
+    Usage:
+        INT_PACKET_STRUCT = struct.Struct('<IH')
+        value, count = cursor.Unpack(INT_PACKET_STRUCT)
+    """
+
+    def __init__(self, packetBytes: Union[bytes, bytearray, memoryview], offset: int=0) -> None:
+        """
+        @param packetBytes (Union[bytes, bytearray, memoryview])  - The bytes of the packet
+        @param offset (int)                                       - The offset to start decoding at
+        """
+        self.view = memoryview(packetBytes)  # the bytes of the packet
+        self.offset = offset                 # the offset of the next byte to decode
+
+
+    def Unpack(self, packetStruct: struct.Struct) -> tuple:
+        """
+        Decodes the fields of packetStruct at the cursor and moves past them.
+
+        @param packetStruct (struct.Struct)  - The precompiled layout of the fields
+
+        @return (tuple)  - The fields decoded
+        """
+        values = packetStruct.unpack_from(self.view, self.offset)
+        self.offset += packetStruct.size
+        return values
+
+
+    def UnpackUint64_t(self) -> int:
+        return self.Unpack(UINT64_STRUCT)[0]
+
+
+    def UnpackUint32_t(self) -> int:
+        return self.Unpack(UINT32_STRUCT)[0]
+
+
+    def UnpackUint16_t(self) -> int:
+        return self.Unpack(UINT16_STRUCT)[0]
+
+
+    def UnpackUint8_t(self) -> int:
+        return self.Unpack(UINT8_STRUCT)[0]
+
+
+    def UnpackDouble(self) -> float:
+        return self.Unpack(DOUBLE_STRUCT)[0]
+
+
+    def UnpackFloat(self) -> float:
+        return self.Unpack(FLOAT_STRUCT)[0]
+
+
+    def UnpackChar(self) -> int:
+        return self.Unpack(UINT8_STRUCT)[0]
+
+
+    def UnpackString(self, strLen: int) -> str:
+        string = str(self.view[self.offset:self.offset + strLen], "ascii")
+        self.offset += strLen
+        return string.strip().strip("\\r\\n")
+
+
+    def Skip(self, numBytes: int) -> None:
+        """
+        Moves the cursor past bytes without decoding them.
+
+        @param numBytes (int)  - The number of bytes to skip
+        """
+        self.offset += numBytes
+
+
+    def Remaining(self) -> memoryview:
+        """
+        @return (memoryview)  - The bytes not decoded yet, without copying them
+        """
+        return self.view[self.offset:]
+
+
+    def __len__(self) -> int:
+        """
+        @return (int)  - The number of bytes not decoded yet
+        """
+        return len(self.view) - self.offset
+
+
+###################################################################################################
+#<!--                                Packet Parsing Functions                                   -->
+###################################################################################################
+
+# Packet parsing functions decode the packets that are not universal serial packets. They come in two kinds:
+#   - Cursor parsing functions (marked with @CursorPacketParsingFunc):
+#         (packet: dict, packetID: int, cursor: PacketCursor) -> bool
+#     decode the fields into packet, moving the cursor past them, and return whether the packet was parsed.
+#   - Legacy parsing functions:
+#         (packet: dict, packetID: int, packetBytes: bytearray) -> Tuple[dict, bytearray, bool]
+#     return the parsed packet, the bytes left over and whether the packet was parsed. AdaptPacketParsingFunc
+#     turns them into cursor parsing functions, handing them a bytearray of the rest of the packet just like
+#     before, so bytearray methods keep working and raw-bytes fields they store don't point into the read buffer.
+
+def CursorPacketParsingFunc(packetParsingFunc: Callable[[dict, int, PacketCursor], bool]) -> Callable[[dict, int, PacketCursor], bool]:
+    """
+    Decorator that marks a packet parsing function as taking a PacketCursor.
+
+    @param packetParsingFunc (Callable[[dict, int, PacketCursor], bool])  - The parsing function
+
+    @return (Callable[[dict, int, PacketCursor], bool])  - The same parsing function
+    """
+    packetParsingFunc.usesPacketCursor = True
+    return packetParsingFunc
+
+
+def AdaptPacketParsingFunc(packetParsingFunc: Callable) -> Callable[[dict, int, PacketCursor], bool]:
+    """
+    Turns a packet parsing function of either kind into a cursor parsing function.
+
+    @param packetParsingFunc (Callable)  - The parsing function, or None
+
+    @return (Callable[[dict, int, PacketCursor], bool])  - The cursor parsing function, or None
+    """
+    if packetParsingFunc == None or getattr(packetParsingFunc, 'usesPacketCursor', False):
+        return packetParsingFunc
+
+    def LegacyPacketParsingFunc(packet: dict, packetID: int, cursor: PacketCursor) -> bool:
+        packetBytes = bytearray(cursor.Remaining())
+        parsedPacket, packetBytes, didParsePacket = packetParsingFunc(packet, packetID, packetBytes)
+        cursor.Skip(len(cursor) - len(packetBytes))
+
+        # The legacy contract allows returning a different dict
+        if parsedPacket is not packet:
+            packet.clear()
+            packet.update(parsedPacket)
+        return didParsePacket
+
+    LegacyPacketParsingFunc.usesPacketCursor = True
+    return LegacyPacketParsingFunc
@@ -0,0 +1,213 @@
+import re
+import struct
+from typing import List, Tuple
+
+from libs.PacketCursor import PacketCursor, CursorPacketParsingFunc
+
+# The struct format of every field type a packet can declare, named like their C types on the microcontroller
+FIELD_TYPE_FORMATS = {
+    'uint8_t':  'B',
+    'uint16_t': 'H',
+    'uint32_t': 'I',
+    'uint64_t': 'Q',
+    'int8_t':   'b',
+    'int16_t':  'h',
+    'int32_t':  'i',
+    'int64_t':  'q',
+    'float':    'f',
+    'double':   'd',
+    'bool':     '?',
+    'char':     'B',
+}
+
+STRING_FIELD_TYPE = re.compile(r'char\[(\d+)\]') # Fixed length strings, i.e. 'char[16]'
+
+
+###################################################################################################
+#<!--                                      Packet Schema                                        -->
+###################################################################################################
+
+class PacketSchema:
+    """
+    The layout of one packet type: its packet ID and the fields of its body, in order.
+    All fields are little endian and packed, like the packets unpacked by ReadingThread.
+    The whole body is encoded or decoded with a single precompiled struct.Struct.
+    """
+
+    def __init__(self, packetID: int, name: str, fields: List[Tuple[str, str]]) -> None:
+        """
+        @param packetID (int)                  - The packet ID
+        @param name (str)                      - The name of the packet type, which names its write method WritePacket_<name>
+        @param fields (List[Tuple[str, str]])  - The (name, type) of every field, with the types of FIELD_TYPE_FORMATS
+                                                 or 'char[N]' for a string of N chars
+        """
+        self.packetID = int(packetID)
+        self.name = name
+        self.fieldNames = [fieldName for fieldName, _ in fields]
+
+        packetFormat = '<'
+        self.__stringFields = [] # the indices of the string fields, which are decoded to str
+        for idx, (fieldName, fieldType) in enumerate(fields):
+            stringMatch = STRING_FIELD_TYPE.fullmatch(fieldType)
+            if stringMatch:
+                packetFormat += stringMatch.group(1) + 's'
+                self.__stringFields.append(idx)
+            elif fieldType in FIELD_TYPE_FORMATS:
+                packetFormat += FIELD_TYPE_FORMATS[fieldType]
+            else:
+                raise ValueError("Unknown type '" + fieldType + "' of field '" + fieldName + "' in packet " + name)
+
+        self.struct = struct.Struct(packetFormat) # the compiled layout of the packet's body
+
+
+    def Encode(self, *args, **kwargs) -> bytes:
+        """
+        Encodes the body of a packet from its field values, given in order or by name.
+
+        @return (bytes)  - The packet's data to send
+        """
+        values = list(args) + [kwargs[fieldName] for fieldName in self.fieldNames[len(args):]]
+        for idx in self.__stringFields:
+            if isinstance(values[idx], str):
+                values[idx] = values[idx].encode("ascii")
+        return self.struct.pack(*values)
+
+
+    def Decode(self, packet: dict, cursor: PacketCursor) -> None:
+        """
+        Decodes the body of a packet into the packet dict, moving the cursor past it.
+
+        @param packet (dict)          - The packet to decode the fields into
+        @param cursor (PacketCursor)  - The cursor at the start of the packet's body
+        """
+        values = cursor.Unpack(self.struct)
+        packet.update(zip(self.fieldNames, values))
+
+        for idx in self.__stringFields:
+            fieldName = self.fieldNames[idx]
+            packet[fieldName] = packet[fieldName].split(b'\0', 1)[0].decode("ascii").strip()
+
+
+###################################################################################################
+#<!--                                 Packet Schema Registry                                    -->
+###################################################################################################
+
+class PacketSchemaRegistry:
+    """
+    A set of packet schemas that routes incoming packets to their decoder through a dict keyed by
+    packet ID, and generates the write methods of the packets, so adding a packet type takes
+    a single Register call.
+
+    Usage:
+        TestPacketSchemas = PacketSchemaRegistry()
+        TestPacketSchemas.Register(SerialPacketIDs.INT_PACKET_ID, 'Int', [('value', 'uint32_t')])
+
+        class TestSerialInterface(SerialPortInterface):
+            def __init__(self):
+                super().__init__(port, baudRate, TestPacketSchemas.ParsePacket)
+
+        TestPacketSchemas.AddWriteMethods(TestSerialInterface) # adds TestSerialInterface.WritePacket_Int(value)
+    """
+
+    def __init__(self) -> None:
+        self.__schemas = {} # Type: Dict[int, PacketSchema] the schemas by packet ID
+
+
+    def Register(self, packetID: int, name: str, fields: List[Tuple[str, str]]) -> PacketSchema:
+        """
+        Declares the layout of a packet type.
+
+        @param packetID (int)                  - The packet ID
+        @param name (str)                      - The name of the packet type, which names its write method WritePacket_<name>
+        @param fields (List[Tuple[str, str]])  - The (name, type) of every field, see PacketSchema
+
+        @return (PacketSchema)  - The schema of the packet type
+        """
+        if int(packetID) in self.__schemas:
+            raise ValueError("Packet ID " + str(packetID) + " is already registered")
+
+        schema = PacketSchema(packetID, name, fields)
+        self.__schemas[schema.packetID] = schema
+        return schema
+
+
+    def Get(self, packetID: int) -> PacketSchema:
+        """
+        @param packetID (int)  - The packet ID
+
+        @return (PacketSchema)  - The schema of the packet ID, or None if it isn't registered
+        """
+        return self.__schemas.get(packetID)
+
+
+    def Encode(self, packetID: int, *args, **kwargs) -> bytes:
+        """
+        Encodes the body of a packet from its field values, given in order or by name.
+
+        @param packetID (int)  - The packet ID
+
+        @return (bytes)  - The packet's data to send
+        """
+        return self.__schemas[packetID].Encode(*args, **kwargs)
+
+
+    @CursorPacketParsingFunc
+    def ParsePacket(self, packet: dict, packetID: int, cursor: PacketCursor) -> bool:
+        """
+        Decodes the body of a packet with the schema of its packet ID. It is a cursor packet parsing function,
+        so it can be passed as the packetParsingFunc of a serial interface.
+
+        @param packet (dict)          - The packet to decode the fields into
+        @param packetID (int)         - The packet ID
+        @param cursor (PacketCursor)  - The cursor at the start of the packet's body
+
+        @return (bool)  - Whether the packet was parsed or not, which it isn't if its packet ID isn't registered
+        """
+        schema = self.__schemas.get(packetID)
+        if schema == None:
+            return False
+
+        schema.Decode(packet, cursor)
+        return True
+
+
+    def AddWriteMethods(self, interfaceClass: type, writeMethodName: str='__WritePacket__') -> None:
+        """
+        Adds a WritePacket_<name>(*fieldValues) method to a serial interface class for every registered
+        packet type that it doesn't already have a method for.
+
+        @param interfaceClass (type)   - The serial interface class
+        @param writeMethodName (str)   - The name of the interface's method that writes a packet's ID and data,
+                                         i.e. 'WritePacket' for AsyncSerialPortInterface
+        """
+        for schema in self.__schemas.values():
+            methodName = 'WritePacket_' + schema.name
+            if not hasattr(interfaceClass, methodName):
+                setattr(interfaceClass, methodName, self.__MakeWriteMethod__(schema, writeMethodName))
+
+
+    def __iter__(self):
+        return iter(self.__schemas.values())
+
+
+    def __len__(self) -> int:
+        return len(self.__schemas)
+
+
+    @staticmethod
+    def __MakeWriteMethod__(schema: PacketSchema, writeMethodName: str):
+        """
+        Generates the write method of a packet type.
+
+        @param schema (PacketSchema)  - The schema of the packet type
+        @param writeMethodName (str)  - The name of the interface's method that writes a packet's ID and data
+
+        @return (Callable)  - The write method
+        """
+        def WritePacket(self, *args, **kwargs):
+            return getattr(self, writeMethodName)(schema.packetID, schema.Encode(*args, **kwargs))
+
+        WritePacket.__name__ = 'WritePacket_' + schema.name
+        WritePacket.__doc__ = ("Writes the " + schema.name + " packet over the serial port.\n\n" +
+                               "Fields: " + ", ".join(schema.fieldNames))
+        return WritePacket
@@ -0,0 +1,150 @@
+import time
+import threading
+from typing import Any, List
+
+
+###################################################################################################
+#<!--                                       Ring Buffer                                         -->
+###################################################################################################
+
+class RingBuffer:
+    """
+    A bounded, thread-safe FIFO queue backed by a fixed size circular array.
+    Pushing and popping are O(1), and every operation takes the lock only once.
+    Consumers can block in WaitPop, which wakes up as soon as an item is pushed.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        """
+        Creates an empty ring buffer.
+
+        @param capacity (int)  - The maximum number of items the buffer can hold
+        """
+        self.__items = [None] * capacity   # the circular array of items
+        self.__capacity = capacity         # the maximum number of items
+        self.__head = 0                    # index of the oldest item
+        self.__count = 0                   # the number of items in the buffer
+        self.__lock = threading.Lock()     # the mutex lock guarding the buffer
+        self.__notEmpty = threading.Condition(self.__lock) # notified whenever an item is pushed
+
+        self.droppedCount = 0              # the number of items dropped because the buffer was full
+
+
+    def TryPush(self, item: Any) -> bool:
+        """
+        Appends an item to the buffer if there is room for it, as one atomic operation.
+
+        @param item (Any)  - The item to append
+
+        @return (bool)     - True if the item was appended, False if the buffer was full and it was dropped
+        """
+        with self.__lock:
+            if self.__count == self.__capacity:
+                self.droppedCount += 1
+                return False
+
+            self.__items[(self.__head + self.__count) % self.__capacity] = item
+            self.__count += 1
+            self.__notEmpty.notify_all()
+            return True
+
+
+    def Pop(self) -> Any:
+        """
+        Removes and returns the oldest item in the buffer.
+
+        @return (Any)  - The oldest item, or None if the buffer is empty
+        """
+        with self.__lock:
+            return self.__PopItem__()
+
+
+    def WaitPop(self, timeoutSeconds: float=None) -> Any:
+        """
+        Removes and returns the oldest item in the buffer, waiting for one to be pushed if it is empty.
+
+        @param timeoutSeconds (float)  - The maximum amount of seconds to wait. If set to None, it waits forever
+
+        @return (Any)  - The oldest item, or None on timeout
+        """
+        with self.__lock:
+            if timeoutSeconds is None:
+                while self.__count == 0:
+                    self.__notEmpty.wait()
+            else:
+                timeoutTargetTime = time.monotonic() + timeoutSeconds
+                while self.__count == 0:
+                    secondsLeft = timeoutTargetTime - time.monotonic()
+                    if secondsLeft <= 0:
+                        return None
+                    self.__notEmpty.wait(secondsLeft)
+
+            return self.__PopItem__()
+
+
+    def Drain(self, maxItems: int=None) -> List[Any]:
+        """
+        Removes and returns up to maxItems of the oldest items under a single lock acquisition.
+
+        @param maxItems (int)  - The maximum number of items to remove. If set to None, all items are removed
+
+        @return (List[Any])    - The items removed, oldest first
+        """
+        with self.__lock:
+            count = self.__count if maxItems is None else min(maxItems, self.__count)
+
+            end = self.__head + count
+            if end <= self.__capacity:
+                items = self.__items[self.__head:end]
+                self.__items[self.__head:end] = [None] * count
+            else:
+                end -= self.__capacity
+                items = self.__items[self.__head:] + self.__items[:end]
+                self.__items[self.__head:] = [None] * (self.__capacity - self.__head)
+                self.__items[:end] = [None] * end
+
+            self.__head = end % self.__capacity
+            self.__count -= count
+            return items
+
+
+    def Clear(self) -> None:
+        """
+        Removes all items from the buffer.
+        """
+        self.Drain()
+
+
+    def Snapshot(self) -> List[Any]:
+        """
+        Returns a copy of the items in the buffer without removing them.
+
+        @return (List[Any])  - The items in the buffer, oldest first
+        """
+        with self.__lock:
+            return [self.__items[(self.__head + i) % self.__capacity] for i in range(self.__count)]
+
+
+    def __PopItem__(self) -> Any:
+        """
+        Removes and returns the oldest item. The lock must already be held.
+
+        @return (Any)  - The oldest item, or None if the buffer is empty
+        """
+        if self.__count == 0:
+            return None
+
+        item = self.__items[self.__head]
+        self.__items[self.__head] = None # don't keep a reference to popped items
+        self.__head = (self.__head + 1) % self.__capacity
+        self.__count -= 1
+        return item
+
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return self.__count
+
+
+    def __repr__(self) -> str:
+        return repr(self.Snapshot())
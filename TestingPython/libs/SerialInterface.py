@@ -1,15 +1,22 @@
 import re
 import time
-import struct
 import serial
 import threading
-from datetime import datetime, timedelta
 from typing import List, Tuple, Union, Callable
 
 import libs.Constants as Constants
 from libs.Constants import SerialPacketIDs
+from libs.RingBuffer import RingBuffer
+from libs.PacketBuffer import PacketBuffer
+from libs.Framing import FrameParser, LineParser, EncodePacketFrame
+from libs.PacketSchema import PacketSchemaRegistry
+from libs.PacketCursor import PacketCursor, AdaptPacketParsingFunc, UINT64_STRUCT, UINT32_STRUCT, UINT16_STRUCT, \
+                              UINT8_STRUCT, DOUBLE_STRUCT, FLOAT_STRUCT
 
 PACKET_BUFFER_SIZE = 1000
+WRITE_QUEUE_SIZE = 1000    # The number of packets the writing thread can have waiting to be written
+WRITE_BATCH_SIZE = 64      # The most packets the writing thread writes at once
+PRINT_SERIAL_READS = True   # Print every serial string and packet read. Turn off at high data rates
 
 # Struct Packing Documentation
 # Format | Type                 | Size (bytes)
@@ -48,6 +55,94 @@ def CloseAllSerialInterfaceObjects() -> None:
         interfaceObject.DisconnectSerialPort()  
 
 
+###################################################################################################
+#<!--                                    Serial Line Parsing                                    -->
+###################################################################################################
+
+# The layouts of the universal serial packets. Interfaces for specific devices declare theirs in
+# their own PacketSchemaRegistry, which they pass as their packetParsingFunc (see libs/PacketSchema.py)
+SerialPacketSchemas = PacketSchemaRegistry()
+SerialPacketSchemas.Register(SerialPacketIDs.PING_REQUEST_PACKET_ID, 'PingRequest', [('sequenceNum', 'uint32_t')])
+SerialPacketSchemas.Register(SerialPacketIDs.PING_REPLY_PACKET_ID,   'PingReply',   [('sequenceNum', 'uint32_t')])
+
+
+def DecodeSerialLine(readStr: bytes) -> Tuple[Union[bytearray, str], bool]:
+    """
+    Decodes a single line read from the serial port into either a packet or a serial print.
+
+    @param readStr (bytes)  - The line read from the serial port, with or without its newline
+
+    @return (Tuple[Union[str, bytearray], bool])
+            - Union[bytearray, str]
+                - bytearray   - The array of bytes that contain the packet's data, starting with the '%'.
+                - str         - The decoded serial print, or None if the line was empty.
+            - bool - True if we are reading a bytearray, False if we are reading a str
+    """
+    if readStr != None and readStr != "" and readStr != b'':
+        # we are reading in a serial print
+        if readStr[0] != "%".encode('ascii')[0]:
+            try: 
+                readStr = readStr.decode("ascii").strip().strip("\\r\\n")
+                if PRINT_SERIAL_READS:
+                    print("Serial Port Read: [" + readStr + "]")
+            except:
+                print("Serial Port Decode Error: " + str(readStr))
+                readStr = "SerialInterface: DECODE ERROR"
+            return readStr, False
+        # we are reading in a packet
+        else:
+            return readStr, True
+    return None, False
+
+
+def ParseSerialPacket(packetBytes: bytearray, packetParsingFunc: Callable=None) -> dict:
+    """
+    Parses a single packet from packetBytes. Decodes the fields with a PacketCursor, which
+    doesn't copy the packet's bytes as it goes.
+
+    @param packetBytes (bytearray)      - An array of bytes to parse the packet from, without the leading '%'.
+    @param packetParsingFunc (Callable) - A cursor packet parsing function that is used to parse the packets that are
+                                          not universal serial packets. Legacy parsing functions have to be adapted
+                                          once with AdaptPacketParsingFunc (see libs/PacketCursor.py)
+
+    @return (dict)  - The packet parsed
+    """
+    cursor = PacketCursor(packetBytes)
+    packetID = cursor.UnpackUint32_t()
+    packet = {"packetID": packetID}
+    
+    # Parse the universal serial packets through the dispatch table of their schemas, or else
+    # the packets from the helper packet parsing method supplied to the SerialHubInterface constructor
+    if not SerialPacketSchemas.ParsePacket(packet, packetID, cursor) and packetParsingFunc != None:
+        # We currently aren't using the bool return
+        packetParsingFunc(packet, packetID, cursor)
+
+    return packet
+
+
+def FramePacket(packetId: int, packet: bytearray) -> bytes:
+    """
+    Builds the bytes to write across the serial port for the given packet ID and packet bytes.
+    The format of serial communication looks like this:
+        `[Packet Number]+[Content]~
+
+    @param packetId (int)      - The Packet's ID.
+    @param packet (bytearray)  - The Packet's data to send.
+
+    @return (bytes)  - The framed packet
+    """
+    header = packetHeaders.get(packetId)
+    if header == None:
+        header = b"`" + str(int(packetId)).encode() + b"+"
+        packetHeaders[packetId] = header
+
+    # join sizes the result first, so the packet is assembled in a single buffer
+    return b"".join((header, packet, b"~"))
+
+
+packetHeaders = {} # The "`[Packet Number]+" that starts the packets of every packet ID written so far
+
+
 ###################################################################################################
 #<!--                                    Serial Port Interface                                  -->
 ###################################################################################################
@@ -56,32 +151,37 @@ class SerialPortInterface:
     def __init__(self, 
                  comPort: str, 
                  baudRate: int=9600, 
-                 packetParsingFunc: Callable[[dict, int, bytearray], Tuple[dict, bytearray, bool]]=None,
-                 packetInterruptFunc: Callable[[dict], bool]=None
+                 packetParsingFunc: Callable=None,
+                 packetInterruptFunc: Callable[[dict], bool]=None,
+                 framed: bool=False
                  ) -> None:
         """
         Creates a new Serial Port Interface object capable of reading both packets and strings, and writing packets.
 
         @param comPort (str)                   - The COM port to connect to (i.e. 'COM3')
         @param baudRate (int)                  - The Baud Rate to use on the serial port
-        @param packetParsingFunc (Callable[[dict, int, bytearray], Tuple[dict, bytearray, bool]]) - A function that is used to 
-                                                                                                   parse additional packets in 
-                                                                                                   the background thread
+        @param packetParsingFunc (Callable)    - A function that is used to parse additional packets in the background thread,
+                                                 of either kind described in libs/PacketCursor.py
+        @param framed (bool)                   - True to use the length-prefixed, checksummed framed protocol (see libs/Framing.py)
+                                                 instead of text lines. It carries packets only, there are no serial strings.
         """
         self.__serPort = None               # the serial port object to read and write to
         self.__comPort = comPort            # the COM port
         self.__baudRate = baudRate          # the baud rate to use
         self.__readThread = None            # the background reading thread
+        self.__writeThread = None           # the background writing thread
+        self.__frameParser = FrameParser()  # the parser of incoming frames, if the framed protocol is used
+        self.__lineParser = LineParser()    # the parser of incoming lines, if the text protocol is used
 
-        self.packetParsingFunc = packetParsingFunc     # A function that is used to parse additional packets in the background thread
+        self.framed = framed                # True if the framed protocol is used
+
+        self.packetParsingFunc = AdaptPacketParsingFunc(packetParsingFunc) # A function that is used to parse additional packets in the background thread
         self.packetInterruptFunc = packetInterruptFunc # A function that is called whenever a packet is received. If false is returned, 
                                                        # it won't add that packet to the packet buffer. 
         
-        self.serialStringInputBuffer = []   # Type: List[str] the input buffer that the reading thread appends to for serial println's
-        self.serialPacketInputBuffer = []   # Type: List[dict] the input buffer that the reading thread appends to for packets
-
-        self.serialStringInputBufferLock = threading.Lock() # The mutex lock for the string input buffer
-        self.serialPacketInputBufferLock = threading.Lock() # The mutex lock for the packet input buffer
+        self.serialStringInputBuffer = RingBuffer(PACKET_BUFFER_SIZE) # Type: RingBuffer[str] the input buffer that the reading thread appends to for serial println's
+        self.serialPacketInputBuffer = PacketBuffer(PACKET_BUFFER_SIZE) # Type: PacketBuffer the input buffer that the reading thread appends to for packets, indexed by packet ID
+        self.serialWriteQueue = RingBuffer(WRITE_QUEUE_SIZE)          # Type: RingBuffer[bytes] the packets waiting for the writing thread
 
         self.ConnectSerialPort()
         
@@ -107,10 +207,11 @@ class SerialPortInterface:
 
     def DisconnectSerialPort(self) -> None:
         """
-        Disconnects the serial port and closes it. Also closes the reading thread if it is running.
+        Disconnects the serial port and closes it. Also closes the reading and writing threads if they are running.
         """
         print("Disonnecting Serial Port " + self.__comPort + "... ", end='', flush=True)
         self.StopReading()
+        self.StopWriting()
         self.__serPort.close()
         self.__serPort = None
 
@@ -140,7 +241,7 @@ class SerialPortInterface:
         @return (bool)   True: If the packet was successfully written.
                          False: If the packet was not successfully written.
         """
-        packet = struct.pack('>I', sequenceNum)
+        packet = SerialPacketSchemas.Encode(SerialPacketIDs.PING_REQUEST_PACKET_ID, sequenceNum)
         return self.__WritePacket__(SerialPacketIDs.PING_REQUEST_PACKET_ID, packet)
 
 
@@ -153,7 +254,7 @@ class SerialPortInterface:
         @return (bool)   True: If the packet was successfully written.
                          False: If the packet was not successfully written.
         """
-        packet = struct.pack('>I', sequenceNum)
+        packet = SerialPacketSchemas.Encode(SerialPacketIDs.PING_REPLY_PACKET_ID, sequenceNum)
         return self.__WritePacket__(SerialPacketIDs.PING_REPLY_PACKET_ID, packet)
 
 
@@ -163,102 +264,48 @@ class SerialPortInterface:
 
     def WaitForPacket(self, packetID: int, delaySeconds: float=0.1, timeoutSeconds: float=None) -> dict:
         """
-        Continuosly reads the serial buffer until the exact packet ID is matched.
-        It is blocking.
+        Waits until a packet with the exact packet ID is in the serial buffer and reads it.
+        It is blocking, and wakes up as soon as the reading thread receives a packet.
+        Packets with other IDs are left in the buffer for their own consumers.
 
         @param packetID (int)          - The packet ID to match
-        @param delaySeconds (float)    - The amount of delay between checking whether there is a line available.
+        @param delaySeconds (float)    - Unused, kept for compatibility. Waiting no longer polls the buffer.
         @param timeoutSeconds (float)  - The amount of seconds before this method times out and returns None.
                                          If set to None, this method won't time out
             
         @return (dict)  - The packet matched or None on timeout
         """
-        # Set the target time for the timeout
-        timeoutTargetTime = None
-        if timeoutSeconds:
-            timeoutTargetTime = datetime.now() + timedelta(seconds=timeoutSeconds)
-
-        packet = None
-        match = False
-        while (not match):
-            packet = self.__ReadSerialPacketNonblocking__()
-            if packet:
-                match = (packet['packetID'] == packetID)
-
-            # Check if we have hit the timeout
-            if timeoutTargetTime and datetime.now() > timeoutTargetTime:
-                return None
-
-            time.sleep(delaySeconds)
-        
-        return packet
+        return self.__WaitForSerialPacket__(self.__GetTimeoutTargetTime__(timeoutSeconds), [packetID])
 
 
     def WaitForAnyPacketNoMatch(self, delaySeconds: float=0.1, timeoutSeconds: int=None) -> dict:
         """
         Continuosly reads the serial buffer until any packet is read
-        It is blocking.
+        It is blocking, and wakes up as soon as the reading thread receives a packet.
 
-        @param delaySeconds (float)            - The amount of delay between checking whether there is a packet available.
+        @param delaySeconds (float)            - Unused, kept for compatibility. Waiting no longer polls the buffer.
         @param timeoutSeconds (float)          - The amount of seconds before this method times out and returns None.
                                                  If set to None, this method won't time out
             
         @return (dict)  - The packet matched or None on timeout
         """
-        # Set the target time for the timeout
-        timeoutTargetTime = None
-        if timeoutSeconds:
-            timeoutTargetTime = datetime.now() + timedelta(seconds=timeoutSeconds)
-
-        while (True):
-            if (self.PacketAvailable()):
-                # read packet from serial port and check if it is a match
-                packet = self.__ReadSerialPacketNonblocking__()
-                if packet:
-                    return packet
-
-            # Check if we have hit the timeout
-            if timeoutTargetTime and datetime.now() > timeoutTargetTime:
-                return None
-
-            time.sleep(delaySeconds)
+        return self.__WaitForSerialPacket__(self.__GetTimeoutTargetTime__(timeoutSeconds))
 
 
     def WaitForAnyPacket(self, packetIDsToMatch: List[int], delaySeconds: float=0.1, timeoutSeconds: int=None) -> dict:
         """
-        Continuosly reads the serial buffer until one of the packets in the array packetIDsToMatch is matched.
-        It is blocking.
+        Waits until a packet with one of the packet IDs in the array packetIDsToMatch is in the serial buffer
+        and reads the oldest of them. It is blocking, and wakes up as soon as the reading thread receives a packet.
+        Packets with other IDs are left in the buffer for their own consumers.
 
         @param packetIDsToMatch (List[int])    - The packet IDs to match
-        @param delaySeconds (float)            - The amount of delay between checking whether there is a packet available.
+        @param delaySeconds (float)            - Unused, kept for compatibility. Waiting no longer polls the buffer.
         @param timeoutSeconds (float)          - The amount of seconds before this method times out and returns None.
                                                  If set to None, this method won't time out
             
         @return (dict)  - The packet matched or None on timeout
         """
-        # Set the target time for the timeout
-        timeoutTargetTime = None
-        if timeoutSeconds:
-            timeoutTargetTime = datetime.now() + timedelta(seconds=timeoutSeconds)
-
-        packet = None
-        match = False
-        while (not match):
-            # read packet from serial port and check if it is a match
-            packet = self.__ReadSerialPacketNonblocking__()
-            if packet:
-                for packetID in packetIDsToMatch:
-                    match = (packet['packetID'] == packetID)
-                    if match:
-                        break
-                
-            # Check if we have hit the timeout
-            if timeoutTargetTime and datetime.now() > timeoutTargetTime:
-                return None
-
-            time.sleep(delaySeconds)
-
-        return packet
+        return self.__WaitForSerialPacket__(self.__GetTimeoutTargetTime__(timeoutSeconds), packetIDsToMatch)
 
 
     def WaitForAllPackets(self, packetIDsToMatch: List[int], delaySeconds: float=0.1, timeoutSeconds: int=None) -> List[dict]:
@@ -266,47 +313,33 @@ class SerialPortInterface:
         Continuosly reads the serial buffer until all of the packet IDs in the array
         packetIDsToMatch are matched. It doesn't matter the order in which they are matched.
         It is blocking, and only one packet ID from strsToMatch can match each packet.
-        Will return None on timeout
+        Packets with other IDs are left in the buffer for their own consumers.
+        Will return None on timeout, in which case the packets already matched are lost.
 
         @param packetIDsToMatch (List[int])    - The packet IDs to match
-        @param delaySeconds (float)            - The amount of delay between checking whether there is a packet available.
+        @param delaySeconds (float)            - Unused, kept for compatibility. Waiting no longer polls the buffer.
         @param timeoutSeconds (float)          - The amount of seconds before this method times out and returns None.
                                                  If set to None, this method won't time out.
             
         @return (List[dict])  - The packets matched or None on timeout
         """
         # Set the target time for the timeout
-        timeoutTargetTime = None
-        if timeoutSeconds:
-            timeoutTargetTime = datetime.now() + timedelta(seconds=timeoutSeconds)
+        timeoutTargetTime = self.__GetTimeoutTargetTime__(timeoutSeconds)
 
         # Create an array to keep track of which IDs are left to be matched
-        packetIDsLeft = []
-        for id in packetIDsToMatch:
-            packetIDsLeft.append(id)
+        packetIDsLeft = list(packetIDsToMatch)
 
-        # keep track of the patterns we already matched in an array of tuples.
-        # Each tuple is (string: the string matched, int: the index in strsToMatch that it matched with)
+        # keep track of the packets we already matched
         packetsFound = []
 
-        # read packet from serial port until all strings have been found
-        while (len(packetsFound) != len(packetIDsLeft)):
-            packet = self.__ReadSerialPacketNonblocking__()
-            if packet:
-                for idx, packetID in enumerate(packetIDsLeft):
-                    # if it hasn't been matched yet
-                    if packetIDsLeft[idx] != None:
-                        match = (packet['packetID'] == packetID)
-                        if match:
-                            packetsFound.append(packet)
-                            packetIDsLeft[idx] = None
-                            break
-                
-            # Check if we have hit the timeout
-            if timeoutTargetTime and datetime.now() > timeoutTargetTime:
+        # read only the packets left to be matched until all packets have been found
+        while (len(packetIDsLeft) > 0):
+            packet = self.__WaitForSerialPacket__(timeoutTargetTime, packetIDsLeft)
+            if packet == None:
                 return None
 
-            time.sleep(delaySeconds)
+            packetsFound.append(packet)
+            packetIDsLeft.remove(packet['packetID'])
 
         return packetsFound
 
@@ -318,47 +351,40 @@ class SerialPortInterface:
     def WaitForSerialString(self, strToMatch: str, delaySeconds: float=0.1, timeoutSeconds: int=None) -> str:
         """
         Continuosly reads the serial buffer until the exact string is matched.
-        It is blocking.
+        It is blocking, and wakes up as soon as the reading thread receives a line.
 
         @param strToMatch (str)        - The string to match (supports regex)
-        @param delaySeconds (float)    - The amount of delay between checking whether there is a packet available.
+        @param delaySeconds (float)    - Unused, kept for compatibility. Waiting no longer polls the buffer.
         @param timeoutSeconds (float)  - The amount of seconds before this method times out and returns None.
                                         If set to None, this method won't time out.
             
         @return (str)  - The string matched or None on timeout
         """
         # Set the target time for the timeout
-        timeoutTargetTime = None
-        if timeoutSeconds:
-            timeoutTargetTime = datetime.now() + timedelta(seconds=timeoutSeconds)
+        timeoutTargetTime = self.__GetTimeoutTargetTime__(timeoutSeconds)
 
         # compile the string we want to match against into a pattern
         pattern = re.compile(strToMatch)
 
         # read line from serial port and check if it is a match
-        match = False
-        while (not match):
-            line = self.__ReadSerialStringNonblocking__()
-            if line:
-                match = pattern.fullmatch(line)
-                
-            # Check if we have hit the timeout
-            if timeoutTargetTime and datetime.now() > timeoutTargetTime:
+        while (True):
+            line = self.__WaitForSerialString__(timeoutTargetTime)
+            if line == None:
                 return None
 
-            time.sleep(delaySeconds)
-
-        return match.group(0)
+            match = pattern.fullmatch(line)
+            if match:
+                return match.group(0)
 
 
     def WaitForAnySerialString(self, strsToMatch: List[str], delaySeconds: float=0.1, timeoutSeconds: int=None) -> Tuple[str, int]:
         """
         Continuosly reads the serial buffer until one of the strings in the array
         strsToMatch is matched.
-        It is blocking.
+        It is blocking, and wakes up as soon as the reading thread receives a line.
 
         @param strsToMatch (List[str])     - The strings to match (supports regex)
-        @param delaySeconds (float)        - The amount of delay between checking whether there is a packet available.
+        @param delaySeconds (float)        - Unused, kept for compatibility. Waiting no longer polls the buffer.
         @param timeoutSeconds (float)      - The amount of seconds before this method times out and returns None.
                                             If set to None, this method won't time out.
             
@@ -367,9 +393,7 @@ class SerialPortInterface:
                 - int         - The index of which of the strings in strsToMatch was matched or -1 on timeout
         """
         # Set the target time for the timeout
-        timeoutTargetTime = None
-        if timeoutSeconds:
-            timeoutTargetTime = datetime.now() + timedelta(seconds=timeoutSeconds)
+        timeoutTargetTime = self.__GetTimeoutTargetTime__(timeoutSeconds)
 
         # compile the strings we want to match against into a pattern
         patterns = []
@@ -377,54 +401,29 @@ class SerialPortInterface:
             patterns.append(re.compile(strToMatch))
 
         # read line from serial port and check if it is a match
-        idxMatched = -1
-        match = False
-        while (not match):
-            line = self.__ReadSerialStringNonblocking__()
-            if line:
-                for idx, pattern in enumerate(patterns):
-                    match = pattern.fullmatch(line)
-                    if match:
-                        idxMatched = idx
-                        break
-
-            # Check if we have hit the timeout
-            if timeoutTargetTime and datetime.now() > timeoutTargetTime:
+        while (True):
+            line = self.__WaitForSerialString__(timeoutTargetTime)
+            if line == None:
                 return None, -1
 
-            time.sleep(delaySeconds)
-
-        return match.group(0), idxMatched
+            for idx, pattern in enumerate(patterns):
+                match = pattern.fullmatch(line)
+                if match:
+                    return match.group(0), idx
 
 
     def WaitForAnySerialString(self, delaySeconds: float=0.1, timeoutSeconds: int=None) -> Tuple[str, int]:
         """
         Continuosly reads the serial buffer until any serial string is available.
-        It is blocking.
+        It is blocking, and wakes up as soon as the reading thread receives a line.
 
-        @param delaySeconds (float)        - The amount of delay between checking whether there is a packet available.
+        @param delaySeconds (float)        - Unused, kept for compatibility. Waiting no longer polls the buffer.
         @param timeoutSeconds (float)      - The amount of seconds before this method times out and returns None.
                                             If set to None, this method won't time out.
             
         @return str   - The string matched or None on timeout
         """
-        # Set the target time for the timeout
-        timeoutTargetTime = None
-        if timeoutSeconds:
-            timeoutTargetTime = datetime.now() + timedelta(seconds=timeoutSeconds)
-
-        # read line from serial port and check if it is a match
-        while (True):
-            if (self.SerialStringAvailable()):
-                line = self.__ReadSerialStringNonblocking__()
-                if line:
-                    return line
-
-            # Check if we have hit the timeout
-            if timeoutTargetTime and datetime.now() > timeoutTargetTime:
-                return None
-
-            time.sleep(delaySeconds)
+        return self.__WaitForSerialString__(self.__GetTimeoutTargetTime__(timeoutSeconds))
 
 
     def WaitForAllSerialStrings(self, strsToMatch: List[str], delaySeconds: float=0.1, timeoutSeconds: int=None) -> List[Tuple[str, int]]:
@@ -434,7 +433,7 @@ class SerialPortInterface:
         It is blocking, and only one string from strsToMatch can match each line.
 
         @param strsToMatch (List[str])     - The strings to match (supports regex)
-        @param delaySeconds (float)        - The amount of delay between checking whether there is a packet available.
+        @param delaySeconds (float)        - Unused, kept for compatibility. Waiting no longer polls the buffer.
         @param timeoutSeconds (float)      - The amount of seconds before this method times out and returns None.
                                             If set to None, this method won't time out.
             
@@ -443,9 +442,7 @@ class SerialPortInterface:
                 - int               - The index of which of the strings in strsToMatch was matched.
         """
         # Set the target time for the timeout
-        timeoutTargetTime = None
-        if timeoutSeconds:
-            timeoutTargetTime = datetime.now() + timedelta(seconds=timeoutSeconds)
+        timeoutTargetTime = self.__GetTimeoutTargetTime__(timeoutSeconds)
 
         # compile the strings we want to match against into a pattern array
         patterns = []
@@ -458,22 +455,18 @@ class SerialPortInterface:
 
         # read line from serial port until all strings have been found
         while (len(patternsMatched) != len(patterns)):
-            line = self.__ReadSerialStringNonblocking__()
-            if line:
-                for idx, pattern in enumerate(patterns):
-                    # if it hasn't been matched yet
-                    if patterns[idx] != None:
-                        match = pattern.fullmatch(line)
-                        if match:
-                            patternsMatched.append((match.group(0), idx))
-                            patterns[idx] = None
-                            break
-                
-            # Check if we have hit the timeout
-            if timeoutTargetTime and datetime.now() > timeoutTargetTime:
+            line = self.__WaitForSerialString__(timeoutTargetTime)
+            if line == None:
                 return None
-                
-            time.sleep(delaySeconds)
+
+            for idx, pattern in enumerate(patterns):
+                # if it hasn't been matched yet
+                if patterns[idx] != None:
+                    match = pattern.fullmatch(line)
+                    if match:
+                        patternsMatched.append((match.group(0), idx))
+                        patterns[idx] = None
+                        break
 
         return patternsMatched
 
@@ -500,6 +493,28 @@ class SerialPortInterface:
         return (self.__GetSerialStringBufferLength__() > 0)
 
 
+    def DrainPackets(self, maxPackets: int=None) -> List[dict]:
+        """
+        Removes and returns the oldest packets from the packet buffer in one go.
+
+        @param maxPackets (int)  - The maximum number of packets to return. If set to None, all are returned
+
+        @return (List[dict])     - The packets read, oldest first
+        """
+        return self.serialPacketInputBuffer.Drain(maxPackets)
+
+
+    def DrainSerialStrings(self, maxStrings: int=None) -> List[str]:
+        """
+        Removes and returns the oldest serial strings from the string buffer in one go.
+
+        @param maxStrings (int)  - The maximum number of strings to return. If set to None, all are returned
+
+        @return (List[str])      - The strings read, oldest first
+        """
+        return self.serialStringInputBuffer.Drain(maxStrings)
+
+
     ###################################################################################################
     #<!--                                  Background Thread Stuff                                  -->
     ###################################################################################################
@@ -525,6 +540,30 @@ class SerialPortInterface:
             self.__readThread.stop()
             self.__readThread = None
 
+
+    def StartWriting(self) -> None:
+        """
+        Starts a background writing thread. Packets written afterwards are queued instead of written
+        right away, so writing a packet never blocks, and the thread writes all the packets queued
+        in one go.
+        """
+        if self.__writeThread == None:
+            self.__writeThread = WritingThread(self)
+            self.__writeThread.daemon = True
+            self.__writeThread.start()
+        else:
+            print("The writing thread was already running.")
+
+
+    def StopWriting(self) -> None:
+        """
+        Stops the background writing thread if it has been started, after it wrote the packets queued.
+        """
+        if self.__writeThread != None:
+            self.__writeThread.stop()
+            self.__writeThread.join()
+            self.__writeThread = None
+
     
     ###################################################################################################
     #<!--                                  Private Methods (Don't Call)                             -->
@@ -559,34 +598,40 @@ class SerialPortInterface:
         @param packetId (int)      - The Packet's ID.
         @param packet (bytearray)  - The Packet's data to send.
 
-        @return (bool)          - Whether the packet was successfully written or not
+        @return (bool)          - Whether the packet was successfully written (or queued, if the writing thread is running) or not
         """
         if self.__serPort.isOpen():
-            try:
-                self.__serPort.write("`".encode())
-                self.__serPort.write((str(packetId)).encode())
-                self.__serPort.write("+".encode())
-                self.__serPort.write(packet)
-                self.__serPort.write("~".encode())
+            # Assemble the whole packet first, so it is written with a single call
+            if self.framed:
+                packetBytes = EncodePacketFrame(packetId, packet)
+            else:
+                packetBytes = FramePacket(packetId, packet)
 
+            # The writing thread writes the packet when it gets to it
+            if self.__writeThread != None:
+                if not self.serialWriteQueue.TryPush(packetBytes):
+                    print("Serial Write Queue Full")
+                    return False
                 return True
-            except serial.SerialTimeoutException:
-                print("Serial Port Write Timout, Reconnecting...")
-                
-                # if the reading thread was running beforehand, we want to reconnect that too
-                # after stopping it
-                if self.__readThread != None:
-                    reconnectReadThread = True
-                self.StopReading()
-
-                self.DisconnectSerialPort()
-                self.ConnectSerialPort()
-
-                # reconnect reading thread again
-                if reconnectReadThread:
-                    self.StartReading()
-
-                return False
+
+            if self.WriteToSerialPort_Blocking(packetBytes):
+                return True
+
+            print("Serial Port Write Timout, Reconnecting...")
+            
+            # if the reading thread was running beforehand, we want to reconnect that too
+            # after stopping it
+            reconnectReadThread = (self.__readThread != None)
+            self.StopReading()
+
+            self.DisconnectSerialPort()
+            self.ConnectSerialPort()
+
+            # reconnect reading thread again
+            if reconnectReadThread:
+                self.StartReading()
+
+            return False
         else:
             return False
 
@@ -597,20 +642,17 @@ class SerialPortInterface:
         It will block until a packet is read from the buffer.
         Will return None if there are no packets to read and the thread is not running.
 
-        @param delay (float)   - The amount of delay (seconds) between checking whether there is a packet available.
+        @param delay (float)   - Unused, kept for compatibility. Waiting no longer polls the buffer.
 
         @return (dict)  - The oldest read packet from the serial port, or None.
         """
-        while not self.PacketAvailable():
-            # if there are no lines available to read and the reading thread is not running,
-            # we have entered an infinite loop
-            if self.__readThread == None:
-                print("__ReadSerialPacketBlocking__: Must call StartReading() to start the reading thread beforehand.")
-                return None
-            
-            time.sleep(delay)
+        # if there are no lines available to read and the reading thread is not running,
+        # we would wait forever
+        if not self.PacketAvailable() and self.__readThread == None:
+            print("__ReadSerialPacketBlocking__: Must call StartReading() to start the reading thread beforehand.")
+            return None
 
-        return self.__PopPacket__()
+        return self.serialPacketInputBuffer.WaitPop()
 
 
     def __ReadSerialPacketNonblocking__(self) -> dict:
@@ -636,20 +678,17 @@ class SerialPortInterface:
         It will block until a line is read from the buffer.
         Will return None if there are no lines to read and the thread is not running.
 
-        @param delay (float)   - The amount of delay (seconds) between checking whether there is a line available.
+        @param delay (float)   - Unused, kept for compatibility. Waiting no longer polls the buffer.
 
         @return (str)  - The oldest read line from the serial port, or None.
         """
-        while not self.SerialStringAvailable():
-            # if there are no lines available to read and the reading thread is not running,
-            # we have entered an infinite loop
-            if self.__readThread == None:
-                print("__ReadSerialStringBlocking__: Must call StartReading() to start the reading thread beforehand.")
-                return None
-            
-            time.sleep(delay)
+        # if there are no lines available to read and the reading thread is not running,
+        # we would wait forever
+        if not self.SerialStringAvailable() and self.__readThread == None:
+            print("__ReadSerialStringBlocking__: Must call StartReading() to start the reading thread beforehand.")
+            return None
 
-        return self.__PopSerialString__()
+        return self.serialStringInputBuffer.WaitPop()
 
 
     def __ReadSerialStringNonblocking__(self) -> str:
@@ -669,19 +708,68 @@ class SerialPortInterface:
         return None
 
 
+    def __WaitForSerialPacket__(self, timeoutTargetTime: float=None, packetIDs: List[int]=None) -> dict:
+        """
+        Waits for the reading thread to put a packet in the serial buffer and reads it.
+
+        @param timeoutTargetTime (float)  - The time.monotonic() time to give up at. If set to None, it waits forever
+        @param packetIDs (List[int])      - The packet IDs to read a packet of. If set to None, a packet of any ID is read
+
+        @return (dict)  - The oldest read packet from the serial port with one of the packet IDs, or None on timeout.
+        """
+        if self.__readThread == None and not self.PacketAvailable():
+            print("__WaitForSerialPacket__: Must call StartReading() to start the reading thread beforehand.")
+        return self.serialPacketInputBuffer.WaitPop(packetIDs, self.__GetSecondsLeft__(timeoutTargetTime))
+
+
+    def __WaitForSerialString__(self, timeoutTargetTime: float=None) -> str:
+        """
+        Waits for the reading thread to put a line in the serial buffer and reads it.
+
+        @param timeoutTargetTime (float)  - The time.monotonic() time to give up at. If set to None, it waits forever
+
+        @return (str)  - The oldest read line from the serial port, or None on timeout.
+        """
+        if self.__readThread == None and not self.SerialStringAvailable():
+            print("__WaitForSerialString__: Must call StartReading() to start the reading thread beforehand.")
+        return self.serialStringInputBuffer.WaitPop(self.__GetSecondsLeft__(timeoutTargetTime))
+
+
+    @staticmethod
+    def __GetTimeoutTargetTime__(timeoutSeconds: float) -> float:
+        """
+        Converts a timeout into the time.monotonic() time at which it is hit.
+
+        @param timeoutSeconds (float)  - The timeout in seconds. If set to None (or 0), there is no timeout
+
+        @return (float)  - The time.monotonic() time of the timeout, or None if there is no timeout
+        """
+        if timeoutSeconds:
+            return time.monotonic() + timeoutSeconds
+        return None
+
+
+    @staticmethod
+    def __GetSecondsLeft__(timeoutTargetTime: float) -> float:
+        """
+        Gets the seconds left until a timeout target time from __GetTimeoutTargetTime__.
+
+        @param timeoutTargetTime (float)  - The time.monotonic() time of the timeout, or None if there is no timeout
+
+        @return (float)  - The seconds left (never negative), or None if there is no timeout
+        """
+        if timeoutTargetTime == None:
+            return None
+        return max(timeoutTargetTime - time.monotonic(), 0)
+
+
     def __GetPacketBufferLength__(self) -> int:
         """
         Gets the length of the serialPacketInputBuffer in a thread-safe manner.
 
         @return (int)  - The length of the serialPacketInputBuffer
         """
-        # Make sure accessing serialPacketInputBuffer is only done inside mutex
-        self.serialPacketInputBufferLock.acquire()
-
-        length = len(self.serialPacketInputBuffer)
-
-        self.serialPacketInputBufferLock.release()
-        return length
+        return len(self.serialPacketInputBuffer)
 
 
     def __GetSerialStringBufferLength__(self) -> int:
@@ -690,13 +778,7 @@ class SerialPortInterface:
 
         @return (int)  - The length of the serialStringInputBuffer
         """
-        # Make sure accessing serialStringInputBuffer is only done inside mutex
-        self.serialStringInputBufferLock.acquire()
-
-        length = len(self.serialStringInputBuffer)
-
-        self.serialStringInputBufferLock.release()
-        return length
+        return len(self.serialStringInputBuffer)
 
 
     def __PopPacket__(self) -> dict:
@@ -705,50 +787,38 @@ class SerialPortInterface:
 
         @return (dict)  - The packet popped, or None if the buffer is empty
         """
-        packet = None
-        self.serialPacketInputBufferLock.acquire()
-        if (len(self.serialPacketInputBuffer) > 0):
-            packet = self.serialPacketInputBuffer.pop(0)
-
-        self.serialPacketInputBufferLock.release()
-        return packet
+        return self.serialPacketInputBuffer.Pop()
 
 
     def __PopSerialString__(self) -> str:
         """
-        Pops a packet from the serialStringInputBuffer in a thread-safe manner.
+        Pops a string from the serialStringInputBuffer in a thread-safe manner.
 
-        @return (dict)  - The packet popped, or None if the buffer is empty
+        @return (str)  - The string popped, or None if the buffer is empty
         """
-        string = None
-        self.serialStringInputBufferLock.acquire()
-        if (len(self.serialStringInputBuffer) > 0):
-            string = self.serialStringInputBuffer.pop(0)
-
-        self.serialStringInputBufferLock.release()
-        return string
+        return self.serialStringInputBuffer.Pop()
 
 
-    def __AppendPacket__(self, packet: dict) -> None:
+    def __AppendPacket__(self, packet: dict) -> bool:
         """
-        Pops a packet from the serialPacketInputBuffer in a thread-safe manner.
+        Appends a packet to the serialPacketInputBuffer in a thread-safe manner.
 
         @param packet (dict)  - The packet to append to the serialPacketInputBuffer
+
+        @return (bool)        - False if the buffer was full and the packet was dropped
         """
-        self.serialPacketInputBufferLock.acquire()
-        self.serialPacketInputBuffer.append(packet)
-        self.serialPacketInputBufferLock.release()
+        return self.serialPacketInputBuffer.TryPush(packet)
 
 
-    def __AppendSerialString__(self, string: str) -> None:
+    def __AppendSerialString__(self, string: str) -> bool:
         """
-        Pops a packet from the serialStringInputBuffer in a thread-safe manner.
+        Appends a string to the serialStringInputBuffer in a thread-safe manner.
 
         @param string (str)  - The string to append to the serialStringInputBuffer
+
+        @return (bool)       - False if the buffer was full and the string was dropped
         """
-        self.serialStringInputBufferLock.acquire()
-        self.serialStringInputBuffer.append(string)
-        self.serialStringInputBufferLock.release()
+        return self.serialStringInputBuffer.TryPush(string)
 
 
     def ReadFromSerialPort_Blocking(self) -> Tuple[Union[bytearray, str], bool]:
@@ -770,20 +840,120 @@ class SerialPortInterface:
             time.sleep(0.2)
             return None, False
 
-        if readStr != None and readStr != "" and readStr != b'':
-            # we are reading in a serial print
-            if readStr[0] != "%".encode('ascii')[0]:
-                try: 
-                    readStr = readStr.decode("ascii").strip().strip("\\r\\n")
-                    print("Serial Port Read: [" + readStr + "]")
-                except:
-                    print("Serial Port Decode Error: " + readStr)
-                    readStr = "SerialInterface: DECODE ERROR"
-                return readStr, False
-            # we are reading in a packet
-            else:
-                return readStr, True
-        return None, False
+        return DecodeSerialLine(readStr)
+
+
+    def WriteToSerialPort_Blocking(self, data: bytes) -> bool:
+        """
+        Writes bytes directly to the serial port with a single call.
+        It blocks until they are written or the write times out.
+
+        @param data (bytes)  - The bytes to write
+
+        @return (bool)  - False if the write timed out
+        """
+        try:
+            self.__serPort.write(data)
+            return True
+        except serial.SerialTimeoutException:
+            return False
+
+
+    def ReadLinesFromSerialPort_Blocking(self) -> List[Tuple[Union[bytearray, str], bool]]:
+        """
+        Reads all the bytes available directly from the serial port in one go (blocking until there is
+        at least one) and splits them into lines with the text protocol.
+        This is meant to be called from background thread because it is blocking.
+
+        @return (List[Tuple[Union[str, bytearray], bool]]) - The lines completed by the bytes read, which can be none.
+                                                              Each is decoded like ReadFromSerialPort_Blocking's return.
+        """
+        lines = []
+        for line in self.__lineParser.Feed(self.__ReadAvailableFromSerialPort__()):
+            readStr, didReadPacket = DecodeSerialLine(line)
+            if readStr != None:
+                lines.append((readStr, didReadPacket))
+        return lines
+
+
+    def ReadFramesFromSerialPort_Blocking(self) -> List[bytes]:
+        """
+        Reads all the bytes available directly from the serial port in one go (blocking until there is
+        at least one) and parses them with the framed protocol.
+        This is meant to be called from background thread because it is blocking.
+
+        @return (List[bytes])  - The payloads of the frames completed by the bytes read, which can be none.
+        """
+        return self.__frameParser.Feed(self.__ReadAvailableFromSerialPort__())
+
+
+    def __ReadAvailableFromSerialPort__(self) -> bytes:
+        """
+        Reads all the bytes waiting in the serial port's input buffer, blocking until there is at least one.
+
+        @return (bytes)  - The bytes read, which are empty if the read failed
+        """
+        try:
+            return self.__serPort.read(max(self.__serPort.in_waiting, 1))
+        except Exception as e:
+            print("Serial Port Read Failed: " + str(e))
+            time.sleep(0.2)
+            return b''
+
+
+###################################################################################################
+#<!--                                  Writing Thread (Private)                                 -->
+###################################################################################################
+
+class WritingThread(threading.Thread):
+    """
+    This class represents a background writing thread that the SerialInterface class creates
+    to write the packets queued in its serialWriteQueue, coalescing them into large writes.
+    """
+
+    def __init__(self, serialInstance: SerialPortInterface) -> None:
+        """
+        @param serialInstance (SerialPortInterface)  - The SerialInterface object whose queued packets the thread writes.
+        """
+        threading.Thread.__init__(self)
+        self.__isAlive = True
+        self.__serialInstance = serialInstance # the SerialInterface class instance
+
+
+    def run(self) -> None:
+        """
+        Method that is called when WritingThread.start() is called.
+        This runs in the background until stop() is called, and then
+        writes what is left in the queue.
+        """
+        writeQueue = self.__serialInstance.serialWriteQueue
+        while self.__isAlive:
+            # Wake up now and then to check whether the thread was stopped
+            packetBytes = writeQueue.WaitPop(0.1)
+            if packetBytes != None:
+                self.__Write__([packetBytes] + writeQueue.Drain(WRITE_BATCH_SIZE - 1))
+
+        # Write the packets queued before the thread was stopped
+        packets = writeQueue.Drain()
+        for start in range(0, len(packets), WRITE_BATCH_SIZE):
+            self.__Write__(packets[start:start + WRITE_BATCH_SIZE])
+
+
+    def stop(self) -> None:
+        """
+        This stops the thread from writing to the serial port continuously.
+        """
+        self.__isAlive = False
+
+
+    def __Write__(self, packets: List[bytes]) -> None:
+        """
+        Writes packets to the serial port with a single call.
+
+        @param packets (List[bytes])  - The packets to write, already framed
+        """
+        if not self.__serialInstance.WriteToSerialPort_Blocking(b"".join(packets)):
+            print("Serial Port Write Timout, dropped " + str(len(packets)) + " packets")
 
 
 ###################################################################################################
@@ -805,7 +975,6 @@ class ReadingThread(threading.Thread):
         self.__isAlive = True
         self.__serialInstance = serialInstance # the SerialInterface class instance
         self.__packetParsingFunc = self.__serialInstance.packetParsingFunc
-        self.__packetInterruptFunc = self.__serialInstance.packetInterruptFunc
  
         
     def run(self) -> None:
@@ -816,28 +985,28 @@ class ReadingThread(threading.Thread):
         buffer inside the SerialInterface class instance.
         """
         while self.__isAlive:
-            readStr, didReadPacket = self.__serialInstance.ReadFromSerialPort_Blocking()
-            
-            if readStr != None:
+            if self.__serialInstance.framed: # We are reading frames, which are always packets
+                for packetBytes in self.__serialInstance.ReadFramesFromSerialPort_Blocking():
+                    try:
+                        self.__ParsePacket__(packetBytes)
+                    except Exception as e:
+                        print("Could not parse packet. " + str(e))
+                continue
+
+            # Read every line available at once
+            for readStr, didReadPacket in self.__serialInstance.ReadLinesFromSerialPort_Blocking():
                 if didReadPacket: # We are reading a packet
-                    # Make sure that the serial packet buffer is large enough
-                    if self.__serialInstance.__GetPacketBufferLength__() > PACKET_BUFFER_SIZE:
-                        print("Serial Packet Buffer Full")
-                    else:
-                        packetID = -1         # The packetID to print to the LCD
-                        readStr = readStr[1:] # remove the first char, which is '%'
-                        try:
-                            packetID = self.__ParsePacket__(readStr)
-                        except Exception as e:
-                            print("Could not parse packet. " + str(e))
+                    packetID = -1         # The packetID to print to the LCD
+                    readStr = readStr[1:] # remove the first char, which is '%'
+                    try:
+                        packetID = self.__ParsePacket__(readStr)
+                    except Exception as e:
+                        print("Could not parse packet. " + str(e))
 
                 else: # We are reading a serial print
-
-                    # Make sure that the serial message buffer is large enough
-                    if self.__serialInstance.__GetSerialStringBufferLength__() > PACKET_BUFFER_SIZE:
+                    # The string is dropped if the serial message buffer is full
+                    if not self.__serialInstance.__AppendSerialString__(readStr):
                         print("Serial Message Buffer Full")
-                    else:
-                        self.__serialInstance.__AppendSerialString__(readStr)
 
 
     def stop(self) -> None:
@@ -856,27 +1025,19 @@ class ReadingThread(threading.Thread):
 
         @return (int)  - The packet ID read
         """
-        packet = {}
-        packetID, packetBytes = ReadingThread.UnpackUint32_t(packetBytes)
-        packet["packetID"] = packetID
-        
-        # Parse the universal serial packets
-        if packetID == SerialPacketIDs.PING_REQUEST_PACKET_ID:
-            packet['sequenceNum'], packetBytes     = ReadingThread.UnpackUint32_t(packetBytes)
-
-        elif packetID == SerialPacketIDs.PING_REPLY_PACKET_ID:
-            packet['sequenceNum'], packetBytes     = ReadingThread.UnpackUint32_t(packetBytes)
+        packet = ParseSerialPacket(packetBytes, self.__packetParsingFunc)
+        packetID = packet["packetID"]
 
-        # Parse the packets from the helper packet parsing method supplied to the SerialHubInterface constructor
-        else:
-            # We currently aren't using the bool return in the Tuple
-            packet, packetBytes, _ = self.__packetParsingFunc(packet, packetID, packetBytes)
-
-        print("Serial Port Read: [" + packet + "]")
+        if PRINT_SERIAL_READS:
+            print("Serial Port Read: [" + str(packet) + "]")
 
-        # Only add this packet to the packet buffer if the interrupt function dictates
-        if self.__packetInterruptFunc(packet):
-            self.__serialInstance.__AppendPacket__(packet)
+        # Only add this packet to the packet buffer if the interrupt function dictates,
+        # it is dropped if the serial packet buffer is full
+        # Looked up for every packet, since it can be replaced while reading, i.e. by SerialRpc
+        packetInterruptFunc = self.__serialInstance.packetInterruptFunc
+        if packetInterruptFunc is None or packetInterruptFunc(packet):
+            if not self.__serialInstance.__AppendPacket__(packet):
+                print("Serial Packet Buffer Full")
 
         return packetID
 
@@ -890,28 +1051,31 @@ class ReadingThread(threading.Thread):
     #   - the data parsed
     #   - packetBytes with the parsed data bytes removed
 
+    # Packet parsing functions are handed a memoryview, which makes slicing off the parsed data free.
+    # New parsing code should rather use a PacketCursor (see libs/PacketCursor.py).
+
     def UnpackUint64_t(packetBytes: bytearray) -> Tuple[int, bytearray]:
-        return struct.unpack('<Q', packetBytes[0: 8])[0], packetBytes[8:]
+        return UINT64_STRUCT.unpack_from(packetBytes)[0], packetBytes[8:]
 
 
     def UnpackUint32_t(packetBytes: bytearray) -> Tuple[int, bytearray]:
-        return struct.unpack('<I', packetBytes[0: 4])[0], packetBytes[4:]
+        return UINT32_STRUCT.unpack_from(packetBytes)[0], packetBytes[4:]
 
     
     def UnpackUint16_t(packetBytes: bytearray) -> Tuple[int, bytearray]:
-        return struct.unpack('<H', packetBytes[0: 2])[0], packetBytes[2:]
+        return UINT16_STRUCT.unpack_from(packetBytes)[0], packetBytes[2:]
 
 
     def UnpackUint8_t(packetBytes: bytearray) -> Tuple[int, bytearray]:
-        return struct.unpack('<B', packetBytes[0: 1])[0], packetBytes[1:]
+        return UINT8_STRUCT.unpack_from(packetBytes)[0], packetBytes[1:]
 
 
     def UnpackDouble(packetBytes: bytearray) -> Tuple[float, bytearray]:
-        return struct.unpack('<d', packetBytes[0: 8])[0], packetBytes[8:]
+        return DOUBLE_STRUCT.unpack_from(packetBytes)[0], packetBytes[8:]
 
 
     def UnpackFloat(packetBytes: bytearray) -> Tuple[float, bytearray]:
-        return struct.unpack('<f', packetBytes[0: 4])[0], packetBytes[4:]
+        return FLOAT_STRUCT.unpack_from(packetBytes)[0], packetBytes[4:]
     
 
     def UnpackChar(packetBytes: bytearray) -> Tuple[str, bytearray]:
@@ -919,4 +1083,4 @@ class ReadingThread(threading.Thread):
     
 
     def UnpackString(packetBytes: bytearray, strLen: int) -> Tuple[str, bytearray]:
-        return packetBytes[0:strLen].decode("ascii").strip().strip("\\r\\n"), packetBytes[strLen:]
+        return str(packetBytes[0:strLen], "ascii").strip().strip("\\r\\n"), packetBytes[strLen:]
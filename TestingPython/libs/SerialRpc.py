@@ -0,0 +1,278 @@
+import heapq
+import time
+import threading
+from concurrent.futures import Future, InvalidStateError
+from typing import Dict, List
+
+from libs.Constants import SerialPacketIDs
+from libs.PacketSchema import PacketSchemaRegistry
+from libs.SerialInterface import SerialPortInterface, SerialPacketSchemas
+
+SEQUENCE_NUM_MASK = 0xFFFFFFFF # Sequence numbers are uint32's and wrap around
+NEWLINE_BYTE = 0x0A            # Ends a packet in the text protocol, so it can't appear in a sequence number there
+
+
+###################################################################################################
+#<!--                                         Serial RPC                                        -->
+###################################################################################################
+
+class SerialRpc:
+    """
+    Request/response layer on top of a SerialPortInterface. Every request is sent with a fresh
+    sequence number and gets a Future, which the reading thread resolves with the reply carrying
+    the same sequence number. Any number of requests can be in flight at once, each with its own
+    timeout, so a high latency link is kept busy instead of waiting out every round trip.
+
+    Replies that resolve a request are not added to the interface's packet buffer. Every other
+    packet goes on to the interface's own packetInterruptFunc.
+
+    In the text protocol a packet byte of 0x0A ends the packet early, so sequence numbers with
+    such a byte are skipped. The other fields of requests and replies have the same limitation,
+    which the framed protocol (framed=True) doesn't have.
+
+    Usage:
+        rpc = SerialRpc(interface)
+        futures = [rpc.Ping(timeoutSeconds=1) for _ in range(100)] # all 100 are sent right away
+        replies = [future.result() for future in futures]          # raises TimeoutError on timeout
+    """
+
+    def __init__(self,
+                 serialInterface: SerialPortInterface,
+                 replyIDs: Dict[int, int]=None,
+                 schemas: List[PacketSchemaRegistry]=None,
+                 sequenceField: str='sequenceNum',
+                 timeoutSeconds: float=1.0
+                 ) -> None:
+        """
+        @param serialInterface (SerialPortInterface)  - The interface to send requests and receive replies on
+        @param replyIDs (Dict[int, int])              - The reply packet ID of every request packet ID. The pings by default
+        @param schemas (List[PacketSchemaRegistry])   - The registries declaring the request packets, SerialPacketSchemas by default
+        @param sequenceField (str)                    - The field that carries the sequence number in requests and replies
+        @param timeoutSeconds (float)                 - The timeout of requests that don't set their own. If set to None,
+                                                        requests don't time out
+        """
+        if replyIDs == None:
+            replyIDs = {SerialPacketIDs.PING_REQUEST_PACKET_ID: SerialPacketIDs.PING_REPLY_PACKET_ID}
+        if schemas == None:
+            schemas = [SerialPacketSchemas]
+
+        self.__serialInterface = serialInterface
+        self.__replyIDs = {int(requestID): int(replyID) for requestID, replyID in replyIDs.items()}
+        self.__replyIDSet = set(self.__replyIDs.values())
+        self.__schemas = schemas
+        self.__sequenceField = sequenceField
+        self.__timeoutSeconds = timeoutSeconds
+
+        self.__lock = threading.Lock()
+        self.__nextSequenceNum = 0
+        self.__pending = {}          # Type: Dict[int, Tuple[Future, int]] the future and reply ID of every request in flight, by sequence number
+        self.__deadlines = []        # Type: List[Tuple[float, int]] heap of the (time.monotonic() timeout, sequence number) of requests
+        self.__deadlinesChanged = threading.Condition(self.__lock) # notified when an earlier deadline is added or on Close
+        self.__timeoutThread = None  # the thread failing requests that time out, started with the first timeout
+        self.__isOpen = True
+
+        # Take the replies out of the packet stream before the interface's own interrupt function sees them
+        self.__packetInterruptFunc = serialInterface.packetInterruptFunc
+        serialInterface.packetInterruptFunc = self.__PacketReceived__
+
+
+    def Request(self, requestID: int, *args, timeoutSeconds: float=-1, **kwargs) -> Future:
+        """
+        Sends a request packet with a fresh sequence number and returns the future of its reply.
+
+        @param requestID (int)         - The packet ID of the request
+        @param args, kwargs            - The fields of the request other than the sequence number, in order or by name
+        @param timeoutSeconds (float)  - The seconds before the future fails with TimeoutError. If set to None, it never
+                                         times out. By default, the timeout given to the constructor
+
+        @return (Future)  - Resolves to the reply packet
+        """
+        requestID = int(requestID)
+        if timeoutSeconds == -1:
+            timeoutSeconds = self.__timeoutSeconds
+
+        schema = self.__GetSchema__(requestID)
+        replyID = self.__replyIDs[requestID]
+
+        future = Future()
+        with self.__lock:
+            if not self.__isOpen:
+                raise RuntimeError("SerialRpc is closed")
+
+            # Skip sequence numbers still in flight after wrapping around, and those the text protocol can't carry
+            sequenceNum = self.__nextSequenceNum
+            while sequenceNum in self.__pending or not self.__CanSend__(sequenceNum):
+                sequenceNum = (sequenceNum + 1) & SEQUENCE_NUM_MASK
+            self.__nextSequenceNum = (sequenceNum + 1) & SEQUENCE_NUM_MASK
+
+            self.__pending[sequenceNum] = (future, replyID)
+
+            if timeoutSeconds != None:
+                deadline = (time.monotonic() + timeoutSeconds, sequenceNum)
+                heapq.heappush(self.__deadlines, deadline)
+                if self.__deadlines[0] is deadline:
+                    self.__deadlinesChanged.notify()
+                self.__StartTimeoutThread__()
+
+        kwargs[self.__sequenceField] = sequenceNum
+        try:
+            packet = schema.Encode(*args, **kwargs)
+        except Exception:
+            # Bad field values, the request was never sent. Its deadline is dropped when it comes up
+            with self.__lock:
+                self.__pending.pop(sequenceNum, None)
+            raise
+
+        # The reply can come back before __WritePacket__ returns, which is fine since the future is already pending
+        if not self.__serialInterface.__WritePacket__(requestID, packet):
+            self.__Fail__(sequenceNum, ConnectionError("Could not write request packet " + str(requestID)))
+
+        return future
+
+
+    def Ping(self, timeoutSeconds: float=-1) -> Future:
+        """
+        Sends a ping request and returns the future of its reply.
+
+        @param timeoutSeconds (float)  - The seconds before the future fails with TimeoutError, see Request
+
+        @return (Future)  - Resolves to the ping reply packet
+        """
+        return self.Request(SerialPacketIDs.PING_REQUEST_PACKET_ID, timeoutSeconds=timeoutSeconds)
+
+
+    def PendingCount(self) -> int:
+        """
+        @return (int)  - The number of requests in flight
+        """
+        with self.__lock:
+            return len(self.__pending)
+
+
+    def Close(self) -> None:
+        """
+        Fails every request in flight with ConnectionError and gives the interface back its own interrupt function.
+        """
+        with self.__lock:
+            self.__isOpen = False
+            pending = list(self.__pending.values())
+            self.__pending.clear()
+            self.__deadlines.clear()
+            self.__deadlinesChanged.notify()
+
+        self.__serialInterface.packetInterruptFunc = self.__packetInterruptFunc
+        for future, _ in pending:
+            self.__SetFutureException__(future, ConnectionError("SerialRpc was closed"))
+
+
+    ###################################################################################################
+    #<!--                                  Private Methods (Don't Call)                             -->
+    ###################################################################################################
+
+    def __PacketReceived__(self, packet: dict) -> bool:
+        """
+        Is called by the reading thread for every packet. Resolves the request a reply belongs to.
+
+        @param packet (dict)  - The packet received
+
+        @return (bool) - Whether to add this packet to the serial packet buffer or not.
+        """
+        if packet['packetID'] in self.__replyIDSet:
+            with self.__lock:
+                request = self.__pending.get(packet.get(self.__sequenceField))
+                if request != None and request[1] == packet['packetID']:
+                    del self.__pending[packet[self.__sequenceField]]
+                else:
+                    request = None
+
+            if request != None:
+                try:
+                    request[0].set_result(packet)
+                except InvalidStateError: # The caller cancelled the future
+                    pass
+                return False
+
+        if self.__packetInterruptFunc == None:
+            return True
+        return self.__packetInterruptFunc(packet)
+
+
+    def __CanSend__(self, sequenceNum: int) -> bool:
+        """
+        @param sequenceNum (int)  - A sequence number
+
+        @return (bool)  - Whether the sequence number survives the interface's protocol
+        """
+        if self.__serialInterface.framed:
+            return True
+        return NEWLINE_BYTE not in sequenceNum.to_bytes(4, 'little')
+
+
+    def __GetSchema__(self, packetID: int):
+        """
+        @param packetID (int)  - The packet ID of a request
+
+        @return (PacketSchema)  - The schema of the request
+        """
+        for registry in self.__schemas:
+            schema = registry.Get(packetID)
+            if schema != None:
+                return schema
+        raise KeyError("No schema registered for request packet " + str(packetID))
+
+
+    def __Fail__(self, sequenceNum: int, exception: Exception) -> None:
+        """
+        Fails the request with the sequence number, if it is still in flight.
+
+        @param sequenceNum (int)       - The sequence number of the request
+        @param exception (Exception)   - The exception to fail its future with
+        """
+        with self.__lock:
+            request = self.__pending.pop(sequenceNum, None)
+        if request != None:
+            self.__SetFutureException__(request[0], exception)
+
+
+    @staticmethod
+    def __SetFutureException__(future: Future, exception: Exception) -> None:
+        try:
+            future.set_exception(exception)
+        except InvalidStateError: # The caller cancelled the future
+            pass
+
+
+    def __StartTimeoutThread__(self) -> None:
+        """
+        Starts the thread failing requests that time out, if it isn't running yet. The lock must be held.
+        """
+        if self.__timeoutThread == None:
+            self.__timeoutThread = threading.Thread(target=self.__TimeoutLoop__, daemon=True)
+            self.__timeoutThread.start()
+
+
+    def __TimeoutLoop__(self) -> None:
+        """
+        Sleeps until the earliest deadline and fails the requests whose deadline passed, until Close.
+        """
+        while True:
+            expired = []
+            with self.__lock:
+                while self.__isOpen:
+                    now = time.monotonic()
+                    # Pop the deadlines that passed. Those of requests already answered are just dropped.
+                    while self.__deadlines and self.__deadlines[0][0] <= now:
+                        _, sequenceNum = heapq.heappop(self.__deadlines)
+                        request = self.__pending.pop(sequenceNum, None)
+                        if request != None:
+                            expired.append(request[0])
+                    if expired:
+                        break
+
+                    self.__deadlinesChanged.wait(self.__deadlines[0][0] - now if self.__deadlines else None)
+
+                if not self.__isOpen:
+                    return
+
+            for future in expired:
+                self.__SetFutureException__(future, TimeoutError("Request timed out"))
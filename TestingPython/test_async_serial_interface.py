@@ -0,0 +1,104 @@
+import os
+import pty
+import tty
+import struct
+import asyncio
+
+from libs.AsyncSerialInterface import AsyncSerialPortInterface
+
+
+###################################################################################################
+#<!--                                      Helpers                                              -->
+###################################################################################################
+
+PACKET_A = 700
+PACKET_B = 701
+
+
+def RunWithPty(test) -> None:
+    """
+    Runs test(interface, master) on a fresh event loop, with the interface connected to the slave
+    end of a pty pair. Writing to master is the device sending bytes.
+    """
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    interface = AsyncSerialPortInterface(os.ttyname(slave))
+
+    async def Run():
+        interface.ConnectSerialPort()
+        try:
+            await test(interface, master)
+        finally:
+            interface.DisconnectSerialPort()
+
+    try:
+        asyncio.run(Run())
+    finally:
+        os.close(master)
+        os.close(slave)
+
+
+def SendPacket(master: int, packetID: int, data: bytes=b'') -> None:
+    os.write(master, b'%' + struct.pack('<I', packetID) + data + b'\n')
+
+
+###################################################################################################
+#<!--                                      Packets                                              -->
+###################################################################################################
+
+def test_WaitForAllPacketsDelivery():
+    async def Test(interface, master):
+        wait = asyncio.ensure_future(interface.WaitForAllPackets([PACKET_A, PACKET_B], timeoutSeconds=2))
+        await asyncio.sleep(0.05)
+        SendPacket(master, PACKET_B)
+        SendPacket(master, PACKET_A)
+
+        packets = await wait
+        assert [packet['packetID'] for packet in packets] == [PACKET_A, PACKET_B]
+        assert len(interface.serialPacketInputBuffer) == 0
+
+    RunWithPty(Test)
+
+
+def test_WaitForAllPacketsTimeoutKeepsMatchedPackets():
+    async def Test(interface, master):
+        wait = asyncio.ensure_future(interface.WaitForAllPackets([PACKET_A, PACKET_B], timeoutSeconds=0.3))
+        await asyncio.sleep(0.05)
+        SendPacket(master, PACKET_A)
+
+        assert await wait == None
+        packet = await interface.WaitForPacket(PACKET_A, timeoutSeconds=0)
+        assert packet != None and packet['packetID'] == PACKET_A
+
+    RunWithPty(Test)
+
+
+def test_WaitForAllPacketsDisconnect():
+    async def Test(interface, master):
+        wait = asyncio.ensure_future(interface.WaitForAllPackets([PACKET_A, PACKET_B]))
+        await asyncio.sleep(0.05)
+        SendPacket(master, PACKET_B)
+        await asyncio.sleep(0.05)
+        interface.DisconnectSerialPort()
+
+        assert await asyncio.wait_for(wait, 1) == None
+        assert not interface.IsConnected()
+        assert [packet['packetID'] for packet in interface.serialPacketInputBuffer.Snapshot()] == [PACKET_B]
+
+    RunWithPty(Test)
+
+
+def test_WaitForPacketCancelledAfterDelivery():
+    async def Test(interface, master):
+        wait = asyncio.ensure_future(interface.WaitForPacket(PACKET_A))
+        await asyncio.sleep(0)
+
+        # Hand the wait a packet and cancel it before it gets to run
+        interface.__DeliverPacket__({'packetID': PACKET_A})
+        wait.cancel()
+        await asyncio.gather(wait, return_exceptions=True)
+
+        assert wait.cancelled()
+        assert interface.serialPacketInputBuffer.Count(PACKET_A) == 1
+
+    RunWithPty(Test)
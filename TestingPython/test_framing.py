@@ -0,0 +1,103 @@
+import random
+
+from libs.Framing import LineParser, FrameParser, EncodeFrame, FindFrameEnd, FRAME_DELIMITER
+
+
+###################################################################################################
+#<!--                                      Frame Parser                                         -->
+###################################################################################################
+
+def FeedInChunks(parser: FrameParser, data: bytes, rng: random.Random) -> list:
+    payloads = []
+    start = 0
+    while start < len(data):
+        end = start + rng.randint(1, 64)
+        payloads += parser.Feed(data[start:end])
+        start = end
+    return payloads
+
+
+def test_FrameParserRoundTrip():
+    rng = random.Random(0)
+    payloads = [bytes(rng.randrange(256) for _ in range(rng.randint(0, 600))) for _ in range(50)]
+
+    parser = FrameParser()
+    assert FeedInChunks(parser, b"".join(EncodeFrame(payload) for payload in payloads), rng) == payloads
+    assert parser.frameCount == 50 and parser.errorCount == 0
+
+
+def test_FrameParserResyncsAfterCorruption():
+    rng = random.Random(1)
+    payloads = [bytes([idx]) + bytes(rng.randrange(256) for _ in range(rng.randint(0, 40))) for idx in range(30)]
+    frames = [EncodeFrame(payload) for payload in payloads]
+    data = b"".join(frames)
+
+    parser = FrameParser()
+    delimiterHits = 0
+    for _ in range(2000):
+        corrupted = bytearray(data)
+        idx = rng.randrange(len(corrupted))
+        delimiterHit = corrupted[idx] == FRAME_DELIMITER and idx < len(corrupted) - 1
+        delimiterHits += delimiterHit
+        corrupted[idx] ^= rng.randrange(1, 256)
+
+        parser.Reset()
+        received = FeedInChunks(parser, bytes(corrupted), rng)
+
+        # Only whole, intact frames come out, in order, and a single bad byte costs at most one of them
+        assert all(payload in payloads for payload in received)
+        assert received == sorted(received, key=payloads.index)
+        assert len(payloads) - 1 <= len(received) <= len(payloads)
+
+        # The frames merged by a corrupted delimiter are both recovered
+        if delimiterHit:
+            assert received == payloads
+
+    assert delimiterHits > 0
+
+
+def test_FindFrameEnd():
+    first = EncodeFrame(bytes(300))[:-1]        # zeros and a full COBS block
+    second = EncodeFrame(b"\x00abc\x00")[:-1]
+
+    assert FindFrameEnd(first + b"\x17" + second) == len(first)
+    assert FindFrameEnd(first) == len(first)
+    assert FindFrameEnd(first[:-3]) == -1
+
+
+def test_FrameParserSkipsGarbage():
+    parser = FrameParser(maxPayloadSize=16)
+    frame = EncodeFrame(b"hello")
+
+    assert parser.Feed(b"\x01\x02garbage" + bytes([FRAME_DELIMITER]) + frame) == [b"hello"]
+    assert parser.Feed(b"\xff" * 100) == []                    # longer than any valid frame
+    assert parser.Feed(b"\xff" * 10 + bytes([FRAME_DELIMITER]) + frame) == [b"hello"]
+    assert parser.errorCount == 2
+
+
+###################################################################################################
+#<!--                                       Line Parser                                         -->
+###################################################################################################
+
+def test_LineParserSplitsAcrossChunks():
+    parser = LineParser()
+    assert parser.Feed(b"hel") == []
+    assert parser.Feed(b"lo\nwor") == [b"hello"]
+    assert parser.Feed(b"ld\n\n%abc\n") == [b"world", b"", b"%abc"]
+    assert parser.errorCount == 0
+
+
+def test_LineParserDropsLinesCompletedInOneChunk():
+    parser = LineParser(maxLineSize=10)
+    assert parser.Feed(b"a" * 8) == []
+    assert parser.Feed(b"b" * 8 + b"\nok\n") == [b"ok"]
+    assert parser.Feed(b"c" * 11 + b"\n" + b"d" * 10 + b"\n") == [b"d" * 10]
+    assert parser.errorCount == 2
+
+
+def test_LineParserDropsLinesLongerThanTheBuffer():
+    parser = LineParser(maxLineSize=10)
+    assert parser.Feed(b"x" * 11) == []
+    assert parser.Feed(b"x" * 100) == []
+    assert parser.Feed(b"x\nnext\n") == [b"next"]
+    assert parser.errorCount == 1
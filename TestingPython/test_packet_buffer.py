@@ -0,0 +1,77 @@
+import threading
+
+from libs.PacketBuffer import PacketBuffer
+
+
+###################################################################################################
+#<!--                                      Packet Buffer                                        -->
+###################################################################################################
+
+def MakePacket(packetID: int, idx: int) -> dict:
+    return {'packetID': packetID, 'idx': idx}
+
+
+def test_PacketBufferPopByIDKeepsOtherPackets():
+    buffer = PacketBuffer(16)
+    for idx, packetID in enumerate([1, 2, 1, 3, 2]):
+        assert buffer.TryPush(MakePacket(packetID, idx))
+
+    assert buffer.Pop([2])['idx'] == 1
+    assert buffer.Pop([1, 3])['idx'] == 0 # the oldest of either ID
+    assert buffer.Pop([4]) == None
+
+    assert [packet['idx'] for packet in buffer.Snapshot()] == [2, 3, 4]
+    assert buffer.Count(1) == 1 and buffer.Count(2) == 1 and buffer.Count(3) == 1
+    assert len(buffer) == 3
+
+
+def test_PacketBufferPopAnyKeepsArrivalOrder():
+    buffer = PacketBuffer(16)
+    for idx, packetID in enumerate([1, 2, 1, 3, 2, 1]):
+        buffer.TryPush(MakePacket(packetID, idx))
+
+    # Packets taken by ID leave holes in the arrival order that Pop(None) skips
+    assert buffer.Pop([1])['idx'] == 0
+    assert buffer.Pop([2])['idx'] == 1
+    assert [buffer.Pop()['idx'] for _ in range(4)] == [2, 3, 4, 5]
+    assert buffer.Pop() == None and len(buffer) == 0
+
+
+def test_PacketBufferPopAnyAfterCompaction():
+    buffer = PacketBuffer(4)
+    buffer.TryPush(MakePacket(0, -1))
+
+    # Churn through one ID long enough for the holes it leaves in the arrival order to be compacted
+    for idx in range(500):
+        assert buffer.TryPush(MakePacket(1, idx))
+        assert buffer.Pop([1])['idx'] == idx
+    buffer.TryPush(MakePacket(2, 500))
+    buffer.TryPush(MakePacket(1, 501))
+
+    assert [packet['idx'] for packet in buffer.Drain()] == [-1, 500, 501]
+    assert len(buffer) == 0
+
+
+def test_PacketBufferTryPushAtCapacity():
+    buffer = PacketBuffer(3)
+    for idx in range(3):
+        assert buffer.TryPush(MakePacket(1, idx))
+
+    assert not buffer.TryPush(MakePacket(2, 3))
+    assert buffer.droppedCount == 1 and len(buffer) == 3 and buffer.Count(2) == 0
+
+    # Taking a packet makes room again
+    buffer.Pop([1])
+    assert buffer.TryPush(MakePacket(2, 4))
+    assert [packet['idx'] for packet in buffer.Drain()] == [1, 2, 4]
+
+
+def test_PacketBufferWaitPop():
+    buffer = PacketBuffer(4)
+    assert buffer.WaitPop([1], timeoutSeconds=0.01) == None
+
+    pusher = threading.Timer(0.05, lambda: [buffer.TryPush(MakePacket(2, 0)), buffer.TryPush(MakePacket(1, 1))])
+    pusher.start()
+    assert buffer.WaitPop([1], timeoutSeconds=2)['idx'] == 1
+    pusher.join()
+    assert buffer.Snapshot() == [MakePacket(2, 0)]
@@ -0,0 +1,58 @@
+import struct
+
+from libs.PacketCursor import PacketCursor, AdaptPacketParsingFunc, CursorPacketParsingFunc
+from libs.SerialInterface import ParseSerialPacket
+
+
+###################################################################################################
+#<!--                                 Packet Parsing Functions                                  -->
+###################################################################################################
+
+def LegacyParsePacket(packet: dict, packetID: int, packetBytes: bytearray):
+    """
+    A parsing function written against the old contract: it slices the bytes it decoded off the
+    bytearray and returns a new dict.
+    """
+    if packetID != 700:
+        return packet, packetBytes, False
+
+    value = struct.unpack('<H', packetBytes[:2])[0]
+    packetBytes = packetBytes[2:]
+    return {'packetID': packetID, 'value': value, 'isBytearray': isinstance(packetBytes, bytearray)}, packetBytes, True
+
+
+def test_AdaptLegacyPacketParsingFunc():
+    parsingFunc = AdaptPacketParsingFunc(LegacyParsePacket)
+    assert parsingFunc.usesPacketCursor
+
+    packet = {'packetID': 700}
+    cursor = PacketCursor(struct.pack('<HI', 513, 99))
+    assert parsingFunc(packet, 700, cursor)
+
+    # The dict it returned replaces the packet, and the cursor stops at the bytes it left over
+    assert packet == {'packetID': 700, 'value': 513, 'isBytearray': True}
+    assert len(cursor) == 4 and cursor.UnpackUint32_t() == 99
+
+
+def test_AdaptLegacyPacketParsingFuncUnparsed():
+    parsingFunc = AdaptPacketParsingFunc(LegacyParsePacket)
+
+    cursor = PacketCursor(b'\x01\x02')
+    packet = {'packetID': 701}
+    assert not parsingFunc(packet, 701, cursor)
+    assert packet == {'packetID': 701} and len(cursor) == 2
+
+
+def test_AdaptPacketParsingFuncThroughParseSerialPacket():
+    packet = ParseSerialPacket(struct.pack('<IH', 700, 7), AdaptPacketParsingFunc(LegacyParsePacket))
+    assert packet == {'packetID': 700, 'value': 7, 'isBytearray': True}
+
+
+def test_AdaptCursorPacketParsingFunc():
+    @CursorPacketParsingFunc
+    def ParsePacket(packet: dict, packetID: int, cursor: PacketCursor) -> bool:
+        packet['value'] = cursor.UnpackUint16_t()
+        return True
+
+    assert AdaptPacketParsingFunc(ParsePacket) is ParsePacket
+    assert AdaptPacketParsingFunc(None) == None
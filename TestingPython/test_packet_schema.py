@@ -0,0 +1,46 @@
+import struct
+
+import pytest
+
+from libs.PacketSchema import PacketSchemaRegistry
+from libs.SerialInterface import ParseSerialPacket
+
+
+###################################################################################################
+#<!--                                      Packet Schema                                        -->
+###################################################################################################
+
+def MakeRegistry() -> PacketSchemaRegistry:
+    registry = PacketSchemaRegistry()
+    registry.Register(700, 'Status', [('id', 'uint8_t'), ('count', 'int32_t'), ('value', 'double'),
+                                      ('ok', 'bool'), ('label', 'char[8]')])
+    return registry
+
+
+def test_PacketSchemaRoundTrip():
+    registry = MakeRegistry()
+    data = registry.Encode(700, 3, -42, value=1.5, ok=True, label='motor')
+    assert len(data) == registry.Get(700).struct.size == 1 + 4 + 8 + 1 + 8
+
+    packet = ParseSerialPacket(struct.pack('<I', 700) + data, registry.ParsePacket)
+    assert packet == {'packetID': 700, 'id': 3, 'count': -42, 'value': 1.5, 'ok': True, 'label': 'motor'}
+
+
+def test_PacketSchemaStringPadding():
+    schema = MakeRegistry().Get(700)
+
+    # Short strings are padded with NULs, long ones are cut to the field's length
+    assert schema.Encode(0, 0, 0.0, False, 'ab')[-8:] == b'ab' + b'\0' * 6
+    assert schema.Encode(0, 0, 0.0, False, 'abcdefghij')[-8:] == b'abcdefgh'
+
+    # Whatever follows the first NUL is dropped when decoding
+    data = schema.Encode(0, 0, 0.0, False, b'ab\0junk')
+    packet = ParseSerialPacket(struct.pack('<I', 700) + data, MakeRegistry().ParsePacket)
+    assert packet['label'] == 'ab'
+
+
+def test_PacketSchemaDuplicateID():
+    registry = MakeRegistry()
+    with pytest.raises(ValueError):
+        registry.Register(700, 'Other', [('value', 'uint32_t')])
+    assert registry.Get(700).name == 'Status' and len(registry) == 1
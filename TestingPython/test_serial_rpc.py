@@ -0,0 +1,130 @@
+import struct
+from concurrent.futures import Future
+
+import pytest
+
+from libs.Constants import SerialPacketIDs
+from libs.SerialRpc import SerialRpc
+
+
+###################################################################################################
+#<!--                                      Fake Interface                                       -->
+###################################################################################################
+
+class FakeSerialInterface:
+    """
+    Stands in for a SerialPortInterface. It records the requests written, and Reply hands a reply
+    packet to the interrupt function like the reading thread would.
+    """
+
+    def __init__(self, framed: bool=False) -> None:
+        self.framed = framed
+        self.packetInterruptFunc = None
+        self.requests = [] # Type: List[Tuple[int, int]] the (packet ID, sequence number) of every request written
+        self.writeSucceeds = True
+
+    def __WritePacket__(self, packetId: int, packet: bytes) -> bool:
+        self.requests.append((packetId, struct.unpack('<I', packet)[0]))
+        return self.writeSucceeds
+
+    def Reply(self, sequenceNum: int, packetID: int=SerialPacketIDs.PING_REPLY_PACKET_ID) -> bool:
+        return self.packetInterruptFunc({'packetID': packetID, 'sequenceNum': sequenceNum})
+
+
+###################################################################################################
+#<!--                                         Serial RPC                                        -->
+###################################################################################################
+
+def test_SerialRpcOutOfOrderReplies():
+    interface = FakeSerialInterface()
+    rpc = SerialRpc(interface, timeoutSeconds=None)
+    futures = [rpc.Ping() for _ in range(5)]
+    assert rpc.PendingCount() == 5
+
+    # Answer in reverse order, every future still gets the reply carrying its own sequence number
+    for _, sequenceNum in reversed(interface.requests):
+        assert interface.Reply(sequenceNum) == False
+
+    sequenceNums = [sequenceNum for _, sequenceNum in interface.requests]
+    assert [future.result(0)['sequenceNum'] for future in futures] == sequenceNums
+    assert rpc.PendingCount() == 0
+    rpc.Close()
+
+
+def test_SerialRpcUnmatchedPacketsPassThrough():
+    interface = FakeSerialInterface()
+    seen = []
+    def PacketInterruptFunc(packet: dict) -> bool:
+        seen.append(packet)
+        return True
+    interface.packetInterruptFunc = PacketInterruptFunc
+    rpc = SerialRpc(interface, timeoutSeconds=None)
+    future = rpc.Ping()
+
+    # A reply no request is waiting for, and any other packet, go on to the interface's own interrupt function
+    assert interface.Reply(12345) == True
+    assert interface.packetInterruptFunc({'packetID': SerialPacketIDs.INT_PACKET_ID}) == True
+    assert len(seen) == 2 and not future.done()
+
+    # Closing gives the interface back its own interrupt function
+    rpc.Close()
+    assert interface.packetInterruptFunc is PacketInterruptFunc
+
+
+def test_SerialRpcTimeout():
+    interface = FakeSerialInterface()
+    rpc = SerialRpc(interface)
+    slow = rpc.Ping(timeoutSeconds=0.05)
+    answered = rpc.Ping(timeoutSeconds=0.05)
+    interface.Reply(interface.requests[1][1])
+
+    with pytest.raises(TimeoutError):
+        slow.result(2)
+    assert answered.result(0)['sequenceNum'] == interface.requests[1][1]
+    assert rpc.PendingCount() == 0
+
+    # A reply arriving after the timeout is not a reply anymore
+    assert interface.Reply(interface.requests[0][1]) == True
+    rpc.Close()
+
+
+def test_SerialRpcCloseFailsPending():
+    interface = FakeSerialInterface()
+    rpc = SerialRpc(interface, timeoutSeconds=10)
+    futures = [rpc.Ping() for _ in range(3)]
+    rpc.Close()
+
+    for future in futures:
+        with pytest.raises(ConnectionError):
+            future.result(0)
+    with pytest.raises(RuntimeError):
+        rpc.Ping()
+
+
+def test_SerialRpcWriteFailure():
+    interface = FakeSerialInterface()
+    interface.writeSucceeds = False
+    rpc = SerialRpc(interface, timeoutSeconds=None)
+
+    future = rpc.Ping()
+    assert isinstance(future, Future)
+    with pytest.raises(ConnectionError):
+        future.result(0)
+    rpc.Close()
+
+
+def test_SerialRpcSkipsNewlineSequenceNums():
+    interface = FakeSerialInterface()
+    rpc = SerialRpc(interface, timeoutSeconds=None)
+    for _ in range(12):
+        rpc.Ping()
+    assert [sequenceNum for _, sequenceNum in interface.requests] == list(range(10)) + [11, 12]
+    rpc.Close()
+
+    # The framed protocol carries any byte
+    interface = FakeSerialInterface(framed=True)
+    rpc = SerialRpc(interface, timeoutSeconds=None)
+    for _ in range(12):
+        rpc.Ping()
+    assert [sequenceNum for _, sequenceNum in interface.requests] == list(range(12))
+    rpc.Close()